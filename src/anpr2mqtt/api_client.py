@@ -1,10 +1,23 @@
+import heapq
+import itertools
+import json
 import re
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from collections.abc import Callable, Iterable
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from enum import IntEnum, StrEnum, auto
+from functools import partial
 from pathlib import Path
 from typing import TYPE_CHECKING, Any, Literal, cast
 
 import niquests
 import structlog
 from requests_cache.backends.filesystem import FileCache
+from requests_cache.backends.sqlite import SQLiteCache
 from requests_cache.session import CacheMixin
 
 from anpr2mqtt.settings import CacheType
@@ -13,17 +26,318 @@ if TYPE_CHECKING:
     from requests_cache.models.response import CachedResponse
 
 
-class _CachedSession(CacheMixin, niquests.Session):  # type: ignore[misc]
-    """requests-cache backed by niquests as the transport."""
+class _ThrottledSession(niquests.Session):
+    """niquests session calling an optional hook before any request goes to the network."""
+
+    before_send: Callable[[], None] | None = None
+
+    def send(self, request: Any, **kwargs: Any) -> Any:
+        if self.before_send is not None:
+            self.before_send()
+        return super().send(request, **kwargs)
+
+
+class _CachedSession(CacheMixin, _ThrottledSession):  # type: ignore[misc]
+    """requests-cache backed by niquests as the transport, only cache misses are throttled."""
+
+    def _resend_async(self, request: Any, actions: Any, *args: Any, **kwargs: Any) -> None:
+        # only_if_cached is used while the circuit breaker is open, so stale results are served without a refresh
+        # private in requests-cache, so fall back to the normal revalidation if it goes away
+        if getattr(actions, "_only_if_cached", False):
+            log.debug("DVLA cached response stale, not revalidating while API calls are paused")
+            return
+        super()._resend_async(request, actions, *args, **kwargs)
+
+
+def registration_cache_key(request: Any, **_kwargs: Any) -> str:
+    """Cache key from the registration in a DVLA lookup, so cached entries are indexed by plate"""
+    body: Any = request.body
+    try:
+        reg: str = str(json.loads(body)["registrationNumber"]).upper()
+    except (TypeError, ValueError, KeyError):
+        reg = ""
+    return registration_key(reg, uat="://uat." in (request.url or ""))
+
+
+def registration_key(reg: str, uat: bool = False) -> str:
+    """Cache key for a registration, as stored by `registration_cache_key`"""
+    env: str = "uat:" if uat else ""
+    return f"{DVLAClient.ID}:{env}{reg.upper()}"
 
 
 log = structlog.get_logger()
 
 
+class LookupPriority(IntEnum):
+    LIVE = 0  # sighting on a live event
+    BACKGROUND = 1  # verification, backfill and cache refresh
+
+
+class RateLimitedError(Exception):
+    pass
+
+
+def lookup_failure_reason(result: dict[str, Any]) -> str | None:
+    """Short reason for an unsuccessful lookup result, suitable for publishing"""
+    if result.get("success"):
+        return None
+    if "api_status" in result:
+        return f"api_status:{result['api_status']}"
+    for key in ("circuit_open", "rate_limited", "reg_match_fail", "api_exception", "lookup_fail"):
+        if key in result:
+            return key
+    return "unknown"
+
+
+@dataclass
+class LookupStats:
+    lookups: int = 0
+    api_calls: int = 0
+    cache_hits: int = 0
+    stale_hits: int = 0
+    coalesced: int = 0
+    negative_hits: int = 0
+    error_hits: int = 0
+    new_connections: int = 0
+    reused_connections: int = 0
+    api_seconds: float = 0.0
+    throttled: int = 0
+    throttle_timeouts: int = 0
+    queue_seconds: float = 0.0
+    http_429: int = 0
+    circuit_trips: int = 0
+    short_circuited: int = 0
+
+    def as_dict(self) -> dict[str, Any]:
+        result: dict[str, Any] = asdict(self)
+        result["mean_api_seconds"] = self.api_seconds / self.api_calls if self.api_calls else None
+        return result
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key so only one does the work, and all share its result.
+
+    Each call has a priority, lower is more urgent. When a more urgent caller joins, the call in
+    flight takes on its priority, and `on_escalate` is told so it can be moved up any queue.
+    """
+
+    def __init__(self, on_escalate: Callable[[str, int], None] | None = None) -> None:
+        self._inflight: dict[str, Future[dict[str, Any]]] = {}
+        self._priorities: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.on_escalate: Callable[[str, int], None] | None = on_escalate
+
+    def priority(self, key: str, default: int) -> int:
+        with self._lock:
+            return self._priorities.get(key, default)
+
+    def run(self, key: str, fn: Callable[[], dict[str, Any]], priority: int = 0) -> tuple[dict[str, Any], bool]:
+        """Return the result of fn, and whether it was shared from another in-flight call."""
+        escalated: bool = False
+        with self._lock:
+            future: Future[dict[str, Any]] | None = self._inflight.get(key)
+            leader: bool = future is None
+            if future is None:
+                future = Future()
+                self._inflight[key] = future
+                self._priorities[key] = priority
+            elif priority < self._priorities[key]:
+                self._priorities[key] = priority
+                escalated = True
+        if not leader:
+            if escalated and self.on_escalate is not None:
+                self.on_escalate(key, priority)
+            return future.result(), True
+        try:
+            result: dict[str, Any] = fn()
+            future.set_result(result)
+            return result, False
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+                self._priorities.pop(key, None)
+
+    def __len__(self) -> int:
+        """Count of calls currently in flight."""
+        with self._lock:
+            return len(self._inflight)
+
+
+class FailureCache:
+    """Plate keyed memory of failed lookups, so repeat sightings don't repeat the API call."""
+
+    def __init__(self, max_entries: int = 10000) -> None:
+        self.max_entries: int = max_entries
+        self._entries: OrderedDict[str, tuple[float, bool, dict[str, Any]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> tuple[dict[str, Any], bool] | None:
+        """Return the remembered failure and whether it was negative, or None if absent or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, negative, result = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return None
+            return result, negative
+
+    def put(self, key: str, result: dict[str, Any], ttl: int, negative: bool) -> None:
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.monotonic() + ttl, negative, result)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        """Count of remembered failures, including any expired but not yet purged."""
+        with self._lock:
+            return len(self._entries)
+
+
+class TokenBucket:
+    """Token bucket rate limiter, waiting callers served in priority then arrival order."""
+
+    def __init__(self, rate: float, burst: int) -> None:
+        self.rate: float = rate
+        self.burst: int = max(1, burst)
+        self._tokens: float = float(self.burst)
+        self._updated: float = time.monotonic()
+        # [priority, arrival] lists, so a waiter's priority can be raised in place
+        self._waiters: list[list[int]] = []
+        self._tagged: dict[str, list[int]] = {}
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+
+    def acquire(self, priority: int = 0, timeout: float | None = None, tag: str | None = None) -> float | None:
+        """Take a token, blocking if needed; return seconds waited, or None if timed out
+
+        A tagged waiter can be moved up the queue with `escalate`.
+        """
+        started: float = time.monotonic()
+        blocked: bool = False
+        with self._cond:
+            entry: list[int] = [priority, next(self._sequence)]
+            heapq.heappush(self._waiters, entry)
+            if tag is not None:
+                self._tagged[tag] = entry
+            try:
+                while True:
+                    now: float = time.monotonic()
+                    self._refill(now)
+                    if self._waiters[0] is entry and self._tokens >= 1:
+                        self._tokens -= 1
+                        return now - started if blocked else 0.0
+                    # not at head of queue, wait to be notified; otherwise until next token due
+                    wait: float | None = (1 - self._tokens) / self.rate if self._waiters[0] is entry else None
+                    if timeout is not None:
+                        remaining: float = started + timeout - now
+                        if remaining <= 0:
+                            return None
+                        wait = remaining if wait is None else min(wait, remaining)
+                    self._cond.wait(wait)
+                    blocked = True
+            finally:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                if tag is not None and self._tagged.get(tag) is entry:
+                    del self._tagged[tag]
+                self._cond.notify_all()
+
+    def escalate(self, tag: str, priority: int) -> None:
+        """Raise the priority of a waiting tagged caller, if it is still waiting"""
+        with self._cond:
+            entry: list[int] | None = self._tagged.get(tag)
+            if entry is not None and priority < entry[0]:
+                entry[0] = priority
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+
+    def drain(self) -> None:
+        """Empty the bucket, for example when the server reports a rate limit breach"""
+        with self._cond:
+            self._refill(time.monotonic())
+            self._tokens = 0.0
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(float(self.burst), self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+class CircuitState(StrEnum):
+    CLOSED = auto()
+    OPEN = auto()
+    HALF_OPEN = auto()
+
+
+class CircuitBreaker:
+    """Stop calling a failing API after consecutive failures, then allow a single probe after a cool-off."""
+
+    def __init__(self, threshold: int, reset_timeout: float) -> None:
+        self.threshold: int = threshold
+        self.reset_timeout: float = reset_timeout
+        self.state: CircuitState = CircuitState.CLOSED
+        self.failures: int = 0
+        self._opened_at: float = 0.0
+        self._probing: bool = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == CircuitState.CLOSED:
+                return True
+            if self.state == CircuitState.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                log.info("Circuit breaker half open, probing API")
+                self.state = CircuitState.HALF_OPEN
+            if self.state == CircuitState.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record(self, success: bool | None) -> bool:
+        """Record outcome of an allowed call, None if inconclusive; return True if this opened the circuit"""
+        with self._lock:
+            self._probing = False
+            if success is None:
+                return False
+            if success:
+                if self.state != CircuitState.CLOSED:
+                    log.info("Circuit breaker closed, API recovered")
+                self.state = CircuitState.CLOSED
+                self.failures = 0
+                return False
+            self.failures += 1
+            self._opened_at = time.monotonic()
+            if self.state != CircuitState.OPEN and (self.state == CircuitState.HALF_OPEN or self.failures >= self.threshold):
+                log.warning("Circuit breaker open after %s failures, pausing API for %ss", self.failures, self.reset_timeout)
+                self.state = CircuitState.OPEN
+                return True
+            return False
+
+
 class APIClient:
-    def lookup(self, reg: str) -> dict[str, Any]:
+    def lookup(self, reg: str, priority: LookupPriority = LookupPriority.LIVE) -> dict[str, Any]:
+        raise NotImplementedError()
+
+    def lookup_many(
+        self, regs: Iterable[str], priority: LookupPriority = LookupPriority.BACKGROUND
+    ) -> dict[str, dict[str, Any]]:
+        """Lookup several plates, returning results by upper cased plate in input order with duplicates removed"""
+        return {reg: self.lookup(reg, priority=priority) for reg in dict.fromkeys(reg.upper() for reg in regs)}
+
+    def warm_up(self, regs: Iterable[str], refresh: bool = False) -> int:
+        """Lookup plates ahead of their first sighting, returning count successfully cached"""
         raise NotImplementedError()
 
+    def close(self) -> None:
+        """Release any pooled connections or cache resources"""
+
 
 class DVLAClient(APIClient):
     ID = "GB"
@@ -34,18 +348,53 @@ class DVLAClient(APIClient):
         self,
         api_key: str,
         cache_ttl: int = 60 * 60 * 6,
+        max_stale: int = 0,
         cache_type: CacheType = CacheType.MEMORY,
         cache_dir: Path | None = None,
+        negative_cache_ttl: int = 0,
+        error_cache_ttl: int = 0,
         verify_plate: str | None = None,
         test: bool = False,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 10.0,
+        pool_size: int = 4,
+        rate_limit: float = 0,
+        rate_burst: int = 1,
+        max_queue_wait: float = 30.0,
+        breaker_threshold: int = 0,
+        breaker_reset: float = 60.0,
     ) -> None:
         self.cache_session: _CachedSession | None = None
-        if cache_type == CacheType.FILE and cache_dir:
+        self.pool_size: int = pool_size
+        # session is long lived so TLS connections are kept alive and reused across lookups
+        session_args: dict[str, Any] = {"pool_connections": 1, "pool_maxsize": pool_size}
+        # expired results are returned immediately, and refreshed by requests-cache in a background thread
+        session_args["stale_while_revalidate"] = max_stale if max_stale > 0 else False
+        session_args["key_fn"] = registration_cache_key
+        if cache_type == CacheType.SQLITE and cache_dir:
+            try:
+                db_path: Path = cache_dir / "dvla_cache.sqlite"
+                sqlite_cache: SQLiteCache = SQLiteCache(db_path=db_path, wal=True)
+                log.debug("Caching DVLA in %s for %s", db_path, cache_ttl)
+                self.cache_session = _CachedSession(
+                    allowable_methods=["GET", "POST"],
+                    expire_after=cache_ttl,
+                    backend=sqlite_cache,
+                    **session_args,
+                )
+            except Exception as e:
+                log.error("Unable to configure SQLite caching, reverting to in memory: %s", e)
+                cache_type = CacheType.MEMORY
+        elif cache_type == CacheType.FILE and cache_dir:
             try:
                 file_cache: FileCache = FileCache(cache_name=str(cache_dir), use_cache_dir=True)
                 log.debug("Caching DVLA at %s for %s", file_cache.cache_dir, cache_ttl)
                 self.cache_session = _CachedSession(
-                    cache_name="dvla_cache", allowable_methods=["GET", "POST"], expire_after=cache_ttl, backend=file_cache
+                    cache_name="dvla_cache",
+                    allowable_methods=["GET", "POST"],
+                    expire_after=cache_ttl,
+                    backend=file_cache,
+                    **session_args,
                 )
             except Exception as e:
                 log.error("Unable to configure file system caching, reverting to in memory: %s", e)
@@ -57,19 +406,156 @@ class DVLAClient(APIClient):
             else:
                 log.debug("Caching DVLA in memory for %s", cache_ttl)
             self.cache_session = _CachedSession(
-                cache_name="dvla_cache", allowable_methods=["GET", "POST"], backend="memory", expire_after=cache_ttl
+                cache_name="dvla_cache",
+                allowable_methods=["GET", "POST"],
+                backend="memory",
+                expire_after=cache_ttl,
+                **session_args,
             )
 
+        self.timeout: tuple[float, float] = (connect_timeout, read_timeout)
+        self.rate_limiter: TokenBucket | None = TokenBucket(rate_limit, rate_burst) if rate_limit > 0 else None
+        self.max_queue_wait: float = max_queue_wait
+        self.breaker: CircuitBreaker | None = (
+            CircuitBreaker(breaker_threshold, breaker_reset) if breaker_threshold > 0 else None
+        )
+        # priority of the lookup in progress on this thread, anything else such as cache refresh is background
+        self._priority = threading.local()
+        if self.rate_limiter is not None:
+            self.cache_session.before_send = self._throttle
+        self.stats: LookupStats = LookupStats()
+        self._stats_lock = threading.Lock()
+        self._seen_connections: weakref.WeakSet[Any] = weakref.WeakSet()
+        self._single_flight = SingleFlight(on_escalate=self._escalate)
+        self.negative_cache_ttl: int = negative_cache_ttl
+        self.error_cache_ttl: int = error_cache_ttl
+        self._failures = FailureCache()
         self.api_key: str = api_key
         self.env_prefix: Literal["uat."] | Literal[""] = "uat." if test else ""
         if verify_plate:
-            result: dict[str, Any] = self.lookup(reg=verify_plate)
+            result: dict[str, Any] = self.lookup(reg=verify_plate, priority=LookupPriority.BACKGROUND)
             if result and result["success"]:
                 log.info("Verified DVLA API lookup using %s, details: %s", verify_plate, result["plate"])
             else:
                 log.error("DVLA startup verificatio failed: %s", result)
 
-    def lookup(self, reg: str) -> dict[str, Any]:
+    def lookup(self, reg: str, priority: LookupPriority = LookupPriority.LIVE) -> dict[str, Any]:
+        with self._stats_lock:
+            self.stats.lookups += 1
+        key: str = reg.upper()
+        failure: tuple[dict[str, Any], bool] | None = self._failures.get(key)
+        if failure is not None:
+            failed_result, negative = failure
+            with self._stats_lock:
+                if negative:
+                    self.stats.negative_hits += 1
+                else:
+                    self.stats.error_hits += 1
+            log.debug("DVLA lookup for %s answered from failure cache, negative=%s", reg, negative)
+            return {**failed_result, "failure_cached": True}
+        # concurrent lookups for the same plate, e.g. from file system and Frigate, share a single API call
+        result, shared = self._single_flight.run(key, lambda: self._fetch_and_remember(reg, priority), priority)
+        if shared:
+            with self._stats_lock:
+                self.stats.coalesced += 1
+            log.debug("DVLA lookup for %s shared with in-flight request", reg)
+            return dict(result)
+        return result
+
+    def lookup_many(
+        self, regs: Iterable[str], priority: LookupPriority = LookupPriority.BACKGROUND, max_workers: int | None = None
+    ) -> dict[str, dict[str, Any]]:
+        """Lookup several plates, answering cached plates first and fanning out the rest
+
+        Misses are looked up concurrently, bounded by max_workers or the connection pool
+        size, and still pass through the rate limiter and circuit breaker.
+        """
+        unique: list[str] = list(dict.fromkeys(reg.upper() for reg in regs))
+        results: dict[str, dict[str, Any]] = {}
+        misses: list[str] = []
+        for reg in unique:
+            if self._failures.get(reg) is not None or self._is_cached(reg):
+                results[reg] = self.lookup(reg, priority=priority)
+            else:
+                misses.append(reg)
+        log.debug("DVLA batch lookup of %s plates, %s cached, %s to fetch", len(unique), len(results), len(misses))
+        if misses:
+            workers: int = max(1, min(max_workers or self.pool_size, len(misses)))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="dvla-lookup") as executor:
+                results.update(zip(misses, executor.map(partial(self.lookup, priority=priority), misses), strict=True))
+        return {reg: results[reg] for reg in unique}
+
+    def _is_cached(self, reg: str) -> bool:
+        if self.cache_session is None:
+            return False
+        return bool(self.cache_session.cache.contains(key=registration_key(reg, uat=bool(self.env_prefix))))
+
+    def warm_up(self, regs: Iterable[str], refresh: bool = False) -> int:
+        """Lookup plates at background priority, so first sightings are answered from cache
+
+        With refresh, plates already cached are fetched again from the API rather than
+        waiting for their cached result to expire.
+        """
+        warmed: int = 0
+        unique: list[str] = list(dict.fromkeys(reg.upper() for reg in regs))
+        log.info("Warming DVLA cache for %s plates, refresh=%s", len(unique), refresh)
+        for reg in unique:
+            if refresh:
+                result, _ = self._single_flight.run(
+                    reg,
+                    partial(self._fetch_and_remember, reg, LookupPriority.BACKGROUND, refresh=True),
+                    LookupPriority.BACKGROUND,
+                )
+            else:
+                result = self.lookup(reg, priority=LookupPriority.BACKGROUND)
+            if result.get("success"):
+                warmed += 1
+            else:
+                log.warning("DVLA cache warm up failed for %s: %s", reg, lookup_failure_reason(result))
+        log.info("Warmed DVLA cache for %s of %s plates", warmed, len(unique))
+        return warmed
+
+    def _fetch_and_remember(self, reg: str, priority: LookupPriority, refresh: bool = False) -> dict[str, Any]:
+        # while the circuit is open, only already cached results are used
+        allowed: bool = self.breaker.allow() if self.breaker else True
+        self._priority.value = priority
+        self._priority.key = reg.upper()
+        try:
+            result: dict[str, Any] = self._fetch(reg, only_if_cached=not allowed, force_refresh=refresh and allowed)
+        finally:
+            del self._priority.value
+            del self._priority.key
+        if "circuit_open" in result:
+            with self._stats_lock:
+                self.stats.short_circuited += 1
+            return result
+        if self.breaker and allowed:
+            # answers from cache say nothing about the API, but still end a half open probe
+            success: bool | None = None
+            if "rate_limited" not in result and not result.get("cache", {}).get("cached"):
+                success = not self._is_transient(result)
+            if self.breaker.record(success):
+                with self._stats_lock:
+                    self.stats.circuit_trips += 1
+        if not result.get("success"):
+            if self._is_negative(result):
+                self._failures.put(reg.upper(), result, self.negative_cache_ttl, negative=True)
+            elif "lookup_fail" not in result:
+                self._failures.put(reg.upper(), result, self.error_cache_ttl, negative=False)
+        return result
+
+    @staticmethod
+    def _is_negative(result: dict[str, Any]) -> bool:
+        """Plate is definitively unknown, as opposed to a transient API or network failure"""
+        return "reg_match_fail" in result or result.get("api_status") in (400, 404)
+
+    @staticmethod
+    def _is_transient(result: dict[str, Any]) -> bool:
+        """Failure suggesting the API is down or overloaded"""
+        status: int | None = result.get("api_status")
+        return "api_exception" in result or (status is not None and (status == 429 or status >= 500))
+
+    def _fetch(self, reg: str, only_if_cached: bool = False, force_refresh: bool = False) -> dict[str, Any]:
         if not re.match(self.REG_RE, reg):
             log.warning(f"DVLA SKIP invalid reg {reg}")
             return {"reg_match_fail": self.ID, "plate": {}, "success": False}
@@ -77,38 +563,106 @@ class DVLAClient(APIClient):
             log.error("Unable to lookup, failed to configure cache session or fallback")
             return {"lookup_fail": "missing cache", "plate": {}, "success": False}
         try:
-            with self.cache_session as client:
-                log.debug(f"Fetching DVLA info from API, cache_ttl={self.cache_session.expire_after}")
-                response: CachedResponse = cast(
-                    "CachedResponse",
-                    client.post(
-                        url=f"https://{self.env_prefix}driver-vehicle-licensing.api.gov.uk/vehicle-enquiry/v1/vehicles",
-                        headers={"x-api-key": self.api_key, "Content-Type": "application/json"},
-                        json={"registrationNumber": reg.upper()},
-                    ),
-                )
-                if response.from_cache:
-                    log.debug("DVLA API cached response, created %s", response.created_at)
-                if response.status_code == 200:
-                    plate: dict[str, Any] = cast("dict[str,Any]", response.json())
-                    return {
-                        "cache": {
-                            "calls": len(response.history) if response.history else 0,
-                            "cached": response.from_cache,
-                            "created": response.created_at.isoformat() if response.created_at else None,
-                        },
-                        "plate": plate,
-                        "description": f"{plate.get('colour', '').title()} {plate.get('make', '').title()}" if plate else None,
-                        "success": True,
-                    }
-
-                log.error("DVLA API FAIL: %s", response.json())
+            log.debug(f"Fetching DVLA info from API, cache_ttl={self.cache_session.expire_after}")
+            started: float = time.perf_counter()
+            response: CachedResponse = cast(
+                "CachedResponse",
+                self.cache_session.post(
+                    url=f"https://{self.env_prefix}driver-vehicle-licensing.api.gov.uk/vehicle-enquiry/v1/vehicles",
+                    headers={"x-api-key": self.api_key, "Content-Type": "application/json"},
+                    json={"registrationNumber": reg.upper()},
+                    timeout=self.timeout,
+                    only_if_cached=only_if_cached,
+                    force_refresh=force_refresh,
+                ),
+            )
+            if only_if_cached and response.status_code == 504:  # requests-cache response for a cache miss
+                log.debug("DVLA circuit open, skipping API lookup for %s", reg)
+                return {"circuit_open": "API unavailable, lookups paused", "plate": {}, "success": False}
+            self._record_call(response, time.perf_counter() - started)
+            if response.from_cache:
+                log.debug("DVLA API cached response, created %s", response.created_at)
+            if response.status_code == 200:
+                plate: dict[str, Any] = cast("dict[str,Any]", response.json())
                 return {
-                    "api_errors": response.json()["errors"],
-                    "api_status": response.status_code,
-                    "plate": {},
-                    "success": False,
+                    "cache": {
+                        "calls": len(response.history) if response.history else 0,
+                        "cached": response.from_cache,
+                        "stale": bool(response.from_cache and response.is_expired),
+                        "created": response.created_at.isoformat() if response.created_at else None,
+                    },
+                    "plate": plate,
+                    "description": f"{plate.get('colour', '').title()} {plate.get('make', '').title()}" if plate else None,
+                    "success": True,
                 }
+
+            log.error("DVLA API FAIL: %s", response.json())
+            return {
+                "api_errors": response.json()["errors"],
+                "api_status": response.status_code,
+                "plate": {},
+                "success": False,
+            }
+        except RateLimitedError as e:
+            return {"rate_limited": str(e), "plate": {}, "success": False}
         except Exception as e:
             log.exception("Failed to fetch DVLA reg data")
             return {"api_exception": str(e), "plate": {}, "success": False}
+
+    def _throttle(self) -> None:
+        if self.rate_limiter is None:
+            return
+        key: str | None = getattr(self._priority, "key", None)
+        priority: LookupPriority = getattr(self._priority, "value", LookupPriority.BACKGROUND)
+        if key is not None:
+            # a more urgent caller may have joined this lookup while it waited
+            priority = LookupPriority(self._single_flight.priority(key, priority))
+        waited: float | None = self.rate_limiter.acquire(priority, timeout=self.max_queue_wait, tag=key)
+        with self._stats_lock:
+            if waited is None:
+                self.stats.throttle_timeouts += 1
+            else:
+                self.stats.queue_seconds += waited
+                if waited > 0:
+                    self.stats.throttled += 1
+        if waited is None:
+            log.warning("DVLA API call abandoned after %ss queued for rate limit", self.max_queue_wait)
+            raise RateLimitedError(f"rate limit queue wait exceeded {self.max_queue_wait}s")
+        if waited > 0:
+            log.debug("DVLA API call waited %.3fs for rate limit at priority %s", waited, priority.name)
+
+    def _escalate(self, key: str, priority: int) -> None:
+        log.debug("DVLA lookup for %s raised to %s priority by a joining caller", key, LookupPriority(priority).name)
+        if self.rate_limiter is not None:
+            self.rate_limiter.escalate(key, priority)
+
+    def _record_call(self, response: "CachedResponse", elapsed: float) -> None:
+        with self._stats_lock:
+            if response.from_cache:
+                self.stats.cache_hits += 1
+                if response.is_expired:
+                    self.stats.stale_hits += 1
+                return
+            self.stats.api_calls += 1
+            self.stats.api_seconds += elapsed
+            if response.status_code == 429:
+                self.stats.http_429 += 1
+                if self.rate_limiter is not None:
+                    self.rate_limiter.drain()
+            conn_info: Any = getattr(response, "conn_info", None)
+            if conn_info is not None:
+                try:
+                    if conn_info in self._seen_connections:
+                        self.stats.reused_connections += 1
+                    else:
+                        self._seen_connections.add(conn_info)
+                        self.stats.new_connections += 1
+                except TypeError:
+                    log.debug("DVLA connection info not trackable: %s", conn_info)
+        log.debug("DVLA API call took %.3fs", elapsed)
+
+    def close(self) -> None:
+        if self.cache_session is not None:
+            log.info("Closing DVLA client, stats: %s", self.stats.as_dict())
+            self.cache_session.close()
+            self.cache_session = None
@@ -1,6 +1,7 @@
 import logging
 import sys
-from typing import Any, cast
+import time
+from typing import TYPE_CHECKING, Any, cast
 
 import paho.mqtt.client as mqtt
 import structlog
@@ -12,11 +13,21 @@ from pydantic_settings import CliApp
 from watchdog.observers import Observer
 
 import anpr2mqtt
+from anpr2mqtt.catch_up import BacklogScanner, HighWaterMark
+from anpr2mqtt.config_reload import ConfigReloader, ReloadScope, config_file_path
 from anpr2mqtt.event_handler import EventHandler
 from anpr2mqtt.frigate_handler import CameraConfig, FrigateHandler
+from anpr2mqtt.handler_common import SCHEDULER, build_dvla_client, start_dvla_warm_up
 from anpr2mqtt.hass import HomeAssistantPublisher
-from anpr2mqtt.settings import CameraSettings, EventSettings, Settings
-from anpr2mqtt.tracker import Tracker, compute_time_analysis
+from anpr2mqtt.outbound import OutboundQueue
+from anpr2mqtt.polling import ScandirPollingObserver
+from anpr2mqtt.settings import TARGET_TYPE_PLATE, CameraSettings, EventSettings, MQTTSettings, Settings, WatchMode
+from anpr2mqtt.tracker import CompiledTargets, Tracker, compile_targets
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from anpr2mqtt.api_client import APIClient
 
 log = structlog.get_logger()
 # run like docker run --restart always -d -v /ftp:/ftp d4d8dea7d1e3
@@ -52,6 +63,26 @@ def on_disconnect(
         log.warning("Disconnect failure from broker", result_code=rc)
 
 
+def create_client(mqtt_settings: MQTTSettings, protocol: MQTTProtocolVersion, client_id: str) -> mqtt.Client:
+    """Create a client, all clients share the same connect and reconnect handling"""
+    client = mqtt.Client(
+        callback_api_version=CallbackAPIVersion.VERSION2,
+        clean_session=True if protocol != MQTTProtocolVersion.MQTTv5 else None,
+        client_id=client_id,
+        protocol=protocol,
+    )
+    client.on_connect = on_connect
+    client.on_disconnect = on_disconnect
+    client.username_pw_set(username=mqtt_settings.user, password=mqtt_settings.password)
+    return client
+
+
+def connect_client(client: mqtt.Client, mqtt_settings: MQTTSettings) -> None:
+    rc: MQTTErrorCode = client.connect(host=mqtt_settings.host, port=int(mqtt_settings.port), keepalive=60)
+    log.info("Client connection requested", result_code=rc)
+    client.loop_start()
+
+
 def main_loop() -> None:
     """Watch a directory, post any matching files to MQTT after optionally analyzing the image"""
     structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(logging.INFO))
@@ -82,21 +113,21 @@ def main_loop() -> None:
     log.debug("MQTT protocol set to %r", protocol)
 
     try:
-        client = mqtt.Client(
-            callback_api_version=CallbackAPIVersion.VERSION2,
-            clean_session=True if protocol != MQTTProtocolVersion.MQTTv5 else None,
-            client_id="anpr2mqtt",
-            protocol=protocol,
+        client = create_client(settings.mqtt, protocol, "anpr2mqtt")
+        image_client: mqtt.Client | None = None
+        if settings.mqtt.separate_image_client:
+            image_client = create_client(settings.mqtt, protocol, "anpr2mqtt-images")
+        outbound: OutboundQueue = OutboundQueue.from_settings(
+            client, settings.mqtt, settings.tracker.data_dir, image_client=image_client
         )
-        client.on_connect = on_connect
-        client.on_disconnect = on_disconnect
-        client.username_pw_set(username=settings.mqtt.user, password=settings.mqtt.password)
-        rc: MQTTErrorCode = client.connect(host=settings.mqtt.host, port=int(settings.mqtt.port), keepalive=60)
-        log.info("Client connection requested", result_code=rc)
-        client.loop_start()
+        # hooks connection callbacks, so must be in place before connecting
+        outbound.start()
+        connect_client(client, settings.mqtt)
+        if image_client is not None:
+            connect_client(image_client, settings.mqtt)
         log.info(f"Connected to MQTT at {settings.mqtt.host}:{settings.mqtt.port} as {settings.mqtt.user}")
         log.info(f"Publishing at {settings.mqtt.topic_root}")
-        publisher = HomeAssistantPublisher(client, settings.homeassistant)
+        publisher = HomeAssistantPublisher(client, settings.homeassistant, outbound=outbound)
 
     except Exception as e:
         log.error("Failed to connect to MQTT: %s", e, exc_info=1)
@@ -108,9 +139,27 @@ def main_loop() -> None:
         log.error("Failed to setup file system watchdog: %s", e)
         sys.exit(-400)
 
+    # Single DVLA client shared by all handlers, so its connection pool and cache are reused
+    api_client: APIClient | None = build_dvla_client(settings.dvla)
+
     # Maps camera name → (event_config, camera_settings, tracker, state_topic, image_topic)
     # Used by FrigateHandler to share the same pipeline as filesystem events.
     frigate_camera_configs: dict[str, CameraConfig] = {}
+    reload_scopes: list[ReloadScope] = []
+    # with the polling observer for the handler, if polled, whose primed index the catch-up has to match
+    catch_up_handlers: list[tuple[EventHandler, ScandirPollingObserver | None]] = []
+    # network mounts don't deliver inotify events, those events are polled by their own observers
+    polling_observers: list[ScandirPollingObserver] = []
+    # targets compiled once per type and shared by its trackers, as they are on reload
+    compiled_targets: dict[str, CompiledTargets] = {}
+
+    def targets_for(target_type: str) -> CompiledTargets:
+        if target_type not in compiled_targets:
+            compiled_targets[target_type] = compile_targets(target_type, settings.targets.get(target_type))
+        return compiled_targets[target_type]
+
+    # from the compiled targets, so members of group files are warmed as well as inline ones
+    start_dvla_warm_up(api_client, settings.dvla, targets_for(TARGET_TYPE_PLATE).ids)
 
     for event_config in settings.events:
         camera: CameraSettings | None = None
@@ -125,10 +174,11 @@ def main_loop() -> None:
             tracker = Tracker(
                 event_config.target_type,
                 tracker_config=settings.tracker,
-                target_config=settings.targets.get(event_config.target_type),
+                compiled=targets_for(event_config.target_type),
                 region=event_config.region,
                 auto_match_tolerance=event_config.auto_match_tolerance,
             )
+            reload_scopes.append(ReloadScope(tracker, event_config))
             if camera.name not in frigate_camera_configs:
                 frigate_camera_configs[camera.name] = (event_config, camera, tracker, state_topic, image_topic)
             event_handler = EventHandler(
@@ -142,9 +192,22 @@ def main_loop() -> None:
                 dvla_config=settings.dvla,
                 tracker=tracker,
                 mqtt_topic_root=settings.mqtt.topic_root,
+                api_client=api_client,
+                high_water=HighWaterMark.for_event(settings.tracker.data_dir, event_config)
+                if event_config.catch_up_rate > 0
+                else None,
             )  # ty:ignore[invalid-argument-type]
-            log.debug("Scheduling watchdog for %s", event_config.watch_path)
-            observer.schedule(event_handler, str(event_config.watch_path), recursive=event_config.watch_tree)  # ty:ignore[invalid-argument-type]
+            polling_observer: ScandirPollingObserver | None = None
+            if event_config.watch_mode == WatchMode.POLL:
+                log.debug("Scheduling polling every %ss for %s", event_config.poll_interval, event_config.watch_path)
+                polling_observer = ScandirPollingObserver(timeout=event_config.poll_interval)
+                polling_observer.schedule(event_handler, str(event_config.watch_path), recursive=event_config.watch_tree)  # ty:ignore[invalid-argument-type]
+                polling_observers.append(polling_observer)
+            else:
+                log.debug("Scheduling watchdog for %s", event_config.watch_path)
+                observer.schedule(event_handler, str(event_config.watch_path), recursive=event_config.watch_tree)  # ty:ignore[invalid-argument-type]
+            if event_handler.high_water is not None:
+                catch_up_handlers.append((event_handler, polling_observer))
             publisher.publish_sensor_discovery(state_topic=state_topic, event_config=event_config, camera=camera)
             if settings.homeassistant.image_entity:
                 publisher.publish_image_discovery(
@@ -155,29 +218,7 @@ def main_loop() -> None:
                     state_topic=state_topic, image_topic=image_topic, event_config=event_config, camera=camera
                 )
             # selectively publish known targets as HA sensors, using last seen timestamp as state value
-            for entity_id, targets in tracker.entities.items():
-                target_topic: str = f"{settings.mqtt.topic_root}/{event_config.event}/targets/{entity_id}/state"
-                log.info("Publishing sensor.%s for %s targets", entity_id, len(targets))
-                icon: str | None = targets[0].icon if len(targets) > 1 and targets[0].icon else event_config.icon
-                publisher.publish_target_sensor_discovery(
-                    entity_id=entity_id,
-                    target_type=event_config.target_type,
-                    icon=icon,
-                    targets=targets,
-                    state_topic=target_topic,
-                )
-
-                previous_sightings: list[str] = []
-                for target in targets:
-                    previous_sightings.extend(tracker.history(target.id, target.target_type))
-                if previous_sightings:
-                    time_analysis: dict[str, Any] = compute_time_analysis(sorted(previous_sightings))
-                else:
-                    time_analysis = {"last_seen": None}
-                publisher.publish_target_state(
-                    state_topic=target_topic,
-                    time_analysis=time_analysis,
-                )
+            publisher.publish_target_sensors(settings.mqtt.topic_root, event_config, tracker)
 
             # post initial empty state message
             publisher.post_state_message(state_topic, sighting=None, event_config=event_config, camera=camera)
@@ -191,8 +232,32 @@ def main_loop() -> None:
             )
 
     publisher.start()
+    config_path: Path | None = config_file_path()
+    if settings.config_reload and config_path is not None and config_path.exists():
+        reloader = ConfigReloader(config_path, settings, publisher, reload_scopes)
+        for watched_dir in reloader.watched_dirs():
+            observer.schedule(reloader, str(watched_dir), recursive=False)
+        log.info("Watching %s for target changes", config_path)
+    catch_up_cutoff: float = time.time()
+    # created before the observers start, so they take the marks before any live event can move them
+    # polled directories were indexed when scheduled, so their catch-up stops where that index leaves off
+    scanners: list[BacklogScanner] = [
+        BacklogScanner(
+            handler,
+            handler.high_water,
+            handler.event_config.catch_up_rate,
+            cutoff=polled.cutoff if polled is not None else catch_up_cutoff,
+        )
+        for handler, polled in catch_up_handlers
+        if handler.high_water is not None
+    ]
     observer.start()
+    for polling_observer in polling_observers:
+        polling_observer.start()
+    for scanner in scanners:
+        scanner.start()
 
+    frigate_handler: FrigateHandler | None = None
     if settings.frigate.enabled:
         event_settings: EventSettings | None = None
         for cfg in settings.events:
@@ -204,10 +269,11 @@ def main_loop() -> None:
         default_tracker = Tracker(
             target_type="plate",
             tracker_config=settings.tracker,
-            target_config=settings.targets.get("plate"),
+            compiled=targets_for(TARGET_TYPE_PLATE),
             region=event_settings.region,
             auto_match_tolerance=event_settings.auto_match_tolerance,
         )
+        reload_scopes.append(ReloadScope(default_tracker))
         frigate_handler = FrigateHandler(
             mqtt_client=client,
             frigate_settings=settings.frigate,
@@ -217,6 +283,7 @@ def main_loop() -> None:
             camera_configs=frigate_camera_configs,
             mqtt_topic_root=settings.mqtt.topic_root,
             default_tracker=default_tracker,
+            api_client=api_client,
         )
         frigate_handler.start()
     else:
@@ -229,8 +296,24 @@ def main_loop() -> None:
     except Exception as e:
         log.error("Failed in run observer loop: %s", e, exc_info=1)
     finally:
+        for scanner in scanners:
+            scanner.stop()
+        for polling_observer in polling_observers:
+            polling_observer.stop()
         observer.stop()
         observer.join()
+        for polling_observer in polling_observers:
+            polling_observer.join()
+        publisher.state_coalescer.flush_all()
+        SCHEDULER.stop()
+        publisher.outbound.close()
+        if frigate_handler is not None:
+            frigate_handler.close()
+        if publisher.outbound.image_client is not None:
+            publisher.outbound.image_client.loop_stop()
+            publisher.outbound.image_client.disconnect()
+        if api_client is not None:
+            api_client.close()
         log.info("loop observer ended")
 
 
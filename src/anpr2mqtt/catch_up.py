@@ -0,0 +1,207 @@
+"""Catch up on images written to watched directories while the service was stopped
+
+Watchdog only reports files closed after the observer starts, so on startup each watched
+directory is scanned for images newer than the last one processed for that event.
+"""
+
+import datetime as dt
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import structlog
+import tzlocal
+
+from anpr2mqtt import serialization
+from anpr2mqtt.event_handler import examine_file
+
+if TYPE_CHECKING:
+    from anpr2mqtt.event_handler import EventHandler
+    from anpr2mqtt.settings import EventSettings
+
+log = structlog.get_logger()
+
+
+class HighWaterMark:
+    """Timestamp of the newest image processed for an event, persisted so a restart knows where to resume
+
+    While a catch-up scan is running, live events are held back from advancing the mark, otherwise a
+    crash part way through the backlog would skip the rest of it on the next start. The hold is only
+    released once the whole backlog is processed.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path: Path = path
+        self._lock = threading.Lock()
+        self._held: bool = False
+        self._deferred: dt.datetime | None = None
+        self.value: dt.datetime | None = self._load()
+
+    @classmethod
+    def for_event(cls, data_dir: Path, event_config: "EventSettings") -> "HighWaterMark":
+        return cls(data_dir / "catch_up" / f"{event_config.event}_{event_config.camera}.json")
+
+    def _load(self) -> dt.datetime | None:
+        try:
+            if self.path.exists():
+                return dt.datetime.fromisoformat(serialization.loads(self.path.read_bytes())["last_processed"])
+        except Exception as e:
+            log.warning("Unable to read catch-up mark at %s: %s", self.path, e)
+        return None
+
+    def _save(self) -> None:
+        if self.value is None:
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path: Path = self.path.with_suffix(".tmp")
+            tmp_path.write_bytes(serialization.dumps({"last_processed": self.value.isoformat()}))
+            tmp_path.replace(self.path)
+        except Exception as e:
+            log.warning("Unable to save catch-up mark at %s: %s", self.path, e)
+
+    def advance(self, timestamp: dt.datetime, backlog: bool = False) -> None:
+        with self._lock:
+            if self._held and not backlog:
+                if self._deferred is None or timestamp > self._deferred:
+                    self._deferred = timestamp
+                return
+            if self.value is None or timestamp > self.value:
+                self.value = timestamp
+                self._save()
+
+    def hold(self) -> None:
+        with self._lock:
+            self._held = True
+
+    def release(self) -> None:
+        with self._lock:
+            self._held = False
+            deferred: dt.datetime | None = self._deferred
+            self._deferred = None
+        if deferred is not None:
+            self.advance(deferred)
+
+
+@dataclass(frozen=True, slots=True)
+class BacklogFile:
+    timestamp: dt.datetime
+    path: Path
+    size: int
+
+
+def scan_backlog(
+    watch_path: Path, image_name_re: re.Pattern[str], recursive: bool, after: dt.datetime, before: float
+) -> list[BacklogFile]:
+    """Images newer than `after` and last modified before `before`, oldest first
+
+    Names are matched before anything is stat'ed, and each matching entry is stat'ed only once.
+    """
+    found: list[BacklogFile] = []
+    pending: list[str] = [str(watch_path)]
+    while pending:
+        try:
+            with os.scandir(pending.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if recursive:
+                            pending.append(entry.path)
+                        continue
+                    if not image_name_re.match(entry.name) or not entry.is_file():
+                        continue
+                    stat: os.stat_result = entry.stat()
+                    if stat.st_mtime >= before or stat.st_size == 0:
+                        continue
+                    image_info = examine_file(Path(entry.path), image_name_re, size=stat.st_size)
+                    if image_info is not None and image_info.timestamp > after:
+                        found.append(BacklogFile(image_info.timestamp, Path(entry.path), stat.st_size))
+        except OSError as e:
+            log.warning("Unable to scan %s for missed images: %s", watch_path, e)
+    found.sort(key=lambda f: f.timestamp)
+    return found
+
+
+class BacklogScanner:
+    """Feed images missed while stopped through an event handler, oldest first, at a throttled rate
+
+    Runs on its own thread, and the handler processes one file at a time, so live events wait for
+    at most one backlog file.
+    """
+
+    def __init__(self, handler: "EventHandler", high_water: HighWaterMark, rate: float, cutoff: float | None = None) -> None:
+        self.handler: EventHandler = handler
+        self.high_water: HighWaterMark = high_water
+        self.rate: float = rate
+        # files modified after the observer started are reported by watchdog instead
+        self.cutoff: float = cutoff if cutoff is not None else time.time()
+        self.processed: int = 0
+        # read and held before the observers start, so a live event can't move the mark past the backlog first
+        self.after: dt.datetime | None = high_water.value
+        if self.after is not None:
+            high_water.hold()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(
+            target=self.run, name=f"catch-up-{self.handler.event_config.event}-{self.handler.event_config.camera}", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Stop after the file being processed, waiting up to `timeout` seconds for it"""
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                log.warning("Catch-up for %s still running after %ss", self._thread.name, timeout)
+
+    def run(self) -> None:
+        event_config = self.handler.event_config
+        if self.after is None:
+            # first run, don't replay whatever history is already in the directory
+            log.info("No catch-up mark for %s/%s yet, starting from now", event_config.event, event_config.camera)
+            self.high_water.advance(dt.datetime.fromtimestamp(self.cutoff, tz=tzlocal.get_localzone()))
+            return
+        try:
+            finished: bool = self._catch_up(self.after)
+        except Exception as e:
+            log.error("Catch-up scan failed for %s/%s: %s", event_config.event, event_config.camera, e, exc_info=1)
+            finished = False
+        if finished:
+            self.high_water.release()
+        else:
+            # live events stay held, so the next start resumes after the last backlog image processed
+            log.info(
+                "Catch-up for %s/%s incomplete, resuming from %s on next start",
+                event_config.event,
+                event_config.camera,
+                self.high_water.value,
+            )
+
+    def _catch_up(self, after: dt.datetime) -> bool:
+        """Process the backlog, returning True once all of it was processed"""
+        event_config = self.handler.event_config
+        backlog: list[BacklogFile] = scan_backlog(
+            event_config.watch_path, event_config.image_name_re, event_config.watch_tree, after, self.cutoff
+        )
+        if not backlog:
+            log.info("No missed images for %s/%s since %s", event_config.event, event_config.camera, after)
+            return True
+        log.info(
+            "Catching up on %s missed images for %s/%s since %s", len(backlog), event_config.event, event_config.camera, after
+        )
+        interval: float = 1 / self.rate if self.rate > 0 else 0
+        for backlog_file in backlog:
+            if self._stop.is_set():
+                break
+            self.handler.process_file(backlog_file.path, size=backlog_file.size, backlog=True)
+            self.processed += 1
+            if interval and self._stop.wait(interval):
+                break
+        log.info("Caught up %s missed images for %s/%s", self.processed, event_config.event, event_config.camera)
+        return self.processed == len(backlog)
@@ -0,0 +1,176 @@
+import threading
+from collections.abc import Callable
+from dataclasses import dataclass
+from pathlib import Path
+
+import structlog
+from watchdog.events import FileSystemEvent, FileSystemEventHandler
+
+from anpr2mqtt.handler_common import SCHEDULER, Scheduler, TimerHandle
+from anpr2mqtt.hass import HomeAssistantPublisher
+from anpr2mqtt.settings import EventSettings, Settings, TargetSettings
+from anpr2mqtt.tracker import CompiledTargets, Tracker, compile_targets
+
+log = structlog.get_logger()
+
+
+@dataclass
+class ReloadScope:
+    """A tracker to update on reload, with the event its target sensors are published for, if any"""
+
+    tracker: Tracker
+    event_config: EventSettings | None = None
+
+
+def config_file_path() -> Path | None:
+    yaml_file: object = Settings.model_config.get("yaml_file")
+    if isinstance(yaml_file, str | Path):
+        return Path(yaml_file)
+    return None
+
+
+def _file_stamps(targets: dict[str, TargetSettings]) -> dict[Path, float | None]:
+    """Modification times of target files referenced by groups, so edits to them count as changes"""
+    stamps: dict[Path, float | None] = {}
+    for target_settings in targets.values():
+        for group in target_settings.groups:
+            if group.file is not None:
+                try:
+                    stamps[group.file] = group.file.stat().st_mtime
+                except OSError:
+                    stamps[group.file] = None
+    return stamps
+
+
+class ConfigReloader(FileSystemEventHandler):
+    """Reload targets when the YAML config, or a target file it references, changes
+
+    Parsing, validation and compiling run on a background thread, and each tracker then has its
+    compiled targets swapped in whole. Other config sections still need a restart.
+    """
+
+    def __init__(
+        self,
+        config_path: Path,
+        settings: Settings,
+        publisher: HomeAssistantPublisher,
+        scopes: list[ReloadScope],
+        loader: Callable[[], Settings] | None = None,
+        scheduler: Scheduler | None = None,
+        debounce: float = 2.0,
+    ) -> None:
+        self.config_path: Path = config_path
+        self.settings: Settings = settings
+        # other sections are only applied at startup, so changes are compared with these
+        self.started_settings: Settings = settings
+        self.publisher: HomeAssistantPublisher = publisher
+        self.scopes: list[ReloadScope] = scopes
+        self.loader: Callable[[], Settings] = loader or (lambda: Settings())  # type: ignore[call-arg]
+        self.debounce: float = debounce
+        self._scheduler: Scheduler = scheduler or SCHEDULER
+        self._handle: TimerHandle | None = None
+        self._lock = threading.Lock()
+        self._running: bool = False
+        self._pending: bool = False
+        self._stamps: dict[Path, float | None] = _file_stamps(settings.targets)
+        self.reloads: int = 0
+        self.failures: int = 0
+
+    def watched_paths(self) -> set[Path]:
+        return {self.config_path.resolve(), *(path.resolve() for path in self._stamps)}
+
+    def watched_dirs(self) -> set[Path]:
+        return {path.parent for path in self.watched_paths()}
+
+    def on_any_event(self, event: FileSystemEvent) -> None:
+        """Debounce changes to watched files, editors often write several events per save"""
+        if event.is_directory or event.event_type not in ("modified", "closed", "created", "moved"):
+            return
+        paths: set[Path] = {Path(str(event.src_path)).resolve()}
+        if event.dest_path:
+            paths.add(Path(str(event.dest_path)).resolve())
+        if paths.isdisjoint(self.watched_paths()):
+            return
+        with self._lock:
+            if self._handle is not None and self._handle.active:
+                self._scheduler.reschedule(self._handle, self.debounce)
+            else:
+                self._handle = self._scheduler.call_later(self.debounce, self._start, "config reload")
+
+    def _start(self) -> None:
+        # compiling a large watchlist takes a while, so keep it off the shared scheduler thread
+        with self._lock:
+            if self._running:
+                self._pending = True
+                return
+            self._running = True
+        threading.Thread(target=self._run, name="config-reload", daemon=True).start()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.reload()
+            except Exception as e:
+                log.error("Config reload failed: %s", e, exc_info=1)
+            with self._lock:
+                if not self._pending:
+                    self._running = False
+                    return
+                self._pending = False
+
+    def reload(self) -> bool:
+        """Apply changed target sections, returning False if the new config is invalid"""
+        try:
+            settings: Settings = self.loader()
+        except Exception as e:
+            self.failures += 1
+            log.error("Config reload failed, keeping the current config: %s", e)
+            return False
+        stamps: dict[Path, float | None] = _file_stamps(settings.targets)
+        changed: list[str] = self._changed(settings, stamps)
+        if settings.model_dump(exclude={"targets"}) != self.started_settings.model_dump(exclude={"targets"}):
+            log.warning("Config changes outside of targets need a restart to apply")
+        # every changed type is compiled before any is swapped, so a bad target file leaves all as they were
+        compiled_targets: dict[str, CompiledTargets] = {}
+        try:
+            for target_type in changed:
+                compiled_targets[target_type] = compile_targets(target_type, settings.targets.get(target_type), strict=True)
+        except Exception as e:
+            self.failures += 1
+            log.error("Config reload failed, keeping the current config: %s", e)
+            return False
+        for target_type, compiled in compiled_targets.items():
+            for scope in self.scopes:
+                if scope.tracker.target_type == target_type:
+                    self._swap(scope, compiled)
+            log.info("Reloaded %s targets", target_type)
+        self.settings = settings
+        self._stamps = stamps
+        self.reloads += 1
+        if not changed:
+            log.info("Config file changed, targets unchanged")
+        return True
+
+    def _changed(self, settings: Settings, stamps: dict[Path, float | None]) -> list[str]:
+        changed: list[str] = []
+        for target_type in sorted(set(self.settings.targets) | set(settings.targets)):
+            new: TargetSettings | None = settings.targets.get(target_type)
+            if new != self.settings.targets.get(target_type) or (
+                new is not None
+                and any(stamps.get(g.file) != self._stamps.get(g.file) for g in new.groups if g.file is not None)
+            ):
+                changed.append(target_type)
+        return changed
+
+    def _swap(self, scope: ReloadScope, compiled: CompiledTargets) -> None:
+        before: set[str] = set(scope.tracker.entities)
+        scope.tracker.swap(compiled)
+        if scope.event_config is None:
+            return
+        after: set[str] = set(compiled.entities)
+        # unchanged discovery is skipped by the publisher, only new sensors need state from history
+        self.publisher.publish_target_sensors(
+            self.settings.mqtt.topic_root, scope.event_config, scope.tracker, state_for=after - before
+        )
+        for entity_id in before - after:
+            self.publisher.remove_target_sensor_discovery(entity_id)
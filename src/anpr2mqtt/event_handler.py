@@ -1,5 +1,6 @@
 import datetime as dt
 import re
+import threading
 from io import BytesIO
 from pathlib import Path
 from typing import TYPE_CHECKING, Any
@@ -11,6 +12,7 @@ import tzlocal
 from PIL import Image
 from watchdog.events import DirCreatedEvent, FileClosedEvent, FileCreatedEvent, RegexMatchingEventHandler
 
+from anpr2mqtt.api_client import lookup_failure_reason
 from anpr2mqtt.const import ImageInfo
 from anpr2mqtt.handler_common import AutoclearTimer, CameraGatekeeper, build_dvla_client, correct_against_good_read
 from anpr2mqtt.hass import HomeAssistantPublisher
@@ -27,6 +29,7 @@ from anpr2mqtt.tracker import Sighting, Tracker
 
 if TYPE_CHECKING:
     from anpr2mqtt.api_client import APIClient
+    from anpr2mqtt.catch_up import HighWaterMark
 
 log = structlog.get_logger()
 
@@ -44,6 +47,8 @@ class EventHandler(RegexMatchingEventHandler):
         dvla_config: DVLASettings,
         tracker: Tracker,
         mqtt_topic_root: str = "anpr2mqtt",
+        api_client: "APIClient | None" = None,
+        high_water: "HighWaterMark | None" = None,
     ) -> None:
         fqre = f"{event_config.watch_path.resolve() / event_config.image_name_re.pattern}"
         super().__init__(regexes=[fqre], ignore_directories=True, case_sensitive=True)
@@ -60,7 +65,9 @@ class EventHandler(RegexMatchingEventHandler):
             log.info("Images available from web server with prefix %s", event_config.image_url_base)
         self.image_topic: str = image_topic
         self.mqtt_topic_root: str = mqtt_topic_root
-        self.api_client: APIClient | None = build_dvla_client(dvla_config, event_config.target_type)
+        if api_client is None or event_config.target_type != TARGET_TYPE_PLATE:
+            api_client = build_dvla_client(dvla_config, event_config.target_type)
+        self.api_client: APIClient | None = api_client
         if self.api_client:
             log.info("Configured gov API lookup, cache type %s, ttl %s", dvla_config.cache_type, dvla_config.cache_ttl)
         else:
@@ -69,6 +76,9 @@ class EventHandler(RegexMatchingEventHandler):
         self._autoclear_timer = AutoclearTimer()
         self._camera_gate = CameraGatekeeper()
         self._last_good_plate: tuple[str, dt.datetime] | None = None
+        self.high_water: HighWaterMark | None = high_water
+        # live events and the startup catch-up scan share the handler state, one file at a time
+        self._lock = threading.Lock()
 
     @property
     def ignore_directories(self) -> bool:
@@ -85,11 +95,21 @@ class EventHandler(RegexMatchingEventHandler):
             log.debug("on_closed: skipping irrelevant event: %s", event)
             return
         log.info("New complete file detected: %s", event.src_path)
-
-        file_path = Path(str(event.src_path))
-        if not file_path.stat() or file_path.stat().st_size == 0:
+        self.process_file(Path(str(event.src_path)))
+
+    def process_file(self, file_path: Path, size: int | None = None, backlog: bool = False) -> None:
+        """Run an image through the pipeline, size is passed when already known from a directory scan"""
+        with self._lock:
+            image_info: ImageInfo | None = self._process_file(file_path, size)
+        if image_info is not None and self.high_water is not None:
+            self.high_water.advance(image_info.timestamp, backlog=backlog)
+
+    def _process_file(self, file_path: Path, size: int | None) -> ImageInfo | None:
+        if size is None:
+            size = file_path.stat().st_size
+        if size == 0:
             log.warning("Empty image file, ignoring, at %s", file_path)
-            return
+            return None
         url: str | None = (
             f"{self.event_config.image_url_base}/{file_path.name!s}" if self.event_config.image_url_base and file_path else None
         )
@@ -100,8 +120,9 @@ class EventHandler(RegexMatchingEventHandler):
                 file_path.name if file_path else None,
             )
 
+        image_info: ImageInfo | None = None
         try:
-            image_info: ImageInfo | None = examine_file(file_path, self.event_config.image_name_re)
+            image_info = examine_file(file_path, self.event_config.image_name_re, size=size)
             if image_info is not None and image_info.target is not None:
                 target_id: str = image_info.target
                 log.info("Examining image for %s at %s", target_id, file_path.absolute())
@@ -122,6 +143,7 @@ class EventHandler(RegexMatchingEventHandler):
                 sighting: Sighting = self.tracker.find(target_id)
 
                 reg_info: dict[str, Any] | None = None
+                reg_info_error: str | None = None
                 if (
                     sighting.target.lookup
                     and self.api_client
@@ -132,8 +154,10 @@ class EventHandler(RegexMatchingEventHandler):
                     if api_info.get("success"):
                         reg_info = api_info.get("plate")
                         if sighting.target.description is None and api_info and api_info.get("description"):
-                            sighting.target.description = api_info["description"]
+                            sighting = sighting.with_description(api_info["description"])
                         self._last_good_plate = (sighting.target.id, dt.datetime.now(dt.UTC))
+                    else:
+                        reg_info_error = lookup_failure_reason(api_info)
 
                 time_analysis: dict[str, Any] = self.tracker.record(
                     sighting.target.id, self.event_config.target_type, image_info.timestamp
@@ -141,13 +165,13 @@ class EventHandler(RegexMatchingEventHandler):
 
                 if not time_analysis.get("is_new_visit", True):
                     log.info("Skipping duplicate filesystem visit for %s (within gap window)", sighting.target.id)
-                    return
+                    return image_info
 
                 if not self._camera_gate.allow(
                     image_info.timestamp, reg_info is not None, self.tracker.tracker_config.min_visit_gap_seconds
                 ):
                     log.info("Skipping cross-plate duplicate for %s (plate=%s)", self.event_config.camera, target_id)
-                    return
+                    return image_info
 
                 entity_id: str | None = sighting.target.entity_id
                 if entity_id:
@@ -156,11 +180,12 @@ class EventHandler(RegexMatchingEventHandler):
                         state_topic=target_state_topic,
                         description=sighting.target.description,
                         time_analysis=time_analysis,
+                        target=sighting.target,
                     )
 
                 if sighting.ignore:
                     log.info("Skipping MQTT publication for ignored %s", sighting.target.id)
-                    return
+                    return image_info
 
                 self.publisher.post_state_message(
                     self.state_topic,
@@ -172,6 +197,7 @@ class EventHandler(RegexMatchingEventHandler):
                     time_analysis=time_analysis,
                     url=url,
                     reg_info=reg_info,
+                    reg_info_error=reg_info_error,
                     file_path=file_path,
                     source="filesystem",
                 )
@@ -200,7 +226,7 @@ class EventHandler(RegexMatchingEventHandler):
                 self._schedule_autoclear()
 
         except Exception as e:
-            log.error("Failed to parse file event %s: %s", event, e, exc_info=1)
+            log.error("Failed to parse file %s: %s", file_path, e, exc_info=1)
             self.publisher.post_state_message(
                 self.state_topic,
                 event_config=self.event_config,
@@ -209,6 +235,7 @@ class EventHandler(RegexMatchingEventHandler):
                 error=str(e),
                 file_path=file_path,
             )
+        return image_info
 
     def _schedule_autoclear(self) -> None:
         self._autoclear_timer.schedule(
@@ -266,34 +293,38 @@ def process_image(
         return None
 
 
-def examine_file(file_path: Path, image_name_re: re.Pattern[str]) -> ImageInfo | None:
+def examine_file(file_path: Path, image_name_re: re.Pattern[str], size: int | None = None) -> ImageInfo | None:
     try:
         match = re.match(image_name_re, file_path.name)
         if match:
-            groups = match.groupdict()
-            size: int = file_path.stat().st_size
-            raw_date = match.group("dt")
-            year, month, day = map(int, (raw_date[:4], raw_date[4:6], raw_date[6:8]))
-            hours, minutes, seconds, microseconds = map(
-                int, (raw_date[8:10], raw_date[10:12], raw_date[12:14], raw_date[14:17])
-            )
-            timestamp = dt.datetime(year, month, day, hours, minutes, seconds, microseconds, tzinfo=tzlocal.get_localzone())
-            file_ext: str | None = groups.get("ext")
-            event: str | None = groups.get("event")
-            target: str | None = groups.get("target")
-            if target is None:
-                log.warning("No target found for match: %s", groups)
-                return None
-            if file_ext is None:
-                file_parts = file_path.name.rsplit(".", 1)
-                if file_parts:
-                    file_ext = file_parts[0]
-            return ImageInfo(target=target, event=event, timestamp=timestamp, ext=file_ext, size=size)
+            if size is None:
+                size = file_path.stat().st_size
+            return image_info_from_match(match, size)
     except Exception as e:
         log.warning("Unable to parse %s: %s", file_path, e)
     return None
 
 
+def image_info_from_match(match: re.Match[str], size: int) -> ImageInfo | None:
+    """Image details from a match of `image_name_re` against a file name, raising if the date is malformed"""
+    groups = match.groupdict()
+    raw_date = match.group("dt")
+    year, month, day = map(int, (raw_date[:4], raw_date[4:6], raw_date[6:8]))
+    hours, minutes, seconds, microseconds = map(int, (raw_date[8:10], raw_date[10:12], raw_date[12:14], raw_date[14:17]))
+    timestamp = dt.datetime(year, month, day, hours, minutes, seconds, microseconds, tzinfo=tzlocal.get_localzone())
+    file_ext: str | None = groups.get("ext")
+    event: str | None = groups.get("event")
+    target: str | None = groups.get("target")
+    if target is None:
+        log.warning("No target found for match: %s", groups)
+        return None
+    if file_ext is None:
+        file_parts = match.string.rsplit(".", 1)
+        if file_parts:
+            file_ext = file_parts[0]
+    return ImageInfo(target=target, event=event, timestamp=timestamp, ext=file_ext, size=size)
+
+
 def scan_ocr_fields(image: Image.Image | None, event_config: EventSettings, ocr_config: OCRSettings) -> dict[str, str | None]:
     ocr_field_defs: list[OCRFieldSettings] = [
         ocr_config.fields[k] for k in event_config.ocr_field_ids if k in ocr_config.fields
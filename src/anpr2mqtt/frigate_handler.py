@@ -1,6 +1,6 @@
 import datetime as dt
-import json
 import threading
+from collections import OrderedDict
 from io import BytesIO
 from typing import TYPE_CHECKING, Any, cast
 
@@ -9,12 +9,15 @@ import paho.mqtt.client as mqtt
 import structlog
 from PIL import Image
 
+from anpr2mqtt import serialization
+from anpr2mqtt.api_client import lookup_failure_reason
 from anpr2mqtt.const import ImageInfo
 from anpr2mqtt.handler_common import AutoclearTimer, CameraGatekeeper, build_dvla_client, correct_against_good_read
 from anpr2mqtt.hass import HomeAssistantPublisher
 from anpr2mqtt.settings import (
     TARGET_TYPE_PLATE,
     CameraSettings,
+    CropMode,
     DVLASettings,
     EventSettings,
     FrigateSettings,
@@ -31,6 +34,103 @@ log = structlog.get_logger()
 CameraConfig = tuple[EventSettings, CameraSettings, Tracker, str, str]
 
 
+class SnapshotCache:
+    """LRU cache of MQTT snapshot bytes per camera, bounded by total memory.
+
+    Images are decoded lazily on first use and the decoded image is retained until the
+    camera publishes new bytes. Both raw and decoded sizes count towards the budget.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes: int = max_bytes
+        self._entries: OrderedDict[str, tuple[bytes, Image.Image | None]] = OrderedDict()
+        self._size: int = 0
+        self._lock = threading.Lock()
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+    @staticmethod
+    def _entry_size(raw: bytes, image: Image.Image | None) -> int:
+        decoded: int = image.width * image.height * len(image.getbands()) if image is not None else 0
+        return len(raw) + decoded
+
+    def put(self, camera: str, raw: bytes) -> None:
+        with self._lock:
+            existing = self._entries.pop(camera, None)
+            if existing is not None:
+                self._size -= self._entry_size(*existing)
+                if existing[0] == raw:
+                    # unchanged bytes, keep the decoded image
+                    self._entries[camera] = existing
+                    self._size += self._entry_size(*existing)
+                    self._evict()
+                    return
+            self._entries[camera] = (raw, None)
+            self._size += len(raw)
+            self._evict()
+
+    def image(self, camera: str) -> Image.Image | None:
+        """Return the decoded snapshot for a camera, decoding at most once per snapshot."""
+        with self._lock:
+            entry = self._entries.get(camera)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(camera)
+            raw, image = entry
+            if image is not None:
+                self.hits += 1
+                return image
+            self.misses += 1
+
+        # decode outside the lock, concurrent decodes of the same bytes are harmless
+        image = Image.open(BytesIO(raw))
+        image.load()
+
+        with self._lock:
+            current = self._entries.get(camera)
+            if current is not None and current[0] is raw and current[1] is None:
+                self._entries[camera] = (raw, image)
+                self._size += self._entry_size(raw, image) - len(raw)
+                self._evict(keep=camera)
+        return image
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _evict(self, keep: str | None = None) -> None:
+        # caller holds the lock
+        while self._size > self.max_bytes and self._entries:
+            camera = next(iter(self._entries))
+            if camera == keep:
+                if len(self._entries) == 1:
+                    break
+                self._entries.move_to_end(camera)
+                continue
+            self._size -= self._entry_size(*self._entries.pop(camera))
+            self.evictions += 1
+            log.debug("Evicted Frigate snapshot for camera %s from cache", camera)
+
+    def __contains__(self, camera: object) -> bool:
+        """Check presence without affecting recency or counters."""
+        with self._lock:
+            return camera in self._entries
+
+    def __len__(self) -> int:
+        """Count of cameras with a cached snapshot."""
+        with self._lock:
+            return len(self._entries)
+
+
 class FrigateHandler:
     def __init__(
         self,
@@ -42,6 +142,7 @@ class FrigateHandler:
         camera_configs: dict[str, CameraConfig],
         mqtt_topic_root: str = "anpr2mqtt",
         default_tracker: Tracker | None = None,
+        api_client: "APIClient | None" = None,
     ) -> None:
         self.mqtt_client = mqtt_client
         self.frigate_settings = frigate_settings
@@ -51,9 +152,8 @@ class FrigateHandler:
         self.mqtt_topic_root = mqtt_topic_root
         self.default_tracker = default_tracker
 
-        # Latest JPEG snapshot bytes per camera, from MQTT retained messages
-        self._snapshot_cache: dict[str, bytes] = {}
-        self._snapshot_lock = threading.Lock()
+        # Latest JPEG snapshot per camera, from MQTT retained messages
+        self._snapshot_cache = SnapshotCache(frigate_settings.snapshot_cache_bytes)
 
         # Track processed event IDs to avoid duplicate publications
         self._processed_events: set[str] = set()
@@ -69,7 +169,7 @@ class FrigateHandler:
         # Per-camera cross-plate duplicate gate
         self._camera_gates: dict[str, CameraGatekeeper] = {}
 
-        self.api_client: APIClient | None = build_dvla_client(dvla_settings)
+        self.api_client: APIClient | None = api_client or build_dvla_client(dvla_settings)
 
     def start(self) -> None:
         for topic in self.frigate_settings.topic:
@@ -88,12 +188,14 @@ class FrigateHandler:
             self.frigate_settings.topic,
         )
 
+    def close(self) -> None:
+        log.info("Frigate snapshot cache stats: %s", self._snapshot_cache.stats())
+
     def _on_snapshot_message(self, _client: mqtt.Client, _userdata: Any, msg: mqtt.MQTTMessage) -> None:
         parts = msg.topic.split("/")
         if len(parts) >= 3 and msg.payload:
             camera = parts[1]
-            with self._snapshot_lock:
-                self._snapshot_cache[camera] = bytes(msg.payload)
+            self._snapshot_cache.put(camera, bytes(msg.payload))
             log.debug("Cached Frigate snapshot for camera %s (%d bytes)", camera, len(msg.payload))
 
     def _on_event_message(self, _client: mqtt.Client, _userdata: Any, msg: mqtt.MQTTMessage) -> None:
@@ -104,8 +206,8 @@ class FrigateHandler:
 
     def _process_event(self, topic: str, raw: bytes) -> None:
         try:
-            payload: dict[str, Any] = json.loads(raw)
-        except json.JSONDecodeError as e:
+            payload: dict[str, Any] = serialization.loads(raw)
+        except serialization.JSONDecodeError as e:
             log.error("Frigate event JSON parse error: %s", e)
             return
 
@@ -147,8 +249,10 @@ class FrigateHandler:
                 self._processed_events = set(list(self._processed_events)[4000:])
 
         extra_info: dict[str, dict[str, Any]] = {"frigate": {}}
+        crop_box: list[float] | None = None
         if topic == "frigate/events":
             after_data: dict[str, str | int | float | bool] = payload.get("after", {}) or {}
+            crop_box = select_crop_box(after_data, self.frigate_settings.crop)
             plate: str | None = cast("str|None", after_data.get("recognized_license_plate"))
             score: float | None = float(after_data.get("recognized_license_plate_score", 0.0))
             description: str | None = cast("str|None", after_data.get("label"))
@@ -186,6 +290,8 @@ class FrigateHandler:
         log.info("Frigate event %s: plate=%s score=%.3f camera=%s", event_id, plate, score, camera)
 
         image: Image.Image | None = self._get_event_image(event_id, camera)
+        if image and crop_box:
+            image = crop_to_box(image, crop_box, self.frigate_settings.crop_margin)
         event_config, camera_settings, tracker, state_topic, image_topic = self._resolve_camera_config(camera)
 
         with self._good_plate_lock:
@@ -208,14 +314,17 @@ class FrigateHandler:
         sighting: Sighting = tracker.find(plate)
 
         reg_info: dict[str, Any] | None = None
+        reg_info_error: str | None = None
         if sighting.target.lookup and self.api_client and event_config.target_type == TARGET_TYPE_PLATE:
             api_info: dict[str, Any] = self.api_client.lookup(sighting.target.id)
             if api_info.get("success"):
                 reg_info = api_info.get("plate")
                 if sighting.target.description is None and api_info.get("description"):
-                    sighting.target.description = api_info["description"]
+                    sighting = sighting.with_description(api_info["description"])
                 with self._good_plate_lock:
                     self._last_good_plate[camera] = (sighting.target.id, dt.datetime.now(dt.UTC))
+            else:
+                reg_info_error = lookup_failure_reason(api_info)
 
         time_analysis: dict[str, Any] = tracker.record(sighting.target.id, event_config.target_type, timestamp)
 
@@ -234,6 +343,7 @@ class FrigateHandler:
                 state_topic=target_state_topic,
                 description=sighting.target.description,
                 time_analysis=time_analysis,
+                target=sighting.target,
             )
 
         if sighting.ignore:
@@ -252,6 +362,7 @@ class FrigateHandler:
             image_info=image_info,
             time_analysis=time_analysis,
             reg_info=reg_info,
+            reg_info_error=reg_info_error,
             extra_info=extra_info,
             source="frigate",
             frigate_event_id=event_id,
@@ -271,15 +382,12 @@ class FrigateHandler:
                 return img
             log.debug("API snapshot unavailable for %s, falling back to MQTT cache", event_id)
 
-        with self._snapshot_lock:
-            snapshot_bytes = self._snapshot_cache.get(camera)
-
-        if snapshot_bytes:
+        if camera in self._snapshot_cache:
             try:
-                img = Image.open(BytesIO(snapshot_bytes))
-                img.load()
-                log.debug("Using MQTT snapshot for event %s camera %s", event_id, camera)
-                return img
+                img = self._snapshot_cache.image(camera)
+                if img is not None:
+                    log.debug("Using MQTT snapshot for event %s camera %s", event_id, camera)
+                    return img
             except Exception as e:
                 log.warning("Failed to decode MQTT snapshot for camera %s: %s", camera, e)
 
@@ -339,3 +447,44 @@ class FrigateHandler:
             self.publisher.post_state_message(state_topic, sighting=None, event_config=event_config, camera=camera_settings)
         if autoclear.image:
             self.publisher.post_image_message(image_topic, image=None)
+
+
+def select_crop_box(after_data: dict[str, Any], mode: CropMode) -> list[float] | None:
+    """Pick the plate or vehicle bounding box, as [x1, y1, x2, y2] pixels, from a Frigate event."""
+    if mode == CropMode.NONE:
+        return None
+    box: Any = None
+    if mode == CropMode.PLATE:
+        for attribute in after_data.get("current_attributes") or []:
+            if isinstance(attribute, dict) and attribute.get("label") == "license_plate" and attribute.get("box"):
+                box = attribute["box"]
+                break
+    if box is None:
+        box = after_data.get("box")
+    if isinstance(box, list | tuple) and len(box) == 4:
+        try:
+            return [float(v) for v in box]
+        except (TypeError, ValueError):
+            log.debug("Ignoring unparsable Frigate box %s", box)
+    return None
+
+
+def crop_to_box(image: Image.Image, box: list[float], margin: float) -> Image.Image:
+    x1, y1, x2, y2 = box
+    if x2 <= x1 or y2 <= y1:
+        log.debug("Ignoring empty Frigate crop box %s", box)
+        return image
+    dx: float = (x2 - x1) * margin
+    dy: float = (y2 - y1) * margin
+    width, height = image.size
+    crop = (
+        max(0, int(x1 - dx)),
+        max(0, int(y1 - dy)),
+        min(width, int(x2 + dx + 0.5)),
+        min(height, int(y2 + dy + 0.5)),
+    )
+    if crop[2] <= crop[0] or crop[3] <= crop[1]:
+        log.warning("Frigate crop box %s outside image %sx%s, publishing full image", box, width, height)
+        return image
+    log.debug("Cropping Frigate image %sx%s to %s", width, height, crop)
+    return image.crop(crop)
@@ -1,5 +1,9 @@
 import datetime as dt
+import heapq
+import itertools
 import threading
+import time
+from collections.abc import Callable
 from typing import Any
 
 import structlog
@@ -7,6 +11,7 @@ import structlog
 from anpr2mqtt.api_client import APIClient, DVLAClient
 from anpr2mqtt.normalizers import Normalizer, fuzzy_match
 from anpr2mqtt.settings import TARGET_TYPE_PLATE, DVLASettings, EventSettings
+from anpr2mqtt.target_store import TargetStore
 
 log = structlog.get_logger()
 
@@ -20,11 +25,45 @@ def build_dvla_client(dvla_settings: DVLASettings, target_type: str | None = Non
         dvla_settings.api_key,
         cache_type=dvla_settings.cache_type,
         cache_ttl=dvla_settings.cache_ttl,
+        max_stale=dvla_settings.max_stale,
         cache_dir=dvla_settings.cache_dir,
+        negative_cache_ttl=dvla_settings.negative_cache_ttl,
+        error_cache_ttl=dvla_settings.error_cache_ttl,
         verify_plate=dvla_settings.verify_plate,
+        connect_timeout=dvla_settings.connect_timeout,
+        read_timeout=dvla_settings.read_timeout,
+        pool_size=dvla_settings.pool_size,
+        rate_limit=dvla_settings.rate_limit,
+        rate_burst=dvla_settings.rate_burst,
+        max_queue_wait=dvla_settings.max_queue_wait,
+        breaker_threshold=dvla_settings.breaker_threshold,
+        breaker_reset=dvla_settings.breaker_reset,
     )
 
 
+def lookup_targets(targets: TargetStore | None) -> list[str]:
+    """List plates with API lookup enabled, including those loaded from group files"""
+    if targets is None:
+        return []
+    return targets.lookup_ids()
+
+
+def start_dvla_warm_up(
+    api_client: APIClient | None, dvla_settings: DVLASettings, targets: TargetStore | None
+) -> threading.Thread | None:
+    """Warm the DVLA cache in background, so startup and first sightings are not delayed"""
+    if api_client is None or not dvla_settings.warm_up:
+        return None
+    regs: list[str] = lookup_targets(targets)
+    if not regs:
+        return None
+    thread = threading.Thread(
+        target=api_client.warm_up, args=(regs, dvla_settings.warm_up_refresh), name="dvla-warm-up", daemon=True
+    )
+    thread.start()
+    return thread
+
+
 def correct_against_good_read(
     plate: str,
     cached: tuple[str, dt.datetime] | None,
@@ -98,11 +137,141 @@ class CameraGatekeeper:
             return True
 
 
+class TimerHandle:
+    """Deferred callback held by a Scheduler, cancel is O(1) and takes effect before it fires."""
+
+    __slots__ = ("_key", "callback", "cancelled", "deadline", "fired", "label")
+
+    def __init__(self, deadline: float, callback: Callable[[], Any], label: str) -> None:
+        self.deadline: float = deadline
+        self.callback: Callable[[], Any] = callback
+        self.label: str = label
+        self.cancelled: bool = False
+        self.fired: bool = False
+        # sequence of this handle's live heap entry, older entries for it are skipped
+        self._key: int = -1
+
+    @property
+    def active(self) -> bool:
+        return not self.cancelled and not self.fired
+
+    def cancel(self) -> None:
+        self.cancelled = True
+
+
+class Scheduler:
+    """Single daemon thread running deferred callbacks from a heap of deadlines.
+
+    Cancelled handles are dropped lazily when they reach the top of the heap. Pushing a
+    deadline later, the usual case for debounce timers, only updates the handle and it is
+    moved when its old deadline comes up. Callbacks run on the scheduler thread, so should
+    be quick.
+    """
+
+    def __init__(self, name: str = "scheduler") -> None:
+        self.name: str = name
+        self._heap: list[tuple[float, int, TimerHandle]] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread: threading.Thread | None = None
+        self._stopped: bool = False
+        self.fired: int = 0
+        self.errors: int = 0
+
+    def call_later(self, delay: float, callback: Callable[[], Any], label: str = "") -> TimerHandle:
+        with self._cond:
+            handle = TimerHandle(time.monotonic() + delay, callback, label)
+            self._push(handle)
+            self._ensure_started()
+            return handle
+
+    def reschedule(self, handle: TimerHandle, delay: float, callback: Callable[[], Any] | None = None) -> TimerHandle:
+        """Move a handle's deadline, or schedule afresh if it already fired or was cancelled"""
+        with self._cond:
+            if not handle.active:
+                return self.call_later(delay, callback or handle.callback, handle.label)
+            deadline: float = time.monotonic() + delay
+            if callback is not None:
+                handle.callback = callback
+            earlier: bool = deadline < handle.deadline
+            handle.deadline = deadline
+            if earlier:
+                self._push(handle)
+            return handle
+
+    def stop(self) -> None:
+        with self._cond:
+            self._stopped = True
+            for _, _, handle in self._heap:
+                handle.cancel()
+            self._heap.clear()
+            self._cond.notify_all()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+        self._thread = None
+
+    def __len__(self) -> int:
+        """Count of handles waiting to fire"""
+        with self._cond:
+            return sum(1 for _, key, handle in self._heap if handle.active and handle._key == key)
+
+    def _push(self, handle: TimerHandle) -> None:
+        handle._key = next(self._seq)
+        heapq.heappush(self._heap, (handle.deadline, handle._key, handle))
+        if self._heap[0][2] is handle:
+            self._cond.notify()
+
+    def _ensure_started(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def _next_due(self) -> TimerHandle | None:
+        """Wait for the earliest live handle to become due, None once stopped"""
+        with self._cond:
+            while not self._stopped:
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                deadline, key, handle = self._heap[0]
+                if not handle.active or handle._key != key:
+                    heapq.heappop(self._heap)
+                    continue
+                if handle.deadline > deadline:
+                    # deadline was pushed back since this entry was queued
+                    heapq.heappop(self._heap)
+                    self._push(handle)
+                    continue
+                remaining: float = deadline - time.monotonic()
+                if remaining > 0:
+                    self._cond.wait(remaining)
+                    continue
+                heapq.heappop(self._heap)
+                handle.fired = True
+                return handle
+        return None
+
+    def _run(self) -> None:
+        while (handle := self._next_due()) is not None:
+            try:
+                handle.callback()
+                self.fired += 1
+            except Exception as e:
+                self.errors += 1
+                log.error("Scheduled callback %s failed: %s", handle.label, e, exc_info=1)
+
+
+SCHEDULER = Scheduler("deferred")
+"""Shared by all autoclear slots, and other deferred work"""
+
+
 class AutoclearTimer:
     """Manages a cancel-and-restart debounce timer for a single autoclear slot."""
 
-    def __init__(self) -> None:
-        self._timer: threading.Timer | None = None
+    def __init__(self, scheduler: Scheduler | None = None) -> None:
+        self._scheduler: Scheduler = scheduler or SCHEDULER
+        self._handle: TimerHandle | None = None
         self._lock = threading.Lock()
 
     def schedule(self, event_config: EventSettings, callback: Any, label: str) -> None:
@@ -110,9 +279,14 @@ class AutoclearTimer:
         if not autoclear.enabled:
             return
         with self._lock:
-            if self._timer is not None:
-                self._timer.cancel()
-            self._timer = threading.Timer(autoclear.post_event, callback)
-            self._timer.daemon = True
-            self._timer.start()
+            if self._handle is not None and self._handle.active:
+                self._handle = self._scheduler.reschedule(self._handle, autoclear.post_event, callback)
+            else:
+                self._handle = self._scheduler.call_later(autoclear.post_event, callback, label)
         log.debug("Autoclear scheduled in %ss for %s", autoclear.post_event, label)
+
+    def cancel(self) -> None:
+        with self._lock:
+            if self._handle is not None:
+                self._handle.cancel()
+                self._handle = None
@@ -1,6 +1,8 @@
-import json
+import hashlib
 import random
+import threading
 import time
+from dataclasses import dataclass, field
 from io import BytesIO
 from pathlib import Path
 from typing import Any
@@ -12,22 +14,128 @@ from paho.mqtt.reasoncodes import ReasonCode
 from PIL import Image
 
 import anpr2mqtt
-from anpr2mqtt.settings import CameraSettings, EventSettings, HomeAssistantSettings, Target
-from anpr2mqtt.tracker import Sighting
+from anpr2mqtt.handler_common import SCHEDULER, Scheduler, TimerHandle
+from anpr2mqtt.outbound import OutboundQueue, TopicClass
+from anpr2mqtt.serialization import StaticFields, dumps
+from anpr2mqtt.settings import CameraSettings, EventSettings, HomeAssistantSettings, ImageBackpressure
+from anpr2mqtt.tracker import Sighting, TargetRecord, Tracker, compute_time_analysis
 
 from .const import ImageInfo
 
 log = structlog.get_logger()
 
 
+def with_trigger(payload: bytes, trigger: str) -> bytes:
+    """Splice a trigger attribute into an encoded JSON object, without decoding it"""
+    encoded: bytes = dumps(trigger)
+    body: bytes = payload.rstrip()[:-1].rstrip()
+    if body == b"{":
+        return b'{"trigger":' + encoded + b"}"
+    return body + b',"trigger":' + encoded + b"}"
+
+
+@dataclass
+class RepublishRun:
+    """Progress of a discovery republish, sent one topic at a time from the scheduler thread"""
+
+    source_event: str
+    topics: list[str]
+    sent: int = 0
+    cancelled: bool = False
+    started: float = field(default_factory=time.monotonic)
+    finished: float | None = None
+    handle: TimerHandle | None = None
+
+    @property
+    def active(self) -> bool:
+        return not self.cancelled and self.finished is None
+
+    def progress(self) -> dict[str, Any]:
+        return {
+            "source_event": self.source_event,
+            "sent": self.sent,
+            "total": len(self.topics),
+            "active": self.active,
+            "cancelled": self.cancelled,
+            "elapsed": round((self.finished or time.monotonic()) - self.started, 1),
+        }
+
+
+class StateCoalescer:
+    """Holds retained state messages for a short window, publishing only the latest per topic"""
+
+    def __init__(self, outbound: OutboundQueue, window: float, scheduler: Scheduler) -> None:
+        self.outbound: OutboundQueue = outbound
+        self.window: float = window
+        self._scheduler: Scheduler = scheduler
+        self._pending: dict[str, tuple[str | bytes | None, TimerHandle]] = {}
+        self._lock = threading.Lock()
+        self.dropped: int = 0
+
+    def publish(self, topic: str, payload: str | bytes | None, immediate: bool = False) -> None:
+        if self.window <= 0:
+            self.outbound.publish(topic, payload, TopicClass.STATE)
+            return
+        # publishing under the lock keeps a flush from sending an older value after a newer immediate one
+        with self._lock:
+            pending = self._pending.get(topic)
+            if pending is not None:
+                # superseded before it was published
+                self.dropped += 1
+            if immediate:
+                if pending is not None:
+                    pending[1].cancel()
+                    del self._pending[topic]
+            elif pending is not None:
+                self._pending[topic] = (payload, pending[1])
+                return
+            else:
+                handle: TimerHandle = self._scheduler.call_later(self.window, lambda: self.flush(topic), f"state {topic}")
+                self._pending[topic] = (payload, handle)
+                return
+            self.outbound.publish(topic, payload, TopicClass.STATE)
+
+    def flush(self, topic: str) -> None:
+        with self._lock:
+            pending = self._pending.pop(topic, None)
+            if pending is not None:
+                pending[1].cancel()
+                self.outbound.publish(topic, pending[0], TopicClass.STATE)
+
+    def flush_all(self) -> None:
+        with self._lock:
+            topics: list[str] = list(self._pending)
+        for topic in topics:
+            self.flush(topic)
+        if self.dropped:
+            log.info("Coalescing skipped %s superseded state messages", self.dropped)
+
+
 class HomeAssistantPublisher:
-    def __init__(self, client: mqtt.Client, cfg: HomeAssistantSettings) -> None:
+    def __init__(
+        self,
+        client: mqtt.Client,
+        cfg: HomeAssistantSettings,
+        scheduler: Scheduler | None = None,
+        outbound: OutboundQueue | None = None,
+    ) -> None:
         self.client: mqtt.Client = client
+        self.outbound: OutboundQueue = outbound or OutboundQueue(client)
         self.hass_status_topic: str = cfg.status_topic
         self.discovery_topic_prefix: str = cfg.discovery_topic_root
         self.device_creation: bool = cfg.device_creation
-        self.republish: dict[str, dict[str, Any]] = {}
+        # discovery payloads encoded once, the republish trigger is spliced in when sent
+        self.republish: dict[str, bytes] = {}
+        self._discovery_digests: dict[str, bytes] = {}
+        self.discovery_skipped: int = 0
+        self._static_fields: dict[tuple[str, str | None, str | None, str | None], StaticFields] = {}
         self.hass_online: bool | None = None
+        self.republish_jitter: float = cfg.republish_jitter
+        self.republish_rate: float = cfg.republish_rate
+        self.republish_run: RepublishRun | None = None
+        self._scheduler: Scheduler = scheduler or SCHEDULER
+        self.immediate_priorities: list[str] = cfg.state_immediate_priorities
+        self.state_coalescer = StateCoalescer(self.outbound, cfg.state_coalesce_window, self._scheduler)
 
     def start(self) -> None:
         log.info("Subscribing to Home Assistant birth and last will at %s", self.hass_status_topic)
@@ -63,6 +171,7 @@ class HomeAssistantPublisher:
             if decoded == "offline":
                 log.warn("Home Assistant gone offline")
                 self.hass_online = False
+                self.cancel_republish()
             elif decoded == "online":
                 if self.hass_online is False:
                     log.info("Home Assistant back online, republishing discoveries")
@@ -76,13 +185,71 @@ class HomeAssistantPublisher:
         else:
             log.debug("Unknown message on %s", msg.topic)
 
-    def republish_discovery(self, source_event: str) -> None:
-        for topic, payload in self.republish.items():
-            log.debug("Republishing to %s for %s", topic, source_event)
-            # add jitter to republish to reduce herd load on HA after restart
-            time.sleep(random.randint(1, 10))  # noqa: S311
-            payload["trigger"] = source_event
-            self.client.publish(topic, json.dumps(payload))
+    def republish_discovery(self, source_event: str) -> RepublishRun:
+        """Start republishing discovery messages in background, replacing any republish in progress"""
+        self.cancel_republish()
+        run = RepublishRun(source_event=source_event, topics=list(self.republish))
+        self.republish_run = run
+        if not run.topics:
+            run.finished = run.started
+            return run
+        # random start spreads the herd load on HA after restart, then sends are paced by the rate limit
+        delay: float = random.uniform(0, self.republish_jitter)  # noqa: S311
+        log.info("Republishing %s discovery messages for %s, starting in %.1fs", len(run.topics), source_event, delay)
+        run.handle = self._scheduler.call_later(delay, lambda: self._republish_next(run), "discovery republish")
+        return run
+
+    def cancel_republish(self) -> None:
+        run: RepublishRun | None = self.republish_run
+        if run is None or not run.active:
+            return
+        run.cancelled = True
+        if run.handle is not None:
+            run.handle.cancel()
+        log.info("Cancelled discovery republish after %s of %s messages", run.sent, len(run.topics))
+
+    def _republish_next(self, run: RepublishRun) -> None:
+        if run.cancelled:
+            return
+        topic: str = run.topics[run.sent]
+        payload: bytes | None = self.republish.get(topic)
+        if payload is not None:
+            log.debug("Republishing to %s for %s", topic, run.source_event)
+            # a failed send must not end the chain, the next topic is always scheduled
+            try:
+                self.outbound.publish(topic, with_trigger(payload, run.source_event), TopicClass.DISCOVERY, retain=False)
+            except Exception as e:
+                log.error("Failed to republish discovery to %s: %s", topic, e)
+        run.sent += 1
+        if run.sent >= len(run.topics):
+            run.finished = time.monotonic()
+            log.info(
+                "Republished %s discovery messages for %s in %.1fs", run.sent, run.source_event, run.finished - run.started
+            )
+            return
+        if run.sent % 10 == 0:
+            log.info("Republished %s of %s discovery messages", run.sent, len(run.topics))
+        interval: float = 1 / self.republish_rate if self.republish_rate > 0 else 0
+        delay: float = interval * random.uniform(0.5, 1.5)  # noqa: S311
+        run.handle = self._scheduler.call_later(delay, lambda: self._republish_next(run), "discovery republish")
+
+    def _publish_discovery(self, topic: str, payload: dict[str, Any]) -> bool:
+        """Publish retained discovery config, unless identical content was already published to the topic"""
+        msg: bytes = dumps(payload)
+        digest: bytes = hashlib.blake2b(msg, digest_size=16).digest()
+        self.republish[topic] = msg
+        if self._discovery_digests.get(topic) == digest:
+            self.discovery_skipped += 1
+            log.debug("Skipping unchanged HA MQTT Discovery message to %s", topic)
+            return False
+        # only remembered once sent, so a failed publish is tried again next time
+        self._discovery_digests.pop(topic, None)
+        info: mqtt.MQTTMessageInfo | None = self.outbound.publish(topic, msg, TopicClass.DISCOVERY)
+        if not self.outbound.accepted(info, TopicClass.DISCOVERY):
+            log.warning("HA MQTT Discovery message to %s not sent, will retry when next published", topic)
+            return False
+        self._discovery_digests[topic] = digest
+        return True
 
     def publish_sensor_discovery(self, state_topic: str, event_config: EventSettings, camera: CameraSettings) -> None:
         name: str = event_config.description or f"{event_config.event} {camera.name}"
@@ -105,10 +272,8 @@ class HomeAssistantPublisher:
         if self.device_creation:
             self.add_device_info(payload, camera)
         topic: str = f"{self.discovery_topic_prefix}/sensor/{event_config.camera}/{event_config.event}/config"
-        msg: str = json.dumps(payload)
-        self.client.publish(topic, payload=msg, qos=0, retain=True)
-        self.republish[topic] = payload
-        log.info("Published HA MQTT sensor Discovery message to %s", topic)
+        if self._publish_discovery(topic, payload):
+            log.info("Published HA MQTT sensor Discovery message to %s", topic)
 
     def publish_image_discovery(
         self, state_topic: str, image_topic: str, event_config: EventSettings, camera: CameraSettings
@@ -131,10 +296,8 @@ class HomeAssistantPublisher:
         if self.device_creation:
             self.add_device_info(payload, camera)
         topic = f"{self.discovery_topic_prefix}/image/{event_config.camera}/{event_config.event}/config"
-        msg = json.dumps(payload)
-        self.client.publish(topic, payload=msg, qos=0, retain=True)
-        self.republish[topic] = payload
-        log.info("Published HA MQTT Discovery message to %s", topic)
+        if self._publish_discovery(topic, payload):
+            log.info("Published HA MQTT Discovery message to %s", topic)
 
     def publish_camera_discovery(
         self, state_topic: str, image_topic: str, event_config: EventSettings, camera: CameraSettings
@@ -156,13 +319,11 @@ class HomeAssistantPublisher:
         if self.device_creation:
             self.add_device_info(payload, camera)
         topic = f"{self.discovery_topic_prefix}/camera/{camera.name}/{event_config.event}/config"
-        msg = json.dumps(payload)
-        self.client.publish(topic, payload=msg, qos=0, retain=True)
-        self.republish[topic] = payload
-        log.info("Published HA MQTT Discovery message to %s", topic)
+        if self._publish_discovery(topic, payload):
+            log.info("Published HA MQTT Discovery message to %s", topic)
 
     def publish_target_sensor_discovery(
-        self, entity_id: str, target_type: str, targets: list[Target], state_topic: str, icon: str | None
+        self, entity_id: str, target_type: str, targets: list[TargetRecord], state_topic: str, icon: str | None
     ) -> None:
         payload: dict[str, Any] = {
             "o": {
@@ -181,18 +342,61 @@ class HomeAssistantPublisher:
         if icon:
             payload["icon"] = icon
         topic = f"{self.discovery_topic_prefix}/sensor/{entity_id}/config"
-        msg = json.dumps(payload)
-        self.client.publish(topic, payload=msg, qos=0, retain=True)
-        self.republish[topic] = payload
-        log.info("Published HA MQTT target sensor Discovery message to %s", topic)
+        if self._publish_discovery(topic, payload):
+            log.info("Published HA MQTT target sensor Discovery message to %s", topic)
+
+    def remove_target_sensor_discovery(self, entity_id: str) -> None:
+        """Remove a target sensor from Home Assistant, by clearing its retained discovery config"""
+        topic: str = f"{self.discovery_topic_prefix}/sensor/{entity_id}/config"
+        self.republish.pop(topic, None)
+        self._discovery_digests.pop(topic, None)
+        self.outbound.publish(topic, b"", TopicClass.DISCOVERY)
+        log.info("Removed HA MQTT target sensor Discovery message at %s", topic)
+
+    def publish_target_sensors(
+        self, topic_root: str, event_config: EventSettings, tracker: Tracker, state_for: set[str] | None = None
+    ) -> None:
+        """Publish discovery for target sensors, and their state from history, for all or only the given entity ids"""
+        for entity_id, targets in tracker.entities.items():
+            target_topic: str = f"{topic_root}/{event_config.event}/targets/{entity_id}/state"
+            icon: str | None = targets[0].icon if len(targets) > 1 and targets[0].icon else event_config.icon
+            self.publish_target_sensor_discovery(
+                entity_id=entity_id,
+                target_type=event_config.target_type,
+                icon=icon,
+                targets=targets,
+                state_topic=target_topic,
+            )
+            if state_for is not None and entity_id not in state_for:
+                continue
+            log.info("Publishing sensor.%s for %s targets", entity_id, len(targets))
+            previous_sightings: list[str] = []
+            for target in targets:
+                previous_sightings.extend(tracker.history(target.id, target.target_type))
+            time_analysis: dict[str, Any] = (
+                compute_time_analysis(sorted(previous_sightings)) if previous_sightings else {"last_seen": None}
+            )
+            self.publish_target_state(state_topic=target_topic, time_analysis=time_analysis)
 
-    def publish_target_state(self, state_topic: str, time_analysis: dict[str, Any], description: str | None = None) -> None:
+    def is_immediate(self, target: TargetRecord | None) -> bool:
+        """High priority targets have state published without waiting for coalescing"""
+        if target is None:
+            return False
+        return target.group == "dangerous" or (target.priority is not None and target.priority in self.immediate_priorities)
+
+    def publish_target_state(
+        self,
+        state_topic: str,
+        time_analysis: dict[str, Any],
+        description: str | None = None,
+        target: TargetRecord | None = None,
+    ) -> None:
         payload: dict[str, Any] = {**time_analysis}
         if description:
             payload["description"] = description
         try:
-            msg = json.dumps(payload)
-            self.client.publish(state_topic, payload=msg, qos=0, retain=True)
+            msg: bytes = dumps(payload)
+            self.state_coalescer.publish(state_topic, msg, immediate=self.is_immediate(target))
             log.debug("Published target state to %s: %s", state_topic, payload)
         except Exception as e:
             log.error("Failed to publish target state to %s: %s", state_topic, e, exc_info=1)
@@ -220,29 +424,79 @@ class HomeAssistantPublisher:
         error: str | None = None,
         file_path: Path | None = None,
         reg_info: Any = None,
+        reg_info_error: str | None = None,
         source: str | None = None,
         frigate_event_id: str | None = None,
         frigate_ui_url: str | None = None,
     ) -> None:
 
+        try:
+            msg: bytes = self.encode_state_message(
+                sighting,
+                event_config,
+                camera,
+                extra_info=extra_info,
+                image_info=image_info,
+                time_analysis=time_analysis,
+                url=url,
+                error=error,
+                file_path=file_path,
+                reg_info=reg_info,
+                reg_info_error=reg_info_error,
+                source=source,
+                frigate_event_id=frigate_event_id,
+                frigate_ui_url=frigate_ui_url,
+            )
+            self.state_coalescer.publish(topic, msg, immediate=self.is_immediate(sighting.target if sighting else None))
+            log.debug("Published HA MQTT State message to %s: %s", topic, msg)
+        except Exception as e:
+            log.error("Failed to publish event for %s: %s", sighting.target.id if sighting else None, e, exc_info=1)
+
+    def static_fields(self, event_config: EventSettings, camera: CameraSettings) -> StaticFields:
+        """Pre-encoded members shared by every state message for an event and camera"""
+        key: tuple[str, str | None, str | None, str | None] = (event_config.event, camera.name, camera.area, camera.live_url)
+        fields: StaticFields | None = self._static_fields.get(key)
+        if fields is None:
+            fields = StaticFields(
+                {
+                    "event": event_config.event,
+                    "camera": camera.name or "UNKNOWN",
+                    "area": camera.area,
+                    "live_url": camera.live_url,
+                }
+            )
+            self._static_fields[key] = fields
+        return fields
+
+    def encode_state_message(
+        self,
+        sighting: Sighting | None,
+        event_config: EventSettings,
+        camera: CameraSettings,
+        extra_info: dict[str, Any] | None = None,
+        image_info: ImageInfo | None = None,
+        time_analysis: dict[str, Any] | None = None,
+        url: str | None = None,
+        error: str | None = None,
+        file_path: Path | None = None,
+        reg_info: Any = None,
+        reg_info_error: str | None = None,
+        source: str | None = None,
+        frigate_event_id: str | None = None,
+        frigate_ui_url: str | None = None,
+    ) -> bytes:
         payload: dict[str, Any] = sighting.as_dict() if sighting else {"target": None, "target_type": event_config.target_type}
         if payload.get("description") is None:
             payload["description"] = event_config.default_description
-        payload.update(
-            {
-                event_config.target_type: sighting.target.id if sighting else None,
-                "event": event_config.event,
-                "camera": camera.name or "UNKNOWN",
-                "area": camera.area,
-                "live_url": camera.live_url,
-                "reg_info": reg_info,
-                "history": time_analysis,
-            }
-        )
+        payload[event_config.target_type] = sighting.target.id if sighting else None
+        payload["reg_info"] = reg_info
+        payload["history"] = time_analysis
         if extra_info:
             payload.update(extra_info)
         if error:
             payload["error"] = error
+        if reg_info_error is not None:
+            payload["reg_info_error"] = reg_info_error
         if url is not None:
             payload["event_image_url"] = url
         if file_path is not None:
@@ -253,34 +507,39 @@ class HomeAssistantPublisher:
             payload["frigate_event_id"] = frigate_event_id
         if frigate_ui_url is not None:
             payload["frigate_ui_url"] = frigate_ui_url
-
-        try:
-            if image_info:
-                payload.update(
-                    {
-                        "event_time": image_info.timestamp.isoformat(),
-                        "image_event": image_info.event,
-                        "ext": image_info.ext,
-                        "image_size": image_info.size,
-                    }
-                )
-            msg: str = json.dumps(payload)
-            self.client.publish(topic, payload=msg, qos=0, retain=True)
-            log.debug("Published HA MQTT State message to %s: %s", topic, payload)
-        except Exception as e:
-            log.error("Failed to publish event %s: %s", payload, e, exc_info=1)
+        if image_info:
+            payload["event_time"] = image_info.timestamp.isoformat()
+            payload["image_event"] = image_info.event
+            payload["ext"] = image_info.ext
+            payload["image_size"] = image_info.size
+        return self.static_fields(event_config, camera).dumps(payload)
 
     def post_image_message(self, topic: str, image: Image.Image | None, img_format: str = "JPEG") -> None:
         try:
             if image is None:
-                self.client.publish(topic, payload=None, qos=0, retain=True)
+                self.outbound.publish(topic, None, TopicClass.IMAGE)
                 log.debug("Cleared HA MQTT Image message at %s", topic)
                 return
-            img_byte_arr = BytesIO()
-            image.save(img_byte_arr, format=img_format)
-            img_bytes = img_byte_arr.getvalue()
+            img_bytes: bytes = self._encode_image(image, img_format)
+            if not self.outbound.has_room(len(img_bytes)):
+                if self.outbound.image_backpressure == ImageBackpressure.DOWNSCALE:
+                    img_bytes = self._encode_image(image.reduce(2), img_format)
+                    self.outbound.stats.images_downscaled += 1
+                if not self.outbound.has_room(len(img_bytes)):
+                    self.outbound.stats.images_shed += 1
+                    log.warning(
+                        "Shedding MQTT image for %s, %s bytes already waiting to send", topic, self.outbound.inflight_bytes
+                    )
+                    return
+                log.info("Downscaled MQTT image for %s to %s bytes while broker is slow", topic, len(img_bytes))
 
-            self.client.publish(topic, payload=img_bytes, qos=0, retain=True)
+            self.outbound.publish(topic, img_bytes, TopicClass.IMAGE)
             log.debug("Published HA MQTT Image message to %s: %s bytes", topic, len(img_bytes))
         except Exception as e:
             log.error("Failed to publish image entity: %s", e, exc_info=1)
+
+    @staticmethod
+    def _encode_image(image: Image.Image, img_format: str) -> bytes:
+        img_byte_arr = BytesIO()
+        image.save(img_byte_arr, format=img_format)
+        return img_byte_arr.getvalue()
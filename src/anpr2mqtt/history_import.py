@@ -0,0 +1,321 @@
+"""Bulk import of an archive of event images into tracker sighting history
+
+Names are matched, normalised and corrected in batches by worker processes, then each target's
+history file is merged, sorted and written once per checkpoint, rather than once per sighting.
+"""
+
+import bisect
+import datetime as dt
+import os
+import re
+import time
+from array import array
+from collections import deque
+from collections.abc import Iterator
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+import structlog
+import tzlocal
+
+from anpr2mqtt import serialization
+from anpr2mqtt.event_handler import image_info_from_match
+from anpr2mqtt.settings import TARGET_TYPE_PLATE, TargetSettings, TrackerSettings
+from anpr2mqtt.tracker import Sighting, Tracker
+
+log = structlog.get_logger()
+
+EPOCH = dt.datetime(1970, 1, 1, tzinfo=dt.UTC)
+MICROSECOND = dt.timedelta(microseconds=1)
+
+
+@dataclass(frozen=True)
+class ImportJob:
+    """Everything a worker process needs to build its own tracker"""
+
+    target_type: str
+    image_name_re: re.Pattern[str]
+    tracker_config: TrackerSettings
+    target_config: TargetSettings | None = None
+    region: str | None = None
+    auto_match_tolerance: int = 0
+    log_level: str = "WARNING"
+
+
+@dataclass
+class Batch:
+    parts: tuple[str, ...]
+    names: list[str]
+
+
+@dataclass
+class BatchResult:
+    parts: tuple[str, ...]
+    last_name: str
+    images: int = 0
+    skipped: int = 0
+    sightings: list[tuple[str, int]] = field(default_factory=list)
+    lookup: set[str] = field(default_factory=set)
+
+
+@dataclass
+class ImportStats:
+    files: int = 0
+    images: int = 0
+    skipped: int = 0
+    sightings: int = 0
+    targets: int = 0
+    seconds: float = 0.0
+    resumed: bool = False
+    lookup: set[str] = field(default_factory=set)
+
+
+class ImportCheckpoint:
+    """Position of the last batch written, so an interrupted import resumes after it
+
+    Directories are walked in sorted order and names sorted within each, so the position is the
+    directory's parts below the root and the last name imported from it.
+    """
+
+    def __init__(self, path: Path, root: Path) -> None:
+        self.path: Path = path
+        self.root: str = str(root.resolve())
+        self.parts: tuple[str, ...] | None = None
+        self.name: str | None = None
+
+    def load(self) -> bool:
+        try:
+            if not self.path.exists():
+                return False
+            data: dict[str, Any] = serialization.loads(self.path.read_bytes())
+        except Exception as e:
+            log.warning("Ignoring unreadable import checkpoint at %s: %s", self.path, e)
+            return False
+        if data.get("root") != self.root:
+            log.warning("Ignoring import checkpoint for %s, importing %s", data.get("root"), self.root)
+            return False
+        self.parts = tuple(data["directory"])
+        self.name = data["name"]
+        return True
+
+    def save(self, parts: tuple[str, ...], name: str) -> None:
+        self.parts = parts
+        self.name = name
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path: Path = self.path.with_suffix(".tmp")
+        tmp_path.write_bytes(serialization.dumps({"root": self.root, "directory": list(parts), "name": name}))
+        tmp_path.replace(self.path)
+
+    def done(self, parts: tuple[str, ...], name: str) -> bool:
+        if self.parts is None or self.name is None:
+            return False
+        return parts < self.parts or (parts == self.parts and name <= self.name)
+
+
+def iter_batches(
+    root: Path, recursive: bool, batch_size: int, checkpoint: ImportCheckpoint | None = None
+) -> Iterator[tuple[int, Batch]]:
+    """File names under root in batches, with the count of entries scanned, skipping those already imported
+
+    Only directory entries are read here, names are matched against the image pattern by the workers.
+    """
+    pending: list[tuple[str, ...]] = [()]
+    while pending:
+        parts: tuple[str, ...] = pending.pop()
+        names: list[str] = []
+        subdirs: list[str] = []
+        try:
+            with os.scandir(root.joinpath(*parts)) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.name)
+                    else:
+                        names.append(entry.name)
+        except OSError as e:
+            log.warning("Unable to scan %s: %s", root.joinpath(*parts), e)
+            continue
+        if recursive:
+            pending.extend((*parts, subdir) for subdir in sorted(subdirs, reverse=True))
+        names.sort()
+        if checkpoint is not None:
+            names = [name for name in names if not checkpoint.done(parts, name)]
+        for start in range(0, len(names), batch_size):
+            chunk: list[str] = names[start : start + batch_size]
+            yield len(chunk), Batch(parts, chunk)
+
+
+_tracker: Tracker | None = None
+_image_name_re: re.Pattern[str] | None = None
+
+
+def init_worker(job: ImportJob) -> None:
+    global _tracker, _image_name_re
+    _tracker = Tracker(
+        job.target_type,
+        tracker_config=job.tracker_config,
+        target_config=job.target_config,
+        region=job.region,
+        auto_match_tolerance=job.auto_match_tolerance,
+    )
+    _image_name_re = job.image_name_re
+
+
+def _init_process(job: ImportJob) -> None:
+    # normalisation and correction log every image at INFO, so workers follow the tool's log level
+    structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(job.log_level))
+    init_worker(job)
+
+
+def match_batch(batch: Batch) -> BatchResult:
+    """Parse and correct the images in a batch, as `Tracker.find` would for each live event"""
+    if _tracker is None or _image_name_re is None:
+        raise RuntimeError("Import worker not initialised")
+    result = BatchResult(batch.parts, batch.names[-1])
+    found: dict[str, Sighting] = {}
+    for name in batch.names:
+        match: re.Match[str] | None = _image_name_re.match(name)
+        if match is None:
+            continue
+        try:
+            image_info = image_info_from_match(match, 0)
+        except Exception as e:
+            log.warning("Unable to parse %s: %s", name, e)
+            image_info = None
+        if image_info is None:
+            result.skipped += 1
+            continue
+        # archives repeat the same plates heavily, so match each raw read once per batch
+        sighting: Sighting | None = found.get(image_info.target)
+        if sighting is None:
+            sighting = found[image_info.target] = _tracker.find(image_info.target)
+            if sighting.target.lookup and _tracker.target_type == TARGET_TYPE_PLATE:
+                result.lookup.add(sighting.target.id)
+        result.images += 1
+        result.sightings.append((sighting.target.id or "UNKNOWN", (image_info.timestamp - EPOCH) // MICROSECOND))
+    return result
+
+
+def write_histories(directory: Path, histories: list[tuple[str, list[int]]], min_gap_seconds: int = 0) -> int:
+    """Merge sightings into each target's history file, sorted and without duplicates, returning count added
+
+    Existing sightings are always kept, the visit gap only decides which imported ones are added.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    zone = tzlocal.get_localzone()
+    min_gap: int = min_gap_seconds * 1_000_000
+    added: int = 0
+    for target, micros in histories:
+        target_file: Path = directory / f"{target}.json"
+        merged: dict[int, str] = {}
+        try:
+            if target_file.exists():
+                for seen in serialization.loads(target_file.read_bytes()):
+                    seen_dt: dt.datetime = dt.datetime.fromisoformat(seen)
+                    if seen_dt.tzinfo is None:
+                        seen_dt = seen_dt.replace(tzinfo=zone)
+                    merged[(seen_dt - EPOCH) // MICROSECOND] = seen
+        except Exception as e:
+            log.warning("Skipping import for %s, unable to read existing history at %s: %s", target, target_file, e)
+            continue
+        kept: list[int] = sorted(merged)
+        new: int = 0
+        for us in sorted(set(micros)):
+            if us in merged:
+                continue
+            # same visit gap as live recording, measured to the nearest sightings either side
+            pos: int = bisect.bisect_left(kept, us)
+            if min_gap and ((pos > 0 and us - kept[pos - 1] < min_gap) or (pos < len(kept) and kept[pos] - us < min_gap)):
+                continue
+            kept.insert(pos, us)
+            merged[us] = (EPOCH + us * MICROSECOND).astimezone(zone).isoformat()
+            new += 1
+        if not new:
+            continue
+        added += new
+        tmp_file: Path = target_file.with_suffix(".tmp")
+        tmp_file.write_bytes(serialization.dumps([merged[us] for us in kept]))
+        tmp_file.replace(target_file)
+    return added
+
+
+def _chunks(items: list[Any], count: int) -> list[list[Any]]:
+    return [items[i::count] for i in range(count) if items[i::count]]
+
+
+def import_history(
+    job: ImportJob,
+    root: Path,
+    recursive: bool = True,
+    workers: int = 1,
+    batch_size: int = 5000,
+    checkpoint_every: int = 200_000,
+    checkpoint: ImportCheckpoint | None = None,
+) -> ImportStats:
+    """Import every image under root into the tracker history, resuming from the checkpoint if given"""
+    stats = ImportStats(resumed=checkpoint is not None and checkpoint.parts is not None)
+    started: float = time.perf_counter()
+    history_dir: Path = job.tracker_config.data_dir / job.target_type
+    min_gap: int = job.tracker_config.min_visit_gap_seconds
+    pending: dict[str, array[int]] = {}
+    unflushed: int = 0
+    targets: set[str] = set()
+    executor: Executor | None = None
+    if workers > 1:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_process, initargs=(job,))
+    else:
+        init_worker(job)
+
+    def flush(position: BatchResult) -> None:
+        histories: list[tuple[str, list[int]]] = [(target, list(micros)) for target, micros in pending.items()]
+        if executor is not None:
+            futures = [executor.submit(write_histories, history_dir, chunk, min_gap) for chunk in _chunks(histories, workers)]
+            stats.sightings += sum(f.result() for f in futures)
+        else:
+            stats.sightings += write_histories(history_dir, histories, min_gap)
+        pending.clear()
+        if checkpoint is not None:
+            checkpoint.save(position.parts, position.last_name)
+
+    def merge(result: BatchResult) -> None:
+        nonlocal unflushed
+        stats.images += result.images
+        stats.skipped += result.skipped
+        stats.lookup |= result.lookup
+        for target, us in result.sightings:
+            micros: array[int] | None = pending.get(target)
+            if micros is None:
+                micros = pending[target] = array("q")
+                targets.add(target)
+            micros.append(us)
+        unflushed += len(result.sightings)
+        if unflushed >= checkpoint_every:
+            flush(result)
+            unflushed = 0
+
+    last: BatchResult | None = None
+    try:
+        # bounded window of batches in flight, results merged in submission order for the checkpoint
+        in_flight: deque[Future[BatchResult]] = deque()
+        for scanned, batch in iter_batches(root, recursive, batch_size, checkpoint):
+            stats.files += scanned
+            if executor is None:
+                last = match_batch(batch)
+                merge(last)
+                continue
+            in_flight.append(executor.submit(match_batch, batch))
+            if len(in_flight) >= workers * 2:
+                last = in_flight.popleft().result()
+                merge(last)
+        while in_flight:
+            last = in_flight.popleft().result()
+            merge(last)
+        if last is not None:
+            flush(last)
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+    stats.targets = len(targets)
+    stats.seconds = time.perf_counter() - started
+    return stats
@@ -0,0 +1,530 @@
+import struct
+import threading
+import time
+from dataclasses import asdict, dataclass
+from enum import StrEnum, auto
+from pathlib import Path
+from typing import Any
+
+import paho.mqtt.client as mqtt
+import structlog
+from paho.mqtt.enums import MQTTErrorCode
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
+from paho.mqtt.reasoncodes import ReasonCode
+
+from anpr2mqtt.handler_common import SCHEDULER, Scheduler, TimerHandle
+from anpr2mqtt.settings import ImageBackpressure, MQTTSettings
+
+log = structlog.get_logger()
+
+
+class TopicClass(StrEnum):
+    STATE = auto()
+    IMAGE = auto()
+    DISCOVERY = auto()
+
+
+_TOPIC_CLASSES: list[TopicClass] = list(TopicClass)
+
+# leading bytes of the image formats PIL is asked to save, for the v5 content type
+_IMAGE_SIGNATURES: list[tuple[bytes, str]] = [
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG", "image/png"),
+    (b"GIF8", "image/gif"),
+    (b"BM", "image/bmp"),
+]
+
+
+def image_content_type(payload: bytes) -> str | None:
+    for signature, content_type in _IMAGE_SIGNATURES:
+        if payload.startswith(signature):
+            return content_type
+    if payload[:4] == b"RIFF" and payload[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+@dataclass(frozen=True)
+class SpooledMessage:
+    topic: str
+    payload: bytes | None
+    topic_class: TopicClass
+    retain: bool
+    segment: Path
+    end: int
+
+
+class Spool:
+    """Append-only on-disk queue of publishes, kept in segment files evicted oldest first
+
+    Each record is a fixed header, topic length, payload length, flags and topic class,
+    followed by the UTF-8 topic and raw payload. The position of the next record to send in
+    the oldest segment is kept alongside, so messages sent before a restart aren't sent again.
+    """
+
+    HEADER = struct.Struct(">HIBB")
+    RETAIN = 0x01
+    NO_PAYLOAD = 0x02
+
+    def __init__(self, path: Path, max_bytes: int, segment_bytes: int | None = None) -> None:
+        self.path: Path = path
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.max_bytes: int = max_bytes
+        self.segment_bytes: int = segment_bytes or max(max_bytes // 8, 64 * 1024)
+        self.evicted: int = 0
+        self._lock = threading.Lock()
+        self._segments: list[Path] = sorted(self.path.glob("spool-*.bin"))
+        # sizes kept alongside the segments, so appends don't stat the files
+        self._sizes: list[int] = [segment.stat().st_size for segment in self._segments]
+        self._bytes: int = sum(self._sizes)
+        self._offset_path: Path = self.path / "read-offset"
+        self._read_offset: int = self._load_offset()
+        self._count: int = sum(
+            self._records(segment, self._read_offset if i == 0 else 0) for i, segment in enumerate(self._segments)
+        )
+        if self._count:
+            log.info("Spool at %s has %s messages from previous run", self.path, self._count)
+
+    def __len__(self) -> int:
+        """Count of messages waiting in the spool"""
+        return self._count
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def append(self, topic: str, payload: str | bytes | None, topic_class: TopicClass, retain: bool) -> None:
+        encoded_topic: bytes = topic.encode("utf-8")
+        body: bytes = payload.encode("utf-8") if isinstance(payload, str) else payload or b""
+        flags: int = (self.RETAIN if retain else 0) | (self.NO_PAYLOAD if payload is None else 0)
+        record: bytes = (
+            self.HEADER.pack(len(encoded_topic), len(body), flags, _TOPIC_CLASSES.index(topic_class)) + encoded_topic + body
+        )
+        with self._lock:
+            if not self._segments or self._sizes[-1] + len(record) > self.segment_bytes:
+                self._segments.append(self.path / f"spool-{time.time_ns():020d}.bin")
+                self._sizes.append(0)
+            with self._segments[-1].open("ab") as f:
+                f.write(record)
+            self._sizes[-1] += len(record)
+            self._bytes += len(record)
+            self._count += 1
+            self._evict()
+
+    def peek(self, limit: int) -> list[SpooledMessage]:
+        """Oldest messages, from the first segment only, without removing them"""
+        with self._lock:
+            if not self._segments:
+                return []
+            messages: list[SpooledMessage] = []
+            with self._segments[0].open("rb") as f:
+                f.seek(self._read_offset)
+                while len(messages) < limit:
+                    header: bytes = f.read(self.HEADER.size)
+                    if len(header) < self.HEADER.size:
+                        break
+                    topic_len, payload_len, flags, class_index = self.HEADER.unpack(header)
+                    topic: str = f.read(topic_len).decode("utf-8")
+                    body: bytes = f.read(payload_len)
+                    messages.append(
+                        SpooledMessage(
+                            topic=topic,
+                            payload=None if flags & self.NO_PAYLOAD else body,
+                            topic_class=_TOPIC_CLASSES[class_index],
+                            retain=bool(flags & self.RETAIN),
+                            segment=self._segments[0],
+                            end=f.tell(),
+                        )
+                    )
+            return messages
+
+    def advance(self, message: SpooledMessage) -> None:
+        """Remove a message returned by peek, once published"""
+        with self._lock:
+            # evicted while it was being published, already counted as dropped
+            if not self._segments or message.segment != self._segments[0] or message.end <= self._read_offset:
+                return
+            self._read_offset = message.end
+            self._count -= 1
+            if self._read_offset >= self._sizes[0]:
+                self._drop_oldest()
+                self._read_offset = 0
+            self._save_offset()
+
+    def _load_offset(self) -> int:
+        try:
+            name, raw = self._offset_path.read_text().split()
+            offset: int = int(raw)
+        except FileNotFoundError:
+            return 0
+        except (OSError, ValueError) as e:
+            log.warning("Ignoring unreadable spool offset at %s: %s", self._offset_path, e)
+            return 0
+        if not self._segments or self._segments[0].name != name:
+            return 0
+        return offset
+
+    def _save_offset(self) -> None:
+        if self._read_offset == 0:
+            self._offset_path.unlink(missing_ok=True)
+            return
+        tmp_path: Path = self._offset_path.with_suffix(".tmp")
+        tmp_path.write_text(f"{self._segments[0].name} {self._read_offset}")
+        tmp_path.replace(self._offset_path)
+
+    def _evict(self) -> None:
+        while len(self._segments) > 1 and self._bytes > self.max_bytes:
+            dropped: int = self._records(self._segments[0], self._read_offset)
+            self._drop_oldest()
+            self._read_offset = 0
+            self._save_offset()
+            self._count -= dropped
+            self.evicted += dropped
+            log.warning("Spool over %s bytes, evicted %s oldest messages", self.max_bytes, dropped)
+
+    def _drop_oldest(self) -> None:
+        self._segments.pop(0).unlink(missing_ok=True)
+        self._bytes -= self._sizes.pop(0)
+
+    def _records(self, segment: Path, offset: int = 0) -> int:
+        count: int = 0
+        size: int = segment.stat().st_size
+        with segment.open("rb") as f:
+            f.seek(offset)
+            while offset + self.HEADER.size <= size:
+                topic_len, payload_len, _, _ = self.HEADER.unpack(f.read(self.HEADER.size))
+                offset += self.HEADER.size + topic_len + payload_len
+                f.seek(offset)
+                count += 1
+        return count
+
+
+@dataclass
+class PublishStats:
+    published: int = 0
+    completed: int = 0
+    failed: int = 0
+    lost: int = 0
+    spooled: int = 0
+    unspooled: int = 0
+    images_shed: int = 0
+    images_downscaled: int = 0
+    peak_inflight_bytes: int = 0
+    latency_seconds: float = 0.0
+    max_latency_seconds: float = 0.0
+
+    def as_dict(self) -> dict[str, Any]:
+        result: dict[str, Any] = asdict(self)
+        result["mean_latency_seconds"] = round(self.latency_seconds / self.completed, 4) if self.completed else None
+        return result
+
+
+class OutboundQueue:
+    """Tracks MQTT publishes until paho reports them sent, or acknowledged for QoS 1 and 2
+
+    Unsent bytes are the backpressure signal, images are downscaled or shed once they would
+    take the total past the high water mark, while state and discovery are always published.
+    """
+
+    def __init__(
+        self,
+        client: mqtt.Client,
+        qos: dict[TopicClass, int] | None = None,
+        high_water_bytes: int = 0,
+        image_backpressure: ImageBackpressure = ImageBackpressure.DOWNSCALE,
+        inflight_timeout: float = 60.0,
+        spool: Spool | None = None,
+        spool_classes: frozenset[TopicClass] = frozenset({TopicClass.STATE}),
+        drain_rate: float = 20.0,
+        scheduler: Scheduler | None = None,
+        image_client: mqtt.Client | None = None,
+        protocol_v5: bool = False,
+        topic_alias_maximum: int = 0,
+        image_expiry: int = 0,
+    ) -> None:
+        self.client: mqtt.Client = client
+        # optional separate connection, so large images don't delay state messages in the socket buffer
+        self.image_client: mqtt.Client | None = image_client
+        self.qos: dict[TopicClass, int] = qos or {}
+        self.high_water_bytes: int = high_water_bytes
+        self.image_backpressure: ImageBackpressure = image_backpressure
+        self.inflight_timeout: float = inflight_timeout
+        self.stats = PublishStats()
+        # (connection, mid) -> (payload bytes, submitted at)
+        self._inflight: dict[tuple[int, int], tuple[int, float]] = {}
+        # completions reported by the network thread before publish() recorded the mid
+        self._early: set[tuple[int, int]] = set()
+        self._inflight_bytes: int = 0
+        self._lock = threading.Lock()
+        self.spool: Spool | None = spool
+        self.spool_classes: frozenset[TopicClass] = spool_classes
+        self.drain_rate: float = drain_rate
+        self._scheduler: Scheduler = scheduler or SCHEDULER
+        self._drain_handle: TimerHandle | None = None
+        self._drain_lock = threading.Lock()
+        # MQTT v5 only, plain v3 publishes otherwise
+        self.protocol_v5: bool = protocol_v5
+        self.topic_alias_maximum: int = topic_alias_maximum
+        self.image_expiry: int = image_expiry
+        # per connection, topic -> alias, and the most aliases the broker accepts
+        self._aliases: dict[int, dict[str, int]] = {}
+        self._alias_limit: dict[int, int] = {}
+        # per connection, topics whose alias went out with the full topic, so the broker can resolve it
+        self._alias_sent: dict[int, set[str]] = {}
+
+    @classmethod
+    def from_settings(
+        cls,
+        client: mqtt.Client,
+        cfg: MQTTSettings,
+        data_dir: Path | None = None,
+        image_client: mqtt.Client | None = None,
+    ) -> "OutboundQueue":
+        spool: Spool | None = None
+        if cfg.spool_max_bytes > 0 and data_dir is not None:
+            try:
+                spool = Spool(data_dir / "spool", cfg.spool_max_bytes)
+            except Exception as e:
+                log.error("Unable to create MQTT spool in %s, publishing without it: %s", data_dir, e)
+        return cls(
+            client,
+            qos={TopicClass.STATE: cfg.state_qos, TopicClass.IMAGE: cfg.image_qos, TopicClass.DISCOVERY: cfg.discovery_qos},
+            high_water_bytes=cfg.high_water_bytes,
+            image_backpressure=cfg.image_backpressure,
+            spool=spool,
+            spool_classes=frozenset({TopicClass.STATE, TopicClass.IMAGE} if cfg.spool_images else {TopicClass.STATE}),
+            drain_rate=cfg.spool_drain_rate,
+            image_client=image_client,
+            protocol_v5=cfg.protocol in ("5", "5.0"),
+            topic_alias_maximum=cfg.topic_alias_maximum,
+            image_expiry=cfg.image_expiry,
+        )
+
+    def start(self) -> None:
+        """Set the client callbacks, before connecting so the first CONNACK is seen"""
+        for client in (self.client, self.image_client):
+            if client is None:
+                continue
+            client.on_publish = self.on_publish
+            if self.protocol_v5:
+                self._chain_on_connect(client)
+        if self.spool is not None and len(self.spool):
+            self._schedule_drain()
+
+    def publish(
+        self, topic: str, payload: str | bytes | None, topic_class: TopicClass, retain: bool = True
+    ) -> mqtt.MQTTMessageInfo | None:
+        # once anything is spooled, later messages queue behind it so retained state isn't overwritten by older values
+        if (
+            self.spool is not None
+            and topic_class in self.spool_classes
+            and (len(self.spool) or not self.client_for(topic_class).is_connected())
+        ):
+            try:
+                self.spool.append(topic, payload, topic_class, retain)
+                self.stats.spooled += 1
+                self._schedule_drain()
+                return None
+            except Exception as e:
+                log.error("Failed to spool MQTT message for %s: %s", topic, e)
+        return self._send(topic, payload, topic_class, retain)
+
+    def _schedule_drain(self) -> None:
+        with self._drain_lock:
+            if self._drain_handle is None or not self._drain_handle.active:
+                self._drain_handle = self._scheduler.call_later(1.0, self._drain, "mqtt spool drain")
+
+    def _drain(self) -> None:
+        """Publish a second's worth of spooled messages, oldest first, while connected"""
+        if self.spool is None:
+            return
+        if self.client.is_connected():
+            batch: list[SpooledMessage] = self.spool.peek(max(1, int(self.drain_rate)))
+            for message in batch:
+                if not self.client_for(message.topic_class).is_connected():
+                    break
+                info: mqtt.MQTTMessageInfo | None = self._send(
+                    message.topic, message.payload, message.topic_class, message.retain
+                )
+                if not self.accepted(info, message.topic_class):
+                    # left in the spool, retried on the next drain
+                    break
+                self.spool.advance(message)
+                self.stats.unspooled += 1
+            if batch and not len(self.spool):
+                log.info("MQTT spool drained, %s messages sent after reconnect", self.stats.unspooled)
+        if len(self.spool):
+            self._schedule_drain()
+
+    def _send(
+        self, topic: str, payload: str | bytes | None, topic_class: TopicClass, retain: bool
+    ) -> mqtt.MQTTMessageInfo | None:
+        size: int = len(payload) if payload is not None else 0
+        qos: int = self.qos.get(topic_class, 0)
+        client: mqtt.Client = self.client_for(topic_class)
+        submitted: float = time.monotonic()
+        info: mqtt.MQTTMessageInfo
+        if self.protocol_v5:
+            sent_topic, properties = self._properties(client, topic, payload, topic_class, qos)
+            info = client.publish(sent_topic, payload=payload, qos=qos, retain=retain, properties=properties)
+            if sent_topic and hasattr(properties, "TopicAlias") and self.accepted(info, topic_class):
+                with self._lock:
+                    sent: set[str] | None = self._alias_sent.get(id(client))
+                    # unless the connection was replaced meanwhile, with a fresh alias map
+                    if sent is not None and self._aliases.get(id(client), {}).get(topic) == properties.TopicAlias:
+                        sent.add(topic)
+        else:
+            info = client.publish(topic, payload=payload, qos=qos, retain=retain)
+        mid: Any = getattr(info, "mid", None)
+        with self._lock:
+            self.stats.published += 1
+            if not self.accepted(info, topic_class):
+                # not queued by paho, so will never complete
+                self.stats.failed += 1
+                log.warning("MQTT publish to %s failed: %s", topic, getattr(info, "rc", None))
+                return info
+            if not isinstance(mid, int):
+                return info
+            key: tuple[int, int] = (id(client), mid)
+            if key in self._early:
+                self._early.discard(key)
+                self.stats.completed += 1
+                return info
+            self._inflight[key] = (size, submitted)
+            self._inflight_bytes += size
+            self.stats.peak_inflight_bytes = max(self.stats.peak_inflight_bytes, self._inflight_bytes)
+        return info
+
+    def accepted(self, info: mqtt.MQTTMessageInfo | None, topic_class: TopicClass) -> bool:
+        """Check a publish was spooled, or queued by paho, so will be sent without being published again"""
+        if info is None:
+            return True
+        rc: Any = getattr(info, "rc", MQTTErrorCode.MQTT_ERR_SUCCESS)
+        # paho keeps QoS 1 and 2 messages queued to send once reconnected
+        return rc == MQTTErrorCode.MQTT_ERR_SUCCESS or self.qos.get(topic_class, 0) > 0
+
+    def _properties(
+        self, client: mqtt.Client, topic: str, payload: str | bytes | None, topic_class: TopicClass, qos: int
+    ) -> tuple[str, Properties]:
+        """Build v5 publish properties, replacing the topic by an alias once the broker knows it
+
+        Until the first publish with an alias is queued, others for the topic also carry the full
+        topic, so a concurrent publish can't reach the broker with an alias it hasn't seen.
+        """
+        properties = Properties(PacketTypes.PUBLISH)
+        if payload is not None:
+            if topic_class == TopicClass.IMAGE:
+                content_type: str | None = image_content_type(payload) if isinstance(payload, bytes) else None
+                if content_type:
+                    properties.ContentType = content_type
+            else:
+                properties.ContentType = "application/json"
+                properties.PayloadFormatIndicator = 1
+            if topic_class == TopicClass.IMAGE and self.image_expiry > 0:
+                properties.MessageExpiryInterval = self.image_expiry
+        # discovery topics are many and rarely sent, so aliases are kept for state and images.
+        # QoS 1/2 messages may be resent by paho after a reconnect, when the broker has forgotten aliases
+        if topic_class == TopicClass.DISCOVERY or qos > 0:
+            return topic, properties
+        with self._lock:
+            aliases: dict[str, int] | None = self._aliases.get(id(client))
+            if aliases is None:
+                return topic, properties
+            alias: int | None = aliases.get(topic)
+            if alias is not None:
+                properties.TopicAlias = alias
+                if topic in self._alias_sent.get(id(client), set()):
+                    return "", properties
+                return topic, properties
+            if len(aliases) < self._alias_limit.get(id(client), 0):
+                alias = len(aliases) + 1
+                aliases[topic] = alias
+                properties.TopicAlias = alias
+        return topic, properties
+
+    def _chain_on_connect(self, client: mqtt.Client) -> None:
+        previous: Any = client.on_connect
+
+        def on_connect(
+            client: mqtt.Client, userdata: Any, flags: Any, reason_code: Any, properties: Properties | None = None
+        ) -> None:
+            self.on_connect(client, userdata, flags, reason_code, properties)
+            if previous is not None:
+                previous(client, userdata, flags, reason_code, properties)
+
+        client.on_connect = on_connect
+
+    def on_connect(
+        self,
+        client: mqtt.Client,
+        _userdata: Any,
+        _flags: Any,
+        _reason_code: Any,
+        properties: Properties | None = None,
+    ) -> None:
+        """Start a fresh alias map, since the broker forgets aliases with the connection"""
+        limit: int = min(self.topic_alias_maximum, getattr(properties, "TopicAliasMaximum", 0) or 0)
+        with self._lock:
+            self._aliases[id(client)] = {}
+            self._alias_sent[id(client)] = set()
+            self._alias_limit[id(client)] = limit
+        log.debug("MQTT v5 connection using up to %s topic aliases", limit)
+
+    def client_for(self, topic_class: TopicClass) -> mqtt.Client:
+        if topic_class == TopicClass.IMAGE and self.image_client is not None:
+            return self.image_client
+        return self.client
+
+    def on_publish(
+        self,
+        client: mqtt.Client,
+        _userdata: Any,
+        mid: int,
+        _reason_code: ReasonCode | None = None,
+        _properties: Properties | None = None,
+    ) -> None:
+        key: tuple[int, int] = (id(client), mid)
+        with self._lock:
+            entry: tuple[int, float] | None = self._inflight.pop(key, None)
+            if entry is None:
+                if len(self._early) > 1000:
+                    self._early.clear()
+                self._early.add(key)
+                return
+            size, submitted = entry
+            latency: float = time.monotonic() - submitted
+            self._inflight_bytes -= size
+            self.stats.completed += 1
+            self.stats.latency_seconds += latency
+            self.stats.max_latency_seconds = max(self.stats.max_latency_seconds, latency)
+
+    @property
+    def inflight_bytes(self) -> int:
+        with self._lock:
+            self._expire()
+            return self._inflight_bytes
+
+    @property
+    def inflight(self) -> int:
+        with self._lock:
+            self._expire()
+            return len(self._inflight)
+
+    def has_room(self, size: int) -> bool:
+        """Check if an image of this size can be published without passing the high water mark"""
+        if self.high_water_bytes <= 0:
+            return True
+        return self.inflight_bytes + size <= self.high_water_bytes
+
+    def close(self) -> None:
+        log.info("MQTT publish stats: %s", self.stats.as_dict())
+
+    def _expire(self) -> None:
+        """Forget messages never reported complete, such as QoS 0 messages dropped on disconnect"""
+        cutoff: float = time.monotonic() - self.inflight_timeout
+        for key, (size, submitted) in list(self._inflight.items()):
+            if submitted < cutoff:
+                del self._inflight[key]
+                self._inflight_bytes -= size
+                self.stats.lost += 1
@@ -0,0 +1,183 @@
+"""Polling file system watcher for network mounts, where inotify events are never delivered
+
+Watchdog's own `PollingObserver` stats every file on every pass. This keeps an index per directory,
+only lists a directory again when its mtime changes, and only stats files still being written.
+"""
+
+import os
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+import structlog
+from watchdog.events import FileClosedEvent, FileCreatedEvent
+from watchdog.observers.api import BaseObserver, EventEmitter, EventQueue, ObservedWatch
+
+log = structlog.get_logger()
+
+
+@dataclass(slots=True)
+class DirectoryIndex:
+    """Files seen in a directory, those complete by name, and those still growing with their last size and mtime"""
+
+    mtime_ns: int | None = None
+    # clock time the last listing started, an mtime this close may hide later changes in the same tick
+    scanned_ns: int = 0
+    settled: set[str] = field(default_factory=set)
+    pending: dict[str, tuple[int, int]] = field(default_factory=dict)
+
+
+class ScandirPollingEmitter(EventEmitter):
+    """Emit a `FileClosedEvent` for each new file, once its size and mtime are unchanged over a poll
+
+    Each poll costs a stat per directory plus one per file still being written, directories are
+    only listed again when their mtime shows entries were added or removed. As with racy git index
+    entries, an mtime within `mtime_window` seconds of the last listing isn't trusted, since network
+    file systems can have coarse timestamps, so a change in the same tick would leave it unchanged.
+    """
+
+    def __init__(
+        self,
+        event_queue: EventQueue,
+        watch: ObservedWatch,
+        *,
+        timeout: float = 2.0,
+        event_filter: list[type] | None = None,
+        stat: Callable[[str], os.stat_result] = os.stat,
+        scandir: Callable[[str], Any] = os.scandir,
+        clock: Callable[[], int] = time.time_ns,
+        mtime_window: float = 2.0,
+    ) -> None:
+        super().__init__(event_queue, watch, timeout=timeout, event_filter=event_filter)
+        self._stat: Callable[[str], os.stat_result] = stat
+        self._scandir: Callable[[str], Any] = scandir
+        self._clock: Callable[[], int] = clock
+        self.mtime_window_ns: int = int(mtime_window * 1_000_000_000)
+        self.directories: dict[str, DirectoryIndex] = {}
+        self.scans: int = 0
+        # files modified before this are left to the catch-up scan, later ones are emitted by polling
+        self.cutoff_ns: int = self._clock() - self.mtime_window_ns
+        # index what's already there when scheduled, files missed while stopped are left to the catch-up scan
+        self._prime(watch.path)
+
+    def _prime(self, path: str) -> None:
+        pending: list[str] = [path]
+        while pending:
+            directory: str = pending.pop()
+            index = DirectoryIndex(scanned_ns=self._clock())
+            try:
+                index.mtime_ns = self._stat(directory).st_mtime_ns
+                # only a directory changed since the cutoff can hold files written since, so only those are stat'ed
+                recent: bool = index.mtime_ns >= self.cutoff_ns
+                with self._scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            if self.watch.is_recursive:
+                                pending.append(entry.path)
+                        elif recent and self._written_since_cutoff(index, entry):
+                            self.queue_event(FileCreatedEvent(entry.path))
+                        else:
+                            index.settled.add(entry.name)
+            except OSError as e:
+                log.warning("Unable to index %s for polling: %s", directory, e)
+                index.mtime_ns = None
+            self.directories[directory] = index
+        log.info("Polling %s directories under %s", len(self.directories), path)
+
+    def _written_since_cutoff(self, index: DirectoryIndex, entry: os.DirEntry[str]) -> bool:
+        """Track a file modified since the cutoff as pending, as the catch-up scan leaves it to polling"""
+        try:
+            stat: os.stat_result = entry.stat()
+        except OSError:
+            return False
+        if stat.st_mtime_ns < self.cutoff_ns:
+            return False
+        index.pending[entry.name] = (stat.st_size, stat.st_mtime_ns)
+        return True
+
+    def queue_events(self, timeout: float) -> None:
+        if self.stopped_event.wait(timeout):
+            return
+        self.poll()
+
+    def poll(self) -> None:
+        for directory, index in list(self.directories.items()):
+            try:
+                mtime_ns: int = self._stat(directory).st_mtime_ns
+            except OSError:
+                if directory != self.watch.path:
+                    del self.directories[directory]
+                else:
+                    index.mtime_ns = None
+                continue
+            fresh: set[str] = set()
+            if mtime_ns != index.mtime_ns or index.scanned_ns - mtime_ns < self.mtime_window_ns:
+                fresh = self._scan(directory, index, mtime_ns)
+            if len(index.pending) > len(fresh):
+                self._check_pending(directory, index, fresh)
+
+    def _scan(self, directory: str, index: DirectoryIndex, mtime_ns: int) -> set[str]:
+        self.scans += 1
+        started: int = self._clock()
+        present: set[str] = set()
+        fresh: set[str] = set()
+        try:
+            with self._scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        # new directories are listed on the next poll, all their files count as new
+                        if self.watch.is_recursive and entry.path not in self.directories:
+                            self.directories[entry.path] = DirectoryIndex()
+                        continue
+                    present.add(entry.name)
+                    if entry.name in index.settled or entry.name in index.pending:
+                        continue
+                    try:
+                        stat: os.stat_result = entry.stat()
+                    except OSError:
+                        continue
+                    index.pending[entry.name] = (stat.st_size, stat.st_mtime_ns)
+                    fresh.add(entry.name)
+                    self.queue_event(FileCreatedEvent(entry.path))
+        except OSError as e:
+            log.warning("Unable to poll %s: %s", directory, e)
+            return fresh
+        index.mtime_ns = mtime_ns
+        index.scanned_ns = started
+        index.settled &= present
+        for name in [name for name in index.pending if name not in present]:
+            del index.pending[name]
+        return fresh
+
+    def _check_pending(self, directory: str, index: DirectoryIndex, fresh: set[str]) -> None:
+        for name, last in list(index.pending.items()):
+            if name in fresh:
+                continue
+            path: str = str(Path(directory, name))
+            try:
+                stat: os.stat_result = self._stat(path)
+            except OSError:
+                del index.pending[name]
+                continue
+            current: tuple[int, int] = (stat.st_size, stat.st_mtime_ns)
+            if current == last and stat.st_size > 0:
+                del index.pending[name]
+                index.settled.add(name)
+                self.queue_event(FileClosedEvent(path))
+            else:
+                index.pending[name] = current
+
+
+class ScandirPollingObserver(BaseObserver):
+    """Observer for `ScandirPollingEmitter`, with timeout as the interval between polls"""
+
+    def __init__(self, *, timeout: float = 2.0) -> None:
+        super().__init__(ScandirPollingEmitter, timeout=timeout)
+
+    @property
+    def cutoff(self) -> float | None:
+        """Earliest cutoff of the scheduled watches, in seconds, for the catch-up scan to stop at"""
+        cutoffs: list[int] = [emitter.cutoff_ns for emitter in self.emitters if isinstance(emitter, ScandirPollingEmitter)]
+        return min(cutoffs) / 1_000_000_000 if cutoffs else None
@@ -0,0 +1,64 @@
+"""JSON encoding and decoding for MQTT payloads, using orjson when installed and the stdlib otherwise
+
+Both backends produce compact output, so payloads are the same whichever is in use.
+"""
+
+import json
+from collections.abc import Callable
+from typing import Any
+
+# orjson.JSONDecodeError is a subclass, so callers can catch this for either backend
+JSONDecodeError = json.JSONDecodeError
+
+# orjson writes non-ASCII text as UTF-8, rather than \u escapes
+_stdlib_encoder = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False)
+
+
+def stdlib_dumps(obj: Any) -> bytes:
+    return _stdlib_encoder.encode(obj).encode("utf-8")
+
+
+BACKEND: str
+dumps: Callable[[Any], bytes]
+loads: Callable[[bytes | str], Any]
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    BACKEND = "json"
+    dumps = stdlib_dumps
+    loads = json.loads
+else:
+    BACKEND = "orjson"
+
+    def _orjson_dumps(obj: Any) -> bytes:
+        # hourly_counts in sighting history is keyed by int
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+
+    dumps = _orjson_dumps
+    loads = orjson.loads
+
+
+class StaticFields:
+    """Pre-encoded JSON members that are the same on every message, such as camera and area
+
+    Saves encoding them again for each event, the dynamic part is encoded and spliced in front.
+    """
+
+    __slots__ = ("encoded", "fields")
+
+    def __init__(self, fields: dict[str, Any]) -> None:
+        self.fields: dict[str, Any] = dict(fields)
+        # members only, without the enclosing braces
+        self.encoded: bytes = dumps(fields)[1:-1]
+
+    def dumps(self, dynamic: dict[str, Any]) -> bytes:
+        """Encode the dynamic members followed by the static ones, as a single JSON object"""
+        if not self.encoded:
+            return dumps(dynamic)
+        if not dynamic:
+            return b"{" + self.encoded + b"}"
+        if not self.fields.keys().isdisjoint(dynamic):
+            # a dynamic value overrides a static one, so encode as a whole rather than repeat a key
+            return dumps({**self.fields, **dynamic})
+        return dumps(dynamic)[:-1] + b"," + self.encoded + b"}"
@@ -2,7 +2,7 @@ import re
 import warnings
 from enum import StrEnum, auto
 from pathlib import Path
-from typing import Final, Literal
+from typing import Final, Literal, Protocol
 
 from pydantic import BaseModel, ConfigDict, Field, field_validator, model_validator
 from pydantic_settings import (
@@ -17,6 +17,16 @@ from pydantic_settings import (
 TARGET_TYPE_PLATE: Final[str] = "plate"
 
 
+class ImageBackpressure(StrEnum):
+    DOWNSCALE = auto()
+    SHED = auto()
+
+
+class WatchMode(StrEnum):
+    NATIVE = auto()
+    POLL = auto()
+
+
 class MQTTSettings(BaseModel):
     model_config = ConfigDict(populate_by_name=True)
 
@@ -26,6 +36,32 @@ class MQTTSettings(BaseModel):
     user: str = Field(description="MQTT account user name")
     protocol: str = Field(default="3.11", description="MQTT protocol version, v3 and v5 supported")
     password: str = Field(alias="pass", description="MQTT account password")
+    state_qos: int = Field(default=0, ge=0, le=2, description="QoS for state messages")
+    image_qos: int = Field(default=0, ge=0, le=2, description="QoS for image messages")
+    discovery_qos: int = Field(default=0, ge=0, le=2, description="QoS for Home Assistant discovery messages")
+    high_water_bytes: int = Field(
+        default=8 * 1024 * 1024,
+        description="Unsent MQTT payload bytes above which images are downscaled or shed, 0 to disable",
+    )
+    image_backpressure: ImageBackpressure = Field(
+        default=ImageBackpressure.DOWNSCALE,
+        description="Over the high water mark, DOWNSCALE images to half size if that fits, or SHED them",
+    )
+    spool_max_bytes: int = Field(
+        default=0,
+        description="Bytes of state messages kept on disk while disconnected from broker, oldest evicted first, 0 to disable",
+    )
+    spool_images: bool = Field(default=False, description="Also spool image messages while disconnected")
+    spool_drain_rate: float = Field(default=20.0, description="Spooled messages published per second after reconnecting")
+    topic_alias_maximum: int = Field(
+        default=10, ge=0, le=65535, description="Most MQTT v5 topic aliases used per connection, capped by the broker's limit"
+    )
+    image_expiry: int = Field(
+        default=0, ge=0, description="MQTT v5 message expiry in seconds for images, so brokers drop stale frames, 0 to keep"
+    )
+    separate_image_client: bool = Field(
+        default=False, description="Publish images on a second MQTT connection, so they don't delay state messages"
+    )
 
 
 class CameraSettings(BaseModel):
@@ -56,6 +92,13 @@ class EventSettings(BaseModel):
     watch_tree: bool = Field(
         default=False, description="Watch directory tree at path, or false for only the root watch_path directory"
     )
+    watch_mode: WatchMode = Field(
+        default=WatchMode.NATIVE,
+        description="NATIVE file system notifications, or POLL for network mounts such as NFS or SMB that don't deliver them",
+    )
+    poll_interval: float = Field(
+        default=2.0, gt=0, description="Seconds between polls in POLL watch_mode, an image is complete once unchanged for one"
+    )
     image_name_re: re.Pattern[str] = Field(
         default=re.compile(r"(?P<dt>[0-9]{17})_(?P<target>[A-Z0-9]+)_(?P<event>VEHICLE_DETECTION)\.(?P<ext>jpg|png|gif|jpeg)"),
         description="Regular expression to find datetime, file extension and target from image name",
@@ -77,6 +120,11 @@ class EventSettings(BaseModel):
         default=2,
         description="Max Levenshtein distance from last known-good plate to trigger correction; 0 to disable",
     )
+    catch_up_rate: float = Field(
+        default=2.0,
+        ge=0,
+        description="Images per second to process on startup from those written while stopped; 0 to disable catch-up",
+    )
 
     @field_validator("image_url_base")
     @classmethod
@@ -110,19 +158,65 @@ class HomeAssistantSettings(BaseModel):
     )
     image_entity: bool = Field(default=True, description="Create an Image entity via MQTT discovery")
     camera_entity: bool = Field(default=True, description="Create a Camera entity via MQTT discovery")
+    republish_jitter: float = Field(
+        default=10.0, description="Maximum random delay in seconds before republishing discovery after HA restarts"
+    )
+    republish_rate: float = Field(
+        default=2.0, description="Discovery messages republished per second after HA restarts, 0 for no pacing"
+    )
+    state_coalesce_window: float = Field(
+        default=0.0,
+        description="Seconds to hold retained state messages, publishing only the latest for each topic, 0 to disable",
+    )
+    state_immediate_priorities: list[str] = Field(
+        default_factory=lambda: ["critical"],
+        description="Target priorities, as well as the dangerous group, published without waiting for state_coalesce_window",
+    )
 
 
 class CacheType(StrEnum):
     MEMORY = auto()
     FILE = auto()
+    SQLITE = auto()
 
 
 class DVLASettings(BaseModel):
     api_key: str | None = Field(default=None, description="DVLA issued API key")
     cache_ttl: int = Field(default=86400, description="Time to live for cached DVLA API results, in seconds, default 1 day")
-    cache_type: CacheType = Field(default=CacheType.FILE, description="Cache implementation, MEMORY or FILE")
+    max_stale: int = Field(
+        default=30 * 86400,
+        description="Seconds past cache_ttl an expired result is still used while it is refreshed in background, 0 to disable",
+    )
+    cache_type: CacheType = Field(default=CacheType.FILE, description="Cache implementation, MEMORY, FILE or SQLITE")
     cache_dir: Path | None = Field(default=Path("/data/cache"), description="Cache directory")
+    negative_cache_ttl: int = Field(
+        default=86400,
+        description="Seconds to remember plates unknown to DVLA or not valid UK registrations, 0 to disable",
+    )
+    error_cache_ttl: int = Field(
+        default=60, description="Seconds to remember transient DVLA API failures before retrying a plate, 0 to disable"
+    )
     verify_plate: str | None = Field(default=None, description="Plate to check at startup to verify API")
+    connect_timeout: float = Field(default=5.0, description="Seconds to wait for a connection to the DVLA API")
+    read_timeout: float = Field(default=10.0, description="Seconds to wait for a DVLA API response once connected")
+    pool_size: int = Field(default=4, description="Maximum kept-alive connections to the DVLA API")
+    rate_limit: float = Field(default=2.0, description="Maximum DVLA API calls per second, 0 to disable rate limiting")
+    rate_burst: int = Field(default=5, description="DVLA API calls allowed in a burst before rate limiting applies")
+    max_queue_wait: float = Field(
+        default=30.0, description="Seconds a DVLA API call can wait for the rate limit before being abandoned"
+    )
+    breaker_threshold: int = Field(
+        default=5, description="Consecutive DVLA API failures or timeouts before lookups are paused, 0 to disable"
+    )
+    breaker_reset: float = Field(default=60.0, description="Seconds to pause DVLA API lookups before probing again")
+    warm_up: bool = Field(default=False, description="Lookup targets configured with lookup enabled at startup")
+    warm_up_refresh: bool = Field(default=False, description="Fetch fresh DVLA results at startup for targets already cached")
+
+
+class CropMode(StrEnum):
+    NONE = auto()
+    PLATE = auto()
+    VEHICLE = auto()
 
 
 class FrigateSettings(BaseModel):
@@ -135,6 +229,15 @@ class FrigateSettings(BaseModel):
         default=None, description="Frigate base URL for API snapshot fallback and UI links, e.g. http://frigate:5000"
     )
     cameras: list[str] | None = Field(default=None, description="Camera names to process; None means all cameras")
+    snapshot_cache_bytes: int = Field(
+        default=32 * 1024 * 1024,
+        description="Maximum memory for cached MQTT snapshots, raw plus decoded, across all cameras; LRU evicted",
+    )
+    crop: CropMode = Field(
+        default=CropMode.NONE,
+        description="Crop published image to the PLATE box (falling back to VEHICLE box) or the VEHICLE box, or NONE",
+    )
+    crop_margin: float = Field(default=0.25, description="Margin added around crop box, as a fraction of box width/height")
 
 
 class TrackerSettings(BaseModel):
@@ -204,19 +307,42 @@ class Target(BaseModel):
     correction: list[str | re.Pattern[str]] = Field(default_factory=lambda: [])
 
     def as_dict(self) -> dict[str, bool | str | None]:
-        result: dict[str, bool | str | None] = {
-            "dangerous": self.group == "dangerous",  # backward compat
-            "description": self.description,
-            "known": self.group == "known",  # backward compat
-            "priority": self.priority,
-            "target": self.id,
-            "target_type": self.target_type,
-            "entity_id": self.entity_id,
-        }
-        if self.icon:
-            result["icon"] = self.icon
-
-        return result
+        return target_attributes(self)
+
+
+class TargetFields(Protocol):
+    """Published target attributes, common to the `Target` config and the records compiled from it"""
+
+    @property
+    def id(self) -> str: ...
+    @property
+    def target_type(self) -> str: ...
+    @property
+    def group(self) -> str | None: ...
+    @property
+    def description(self) -> str | None: ...
+    @property
+    def entity_id(self) -> str | None: ...
+    @property
+    def icon(self) -> str | None: ...
+    @property
+    def priority(self) -> str | None: ...
+
+
+def target_attributes(target: TargetFields) -> dict[str, bool | str | None]:
+    result: dict[str, bool | str | None] = {
+        "dangerous": target.group == "dangerous",  # backward compat
+        "description": target.description,
+        "known": target.group == "known",  # backward compat
+        "priority": target.priority,
+        "target": target.id,
+        "target_type": target.target_type,
+        "entity_id": target.entity_id,
+    }
+    if target.icon:
+        result["icon"] = target.icon
+
+    return result
 
 
 _PRIORITY_BY_GROUP: dict[str, str] = {"known": "medium", "dangerous": "critical"}
@@ -228,7 +354,11 @@ class TargetGroup(BaseModel):
     lookup: bool = Field(
         default=False, description="Lookup registration plate using API, defaults to False for configured plates"
     )
-    members: list[Target] = Field(description="List of target IDs or full target definitions")
+    members: list[Target] = Field(default_factory=list, description="List of target IDs or full target definitions")
+    file: Path | None = Field(
+        default=None,
+        description="CSV, or SQLite with a 'targets' table, of further members, for watchlists too large to list inline",
+    )
     icon: str | None = Field(
         default=None,
         description="Name of icon to publish, for Home Assistant should be a Material Design reference like 'mdi:car'",
@@ -292,6 +422,9 @@ class Settings(BaseSettings):
     frigate: FrigateSettings = FrigateSettings()
     homeassistant: HomeAssistantSettings = HomeAssistantSettings()
     ocr: OCRSettings = OCRSettings()
+    config_reload: bool = Field(
+        default=True, description="Watch the YAML config and apply changes to targets without a restart"
+    )
 
     @model_validator(mode="before")
     @classmethod
@@ -339,6 +472,18 @@ class Settings(BaseSettings):
                         member["target_type"] = target_type
         return data
 
+    @model_validator(mode="after")
+    def resolve_target_files(self) -> "Settings":
+        """Resolve relative target group files against the YAML config directory, not the working directory"""
+        yaml_file: object = self.model_config.get("yaml_file")
+        if not isinstance(yaml_file, str | Path):
+            return self
+        for target_settings in self.targets.values():
+            for group in target_settings.groups:
+                if group.file is not None and not group.file.is_absolute():
+                    group.file = Path(yaml_file).parent / group.file
+        return self
+
     @classmethod
     def settings_customise_sources(
         cls,
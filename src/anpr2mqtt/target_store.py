@@ -0,0 +1,239 @@
+import csv
+import re
+import sqlite3
+import sys
+import time
+from array import array
+from collections.abc import Iterator, Mapping
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+import structlog
+
+from anpr2mqtt.settings import Target, TargetGroup, target_attributes
+
+log = structlog.get_logger()
+
+
+@dataclass(frozen=True, slots=True)
+class TargetRecord:
+    """Immutable target used while handling events, converted once from the pydantic `Target` config"""
+
+    id: str
+    target_type: str = ""
+    group: str | None = None
+    lookup: bool | None = None
+    description: str | None = None
+    entity_id: str | None = None
+    icon: str | None = None
+    priority: str | None = None
+    correction: tuple[re.Pattern[str], ...] = ()
+
+    @classmethod
+    def from_target(cls, target: Target) -> "TargetRecord":
+        return cls(
+            id=target.id,
+            target_type=target.target_type,
+            group=target.group,
+            lookup=target.lookup,
+            description=target.description,
+            entity_id=target.entity_id,
+            icon=target.icon,
+            priority=target.priority,
+            correction=tuple(re.compile(pat) for pat in target.correction),
+        )
+
+    def as_dict(self) -> dict[str, bool | str | None]:
+        return target_attributes(self)
+
+
+# string attributes held as indexes into the shared intern table, index 0 is None
+_STRING_FIELDS: tuple[str, ...] = ("target_type", "group", "description", "icon", "entity_id", "priority")
+_TRUE_VALUES: frozenset[str] = frozenset({"1", "true", "yes", "y", "on"})
+
+
+class TargetStore(Mapping[str, TargetRecord]):
+    """Registered targets held column by column, so large watchlists don't cost an object per target
+
+    Records are built on lookup. Descriptions, icons, groups and the like repeat heavily, so are
+    interned once and stored as array indexes, with the lookup flag in a bytearray.
+    """
+
+    LOOKUP_SET = 0x01
+    LOOKUP = 0x02
+
+    def __init__(self) -> None:
+        self._index: dict[str, int] = {}
+        self._ids: list[str] = []
+        self._columns: dict[str, array[int]] = {name: array("I") for name in _STRING_FIELDS}
+        self._flags = bytearray()
+        self._strings: list[str | None] = [None]
+        self._string_index: dict[str, int] = {}
+        self.load_seconds: float = 0.0
+
+    def _intern(self, value: str | None) -> int:
+        if value is None:
+            return 0
+        idx: int | None = self._string_index.get(value)
+        if idx is None:
+            idx = len(self._strings)
+            self._strings.append(sys.intern(value))
+            self._string_index[value] = idx
+        return idx
+
+    def add(
+        self,
+        target_id: str,
+        target_type: str = "",
+        group: str | None = None,
+        lookup: bool | None = None,
+        description: str | None = None,
+        entity_id: str | None = None,
+        icon: str | None = None,
+        priority: str | None = None,
+    ) -> None:
+        """Add a target, replacing any earlier one with the same id"""
+        values: dict[str, str | None] = {
+            "target_type": target_type,
+            "group": group,
+            "description": description,
+            "icon": icon,
+            "entity_id": entity_id,
+            "priority": priority,
+        }
+        flags: int = 0 if lookup is None else (self.LOOKUP_SET | (self.LOOKUP if lookup else 0))
+        row: int | None = self._index.get(target_id)
+        if row is None:
+            target_id = sys.intern(target_id)
+            self._index[target_id] = len(self._ids)
+            self._ids.append(target_id)
+            for name, column in self._columns.items():
+                column.append(self._intern(values[name]))
+            self._flags.append(flags)
+        else:
+            for name, column in self._columns.items():
+                column[row] = self._intern(values[name])
+            self._flags[row] = flags
+
+    def add_target(self, target: Target) -> None:
+        self.add(
+            target.id,
+            target_type=target.target_type,
+            group=target.group,
+            lookup=target.lookup,
+            description=target.description,
+            entity_id=target.entity_id,
+            icon=target.icon,
+            priority=target.priority,
+        )
+
+    def load_group(self, group: TargetGroup, target_type: str) -> int:
+        """Add members of a group from its CSV or SQLite file, with the same defaults as inline members"""
+        if group.file is None:
+            return 0
+        started: float = time.perf_counter()
+        rows: Iterator[dict[str, Any]]
+        if group.file.suffix.lower() in (".sqlite", ".sqlite3", ".db"):
+            rows = _sqlite_rows(group.file)
+        else:
+            rows = _csv_rows(group.file)
+        count: int = 0
+        for row in rows:
+            target_id: str | None = _text(row.get("id"))
+            if not target_id:
+                continue
+            lookup: str | None = _text(row.get("lookup"))
+            self.add(
+                target_id,
+                target_type=target_type,
+                group=group.name,
+                lookup=group.lookup if lookup is None else lookup.lower() in _TRUE_VALUES,
+                description=_text(row.get("description")) or group.name,
+                entity_id=_text(row.get("entity_id")) or group.entity_id,
+                icon=_text(row.get("icon")) or group.icon,
+                priority=_text(row.get("priority")) or group.priority,
+            )
+            count += 1
+        self.load_seconds += time.perf_counter() - started
+        return count
+
+    def __getitem__(self, target_id: str) -> TargetRecord:
+        """Build the record for a registered target."""
+        row: int = self._index[target_id]
+        strings: list[str | None] = self._strings
+        columns: dict[str, array[int]] = self._columns
+        flags: int = self._flags[row]
+        return TargetRecord(
+            id=self._ids[row],
+            target_type=strings[columns["target_type"][row]] or "",
+            group=strings[columns["group"][row]],
+            lookup=bool(flags & self.LOOKUP) if flags & self.LOOKUP_SET else None,
+            description=strings[columns["description"][row]],
+            entity_id=strings[columns["entity_id"][row]],
+            icon=strings[columns["icon"][row]],
+            priority=strings[columns["priority"][row]],
+        )
+
+    def __contains__(self, target_id: object) -> bool:
+        """Check for a registered target without building its record."""
+        return target_id in self._index
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate target ids in load order."""
+        return iter(self._ids)
+
+    def __len__(self) -> int:
+        """Count of registered targets."""
+        return len(self._ids)
+
+    @property
+    def id_list(self) -> list[str]:
+        """All target ids, in load order, without copying"""
+        return self._ids
+
+    def lookup_ids(self) -> list[str]:
+        """Ids of targets with API lookup enabled, in load order, without building their records"""
+        return [target_id for target_id, flags in zip(self._ids, self._flags, strict=True) if flags & self.LOOKUP]
+
+    def entities(self) -> dict[str, list[TargetRecord]]:
+        """Targets by Home Assistant entity id, for the target sensors"""
+        result: dict[str, list[TargetRecord]] = {}
+        for row, entity_idx in enumerate(self._columns["entity_id"]):
+            if entity_idx:
+                entity_id: str | None = self._strings[entity_idx]
+                if entity_id is not None:
+                    result.setdefault(entity_id, []).append(self[self._ids[row]])
+        return result
+
+    def memory_bytes(self) -> int:
+        """Approximate memory held by the store, including the id and interned strings"""
+        size: int = sys.getsizeof(self._index) + sys.getsizeof(self._ids) + sys.getsizeof(self._flags)
+        size += sum(sys.getsizeof(target_id) for target_id in self._ids)
+        size += sum(sys.getsizeof(column) for column in self._columns.values())
+        size += sys.getsizeof(self._strings) + sys.getsizeof(self._string_index)
+        size += sum(sys.getsizeof(value) for value in self._strings if value is not None)
+        return size
+
+
+def _text(value: Any) -> str | None:
+    if value is None:
+        return None
+    text: str = str(value).strip()
+    return text or None
+
+
+def _csv_rows(path: Path) -> Iterator[dict[str, Any]]:
+    with path.open(newline="", encoding="utf-8") as f:
+        yield from csv.DictReader(f)
+
+
+def _sqlite_rows(path: Path) -> Iterator[dict[str, Any]]:
+    """Rows of the `targets` table, opened read only"""
+    conn: sqlite3.Connection = sqlite3.connect(f"{path.resolve().as_uri()}?mode=ro", uri=True)
+    try:
+        conn.row_factory = sqlite3.Row
+        for row in conn.execute("SELECT * FROM targets"):
+            yield dict(row)
+    finally:
+        conn.close()
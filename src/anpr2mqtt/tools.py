@@ -1,8 +1,13 @@
+import datetime as dt
 import json
+import os
+import time
 from pathlib import Path
 from typing import TYPE_CHECKING, Any, Literal
 
+import paho.mqtt.client as mqtt
 import structlog
+from paho.mqtt.enums import CallbackAPIVersion
 from PIL import Image
 from pydantic import BaseModel, Field
 from pydantic_settings import (
@@ -13,11 +18,26 @@ from pydantic_settings import (
     SettingsConfigDict,
 )
 
-from anpr2mqtt.api_client import DVLAClient
+from anpr2mqtt import serialization
+from anpr2mqtt.api_client import DVLAClient, LookupPriority
 from anpr2mqtt.event_handler import examine_file, scan_ocr_fields
-from anpr2mqtt.settings import DVLASettings, EventSettings, OCRFieldSettings, OCRSettings
+from anpr2mqtt.handler_common import build_dvla_client
+from anpr2mqtt.hass import HomeAssistantPublisher
+from anpr2mqtt.history_import import ImportCheckpoint, ImportJob, ImportStats, import_history
+from anpr2mqtt.settings import (
+    CameraSettings,
+    DVLASettings,
+    EventSettings,
+    HomeAssistantSettings,
+    OCRFieldSettings,
+    OCRSettings,
+    TargetSettings,
+    TrackerSettings,
+)
+from anpr2mqtt.tracker import Sighting, TargetRecord, compute_time_analysis
 
 if TYPE_CHECKING:
+    from anpr2mqtt.api_client import APIClient
     from anpr2mqtt.const import ImageInfo
 
 log = structlog.get_logger()
@@ -62,7 +82,7 @@ class DVLATool(BaseModel):
     dvla: DVLASettings = DVLASettings()
     test: bool = Field(default=False, description="Use DVLA UAT environment")
     log_level: Literal["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"] = "INFO"
-    registration: CliPositionalArg[str]
+    registration: CliPositionalArg[list[str]]
 
     def cli_cmd(self) -> None:
         structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(self.log_level))
@@ -77,10 +97,130 @@ class DVLATool(BaseModel):
             cache_type=self.dvla.cache_type,
             cache_dir=self.dvla.cache_dir,
             cache_ttl=self.dvla.cache_ttl,
+            max_stale=self.dvla.max_stale,
+            negative_cache_ttl=self.dvla.negative_cache_ttl,
+            error_cache_ttl=self.dvla.error_cache_ttl,
             test=self.test,
+            connect_timeout=self.dvla.connect_timeout,
+            read_timeout=self.dvla.read_timeout,
+            pool_size=self.dvla.pool_size,
+            rate_limit=self.dvla.rate_limit,
+            rate_burst=self.dvla.rate_burst,
+            max_queue_wait=self.dvla.max_queue_wait,
+            breaker_threshold=self.dvla.breaker_threshold,
+            breaker_reset=self.dvla.breaker_reset,
+        )
+        try:
+            if len(self.registration) == 1:
+                result: dict[str, Any] = client.lookup(self.registration[0].upper())
+                print(json.dumps(result, indent=2))  # noqa: T201
+            else:
+                results: dict[str, dict[str, Any]] = client.lookup_many(self.registration, priority=LookupPriority.LIVE)
+                print(json.dumps(results, indent=2))  # noqa: T201
+        finally:
+            client.close()
+
+
+class PayloadBenchmarkTool(BaseModel):
+    events: int = Field(default=10000, description="Number of state messages to encode")
+    history: int = Field(default=500, description="Previous sightings in each message's history")
+
+    def cli_cmd(self) -> None:
+        event = EventSettings(event="anpr", camera="driveway")
+        camera = CameraSettings(name="driveway", area="Front", live_url="http://nvr.local/driveway")
+        start: dt.datetime = dt.datetime(2025, 1, 1, tzinfo=dt.UTC)
+        history: dict[str, Any] = compute_time_analysis(
+            [(start + dt.timedelta(hours=7 * i)).isoformat() for i in range(self.history)], start
+        )
+        sighting = Sighting(TargetRecord(id="AB12CDE", group="known", description="Blue Ford Focus"), uncorrected="AB12C0E")
+        reg_info: dict[str, Any] = {"make": "FORD", "colour": "BLUE", "yearOfManufacture": 2019, "taxStatus": "Taxed"}
+        publisher = HomeAssistantPublisher(
+            mqtt.Client(callback_api_version=CallbackAPIVersion.VERSION2), HomeAssistantSettings()
+        )
+
+        def baseline() -> bytes:
+            # per event dict build and stdlib encode, as before the serialization module
+            payload: dict[str, Any] = sighting.as_dict()
+            payload.update(
+                {
+                    event.target_type: sighting.target.id,
+                    "event": event.event,
+                    "camera": camera.name,
+                    "area": camera.area,
+                    "live_url": camera.live_url,
+                    "reg_info": reg_info,
+                    "history": history,
+                }
+            )
+            return json.dumps(payload).encode("utf-8")
+
+        def current() -> bytes:
+            return publisher.encode_state_message(sighting, event, camera, time_analysis=history, reg_info=reg_info)
+
+        print(f"Encoding {self.events} state messages, {self.history} previous sightings, backend {serialization.BACKEND}")  # noqa: T201
+        for name, encode in (("stdlib json", baseline), ("anpr2mqtt", current)):
+            started: float = time.perf_counter()
+            for _ in range(self.events):
+                msg: bytes = encode()
+            elapsed: float = time.perf_counter() - started
+            print(f"{name:>12}: {elapsed * 1e6 / self.events:8.1f}us per event, {len(msg)} bytes")  # noqa: T201
+
+
+class ImportHistoryTool(BaseModel):
+    event: EventSettings = EventSettings()
+    targets: TargetSettings = TargetSettings()
+    tracker: TrackerSettings = TrackerSettings()
+    dvla: DVLASettings = DVLASettings()
+    recursive: bool = Field(default=True, description="Import images in subdirectories of the event watch_path too")
+    workers: int = Field(default=os.cpu_count() or 1, ge=1, description="Worker processes, 1 to import in this process")
+    batch_size: int = Field(default=5000, ge=1, description="File names sent to a worker at a time")
+    checkpoint_every: int = Field(default=200000, ge=1, description="Sightings between writing history and checkpoint")
+    restart: bool = Field(default=False, description="Ignore any checkpoint and import every image again")
+    lookup: bool = Field(default=False, description="Look up imported plates with DVLA afterwards, to fill the cache")
+    log_level: Literal["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"] = Field(
+        default="WARNING", description="Logging verbosity, INFO logs the normalisation and correction of every image"
+    )
+
+    def cli_cmd(self) -> None:
+        structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(self.log_level))
+        root: Path = self.event.watch_path
+        checkpoint = ImportCheckpoint(self.tracker.data_dir / "import_history" / f"{self.event.target_type}.json", root)
+        if not self.restart and checkpoint.load():
+            print(f"Resuming import of {root.resolve()} after {'/'.join(checkpoint.parts or ())}/{checkpoint.name}")  # noqa: T201
+        job = ImportJob(
+            target_type=self.event.target_type,
+            image_name_re=self.event.image_name_re,
+            tracker_config=self.tracker,
+            target_config=self.targets,
+            region=self.event.region,
+            auto_match_tolerance=self.event.auto_match_tolerance,
+            log_level=self.log_level,
+        )
+        stats: ImportStats = import_history(
+            job,
+            root,
+            recursive=self.recursive,
+            workers=self.workers,
+            batch_size=self.batch_size,
+            checkpoint_every=self.checkpoint_every,
+            checkpoint=checkpoint,
+        )
+        print(  # noqa: T201
+            f"Imported {stats.images} images from {stats.files} files in {stats.seconds:.1f}s, "
+            f"{stats.sightings} new sightings for {stats.targets} {self.event.target_type} targets, "
+            f"{stats.skipped} unparseable"
         )
-        result: dict[str, Any] = client.lookup(self.registration.upper())
-        print(json.dumps(result, indent=2))  # noqa: T201
+        if self.lookup and stats.lookup:
+            api_client: APIClient | None = build_dvla_client(self.dvla, self.event.target_type)
+            if api_client is None:
+                print("DVLA lookup skipped, needs a plate event and an API key (--dvla.api_key)")  # noqa: T201
+                return
+            try:
+                results: dict[str, dict[str, Any]] = api_client.lookup_many(sorted(stats.lookup))
+                found: int = sum(1 for result in results.values() if result.get("success"))
+                print(f"Looked up {len(results)} plates with DVLA, {found} found")  # noqa: T201
+            finally:
+                api_client.close()
 
 
 class Tools(BaseSettings, cli_parse_args=True, cli_exit_on_error=True):
@@ -92,6 +232,8 @@ class Tools(BaseSettings, cli_parse_args=True, cli_exit_on_error=True):
     ocr_file: CliSubCommand[OCRTool]
     list_dir: CliSubCommand[ListTool]
     dvla_lookup: CliSubCommand[DVLATool]
+    payload_benchmark: CliSubCommand[PayloadBenchmarkTool]
+    import_history: CliSubCommand[ImportHistoryTool]
 
     def cli_cmd(self) -> None:
         CliApp.run_subcommand(self)
@@ -1,7 +1,7 @@
 import datetime as dt
 import json
 import re
-from dataclasses import dataclass
+from dataclasses import dataclass, field, replace
 from typing import Any, cast
 
 import structlog
@@ -9,26 +9,81 @@ import tzlocal
 
 from anpr2mqtt.normalizers import Normalizer, fuzzy_match
 from anpr2mqtt.settings import (
-    Target,
     TargetSettings,
     TrackerSettings,
 )
+from anpr2mqtt.target_store import TargetRecord, TargetStore
 
 log = structlog.get_logger()
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Sighting:
-    target: Target
+    target: TargetRecord
     uncorrected: str | None = None
     ignore: bool = False
     previous_sightings: list[str] | None = None
 
     def as_dict(self) -> dict[str, Any]:
-        result = self.target.as_dict()
-        result.update({"orig_target": self.uncorrected, "ignore": self.ignore})
+        result: dict[str, Any] = self.target.as_dict()
+        result["orig_target"] = self.uncorrected
+        result["ignore"] = self.ignore
         return result
 
+    def with_description(self, description: str | None) -> "Sighting":
+        return replace(self, target=replace(self.target, description=description))
+
+
+@dataclass(frozen=True, slots=True)
+class CompiledTargets:
+    """Everything find() needs from a target config, built off the hot path and swapped in whole"""
+
+    config: TargetSettings | None = None
+    ids: TargetStore = field(default_factory=TargetStore)
+    entities: dict[str, list[TargetRecord]] = field(default_factory=dict)
+    # config patterns compiled once, rather than looked up in the re cache for every sighting
+    corrections: tuple[tuple[str, tuple[re.Pattern[str], ...]], ...] = ()
+    target_corrections: tuple[tuple[str, tuple[re.Pattern[str], ...]], ...] = ()
+    ignore: tuple[re.Pattern[str], ...] = ()
+
+
+def compile_targets(target_type: str, target_config: TargetSettings | None, strict: bool = False) -> CompiledTargets:
+    """Build the targets for a config, with strict raising if a target file can't be loaded rather than skipping it"""
+    if target_config is None:
+        return CompiledTargets()
+    ids = TargetStore()
+    target_corrections: list[tuple[str, tuple[re.Pattern[str], ...]]] = []
+    for target_group in target_config.groups:
+        for member in target_group.members:
+            ids.add_target(member)
+            if member.correction:
+                target_corrections.append((member.id, tuple(re.compile(pat) for pat in member.correction)))
+        if target_group.file is not None:
+            try:
+                loaded: int = ids.load_group(target_group, target_type)
+                log.info("Loaded %s %s targets for %s from %s", loaded, target_type, target_group.name, target_group.file)
+            except Exception as e:
+                log.error("Failed to load %s targets from %s: %s", target_group.name, target_group.file, e)
+                if strict:
+                    raise
+    log.info(
+        "%s %s targets registered, %.1f KiB, files loaded in %.2fs",
+        len(ids),
+        target_type,
+        ids.memory_bytes() / 1024,
+        ids.load_seconds,
+    )
+    return CompiledTargets(
+        config=target_config,
+        ids=ids,
+        entities=ids.entities(),
+        corrections=tuple(
+            (corrected, tuple(re.compile(pat) for pat in pats)) for corrected, pats in target_config.correction.items()
+        ),
+        target_corrections=tuple(target_corrections),
+        ignore=tuple(re.compile(pat) for pat in target_config.ignore),
+    )
+
 
 class Tracker:
     def __init__(
@@ -38,13 +93,16 @@ class Tracker:
         region: str | None = None,
         target_config: TargetSettings | None = None,
         auto_match_tolerance: int = 0,
+        compiled: CompiledTargets | None = None,
     ) -> None:
         self.target_type: str = target_type
         self.tracker_config: TrackerSettings = tracker_config
-        self.entities: dict[str, list[Target]] = {}
-        self.ids: dict[str, Target] = {}
-        self._target_config: TargetSettings | None = None
-        self.target_config = target_config
+        self._compiled: CompiledTargets = CompiledTargets()
+        # trackers for the same target type can share targets already compiled, rather than each load them
+        if compiled is not None:
+            self.swap(compiled)
+        else:
+            self.target_config = target_config
         self.auto_match_tolerance = auto_match_tolerance
         self.region: str | None = region
         self.normalizer: Normalizer | None = None
@@ -53,21 +111,23 @@ class Tracker:
 
     @property
     def target_config(self) -> TargetSettings | None:
-        return self._target_config
+        return self._compiled.config
 
     @target_config.setter
     def target_config(self, value: TargetSettings | None) -> None:
-        self._target_config = value
-        self.ids = {}
-        self.entities = {}
-        if value:
-            for target_group in value.groups:
-                for target in target_group.members:
-                    self.ids[target.id] = target
-                    entity_id: str | None = target.entity_id
-                    if entity_id is not None:
-                        self.entities.setdefault(entity_id, [])
-                        self.entities[entity_id].append(target)
+        self.swap(compile_targets(self.target_type, value))
+
+    def swap(self, compiled: CompiledTargets) -> None:
+        """Replace the target config in a single assignment, so a sighting never sees a partly built config"""
+        self._compiled = compiled
+
+    @property
+    def ids(self) -> TargetStore:
+        return self._compiled.ids
+
+    @property
+    def entities(self) -> dict[str, list[TargetRecord]]:
+        return self._compiled.entities
 
     def history(self, target_id: str, target_type: str) -> list[str]:
         target_id = target_id or "UNKNOWN"
@@ -118,57 +178,58 @@ class Tracker:
         return time_analysis
 
     def find(self, target_id: str) -> Sighting:
-        result: Sighting = Sighting(
-            target=Target(id=target_id, target_type=self.target_type, priority="high", lookup=True), uncorrected=target_id
-        )
-        if not target_id or self.target_config is None:
-            # empty dict to make home assistant template logic easier
-            return result
+        uncorrected: str = target_id
+        # one snapshot for the whole match, a reload may swap in a new config meanwhile
+        compiled: CompiledTargets = self._compiled
+        if not target_id or compiled.config is None:
+            return Sighting(TargetRecord(id=target_id, target_type=self.target_type, priority="high", lookup=True), uncorrected)
 
+        found_id: str = target_id
         if self.normalizer:
             normalised = self.normalizer.normalize(target_id)
             if normalised:
                 log.info("%s %s normalised %s -> %s", self.region, self.target_type, target_id, normalised)
                 target_id = normalised
-                result.target.id = normalised
+                found_id = normalised
 
         lookup_id = target_id
-        for corrected_target, patterns in self.target_config.correction.items():
-            if any(re.match(pat, target_id) for pat in patterns) and corrected_target != target_id:
-                result.target.id = corrected_target
+        for corrected_target, patterns in compiled.corrections:
+            if any(pat.match(target_id) for pat in patterns) and corrected_target != target_id:
+                found_id = corrected_target
                 lookup_id = corrected_target
                 log.info("Corrected target %s -> %s", target_id, lookup_id)
                 break
         if lookup_id == target_id:
-            for registered_target in self.ids.values():
-                if any(re.match(pat, target_id) for pat in registered_target.correction):
-                    lookup_id = registered_target.id
-                    result.target.id = registered_target.id
+            for registered_id, patterns in compiled.target_corrections:
+                if any(pat.match(target_id) for pat in patterns):
+                    lookup_id = registered_id
+                    found_id = registered_id
                     log.info("Corrected target %s -> %s (per-target)", target_id, lookup_id)
                     break
-        for pat in self.target_config.ignore:
-            if re.match(pat, target_id):
-                log.info("Ignoring %s matching ignore pattern %s", target_id, pat)
-                result.ignore = True
-                result.target.priority = "low"
-                if result.target.group is None:  # not yet found in registered lists
-                    result.target.description = "Ignored"
+        ignore: bool = False
+        for pat in compiled.ignore:
+            if pat.match(target_id):
+                log.info("Ignoring %s matching ignore pattern %s", target_id, pat.pattern)
+                ignore = True
                 break
         max_dist = self.auto_match_tolerance
-        target: Target | None = None
         registered_match: str | None = (
             lookup_id
-            if lookup_id in self.ids
-            else (fuzzy_match(lookup_id, max_dist, list(self.ids.keys())) if max_dist > 0 else None)
+            if lookup_id in compiled.ids
+            else (fuzzy_match(lookup_id, max_dist, compiled.ids.id_list) if max_dist > 0 else None)
         )
         if registered_match:
-            target = self.ids[registered_match]
-
-        if target:
             if registered_match != lookup_id:
                 log.info("Fuzzy-matched %s to registered plate %s", lookup_id, registered_match)
-            result.target = target
-        return result
+            return Sighting(compiled.ids[registered_match], uncorrected, ignore)
+        # only unregistered targets get a new record
+        if ignore:
+            return Sighting(
+                TargetRecord(id=found_id, target_type=self.target_type, priority="low", lookup=True, description="Ignored"),
+                uncorrected,
+                ignore,
+            )
+        return Sighting(TargetRecord(id=found_id, target_type=self.target_type, priority="high", lookup=True), uncorrected)
 
 
 def compute_time_analysis(sightings: list[str], current_dt: dt.datetime | None = None) -> dict[str, Any]:
@@ -1,3 +1,5 @@
+import threading
+import time
 from pathlib import Path
 from typing import Any
 from unittest.mock import MagicMock
@@ -5,8 +7,25 @@ from unittest.mock import MagicMock
 import pytest
 from pytest_mock import MockerFixture
 
-from anpr2mqtt.api_client import APIClient, DVLAClient
-from anpr2mqtt.settings import CacheType
+from anpr2mqtt.api_client import (
+    APIClient,
+    CircuitBreaker,
+    CircuitState,
+    DVLAClient,
+    FailureCache,
+    LookupPriority,
+    RateLimitedError,
+    SingleFlight,
+    TokenBucket,
+    _CachedSession,
+    lookup_failure_reason,
+    registration_cache_key,
+    registration_key,
+)
+from anpr2mqtt.handler_common import lookup_targets, start_dvla_warm_up
+from anpr2mqtt.settings import CacheType, DVLASettings, TargetGroup, TargetSettings
+from anpr2mqtt.target_store import TargetStore
+from anpr2mqtt.tracker import compile_targets
 
 
 def _make_response(status_code: int, json_data: object, from_cache: bool = False) -> MagicMock:
@@ -14,6 +33,7 @@ def _make_response(status_code: int, json_data: object, from_cache: bool = False
     resp.status_code = status_code
     resp.json.return_value = json_data
     resp.from_cache = from_cache
+    resp.is_expired = False
     resp.history = None
     resp.created_at = None
     return resp
@@ -118,6 +138,159 @@ def test_init_file_cache_exception_falls_back_to_memory(mocker: MockerFixture, t
     assert kwargs["backend"] == "memory"
 
 
+def test_init_sqlite_cache_keyed_by_registration(mocker: MockerFixture, tmp_path: Path) -> None:
+    sqlite_cache_cls = mocker.patch("anpr2mqtt.api_client.SQLiteCache")
+    cls_mock, _ = _mock_session(mocker, 200, {})
+    DVLAClient("key", cache_dir=tmp_path, cache_type=CacheType.SQLITE)
+    sqlite_cache_cls.assert_called_once_with(db_path=tmp_path / "dvla_cache.sqlite", wal=True)
+    _, kwargs = cls_mock.call_args
+    assert kwargs["backend"] is sqlite_cache_cls.return_value
+    assert kwargs["key_fn"] is registration_cache_key
+
+
+def test_init_sqlite_cache_exception_falls_back_to_memory(mocker: MockerFixture, tmp_path: Path) -> None:
+    mocker.patch("anpr2mqtt.api_client.SQLiteCache", side_effect=OSError("read only"))
+    cls_mock, _ = _mock_session(mocker, 200, {})
+    DVLAClient("key", cache_dir=tmp_path, cache_type=CacheType.SQLITE)
+    _, kwargs = cls_mock.call_args
+    assert kwargs["backend"] == "memory"
+
+
+def test_registration_cache_key() -> None:
+    request = MagicMock(body=b'{"registrationNumber": "ab12cde"}', url="https://driver-vehicle-licensing.api.gov.uk/x")
+    assert registration_cache_key(request) == "GB:AB12CDE"
+    request.url = "https://uat.driver-vehicle-licensing.api.gov.uk/x"
+    assert registration_cache_key(request) == "GB:uat:AB12CDE"
+    assert registration_cache_key(MagicMock(body=None, url=None)) == "GB:"
+    assert registration_key("ab12cde", uat=True) == registration_cache_key(request)
+
+
+def test_sqlite_cache_stores_by_registration(tmp_path: Path) -> None:
+    client = DVLAClient("key", cache_dir=tmp_path, cache_type=CacheType.SQLITE)
+    assert client.cache_session is not None
+    assert (tmp_path / "dvla_cache.sqlite").exists()
+    assert not client.cache_session.cache.contains(key="GB:AB12CDE")
+    client.close()
+
+
+def test_warm_up_looks_up_unique_plates_in_background(mocker: MockerFixture) -> None:
+    _, session = _mock_session(mocker, 200, {"make": "ROVER"})
+    client = DVLAClient("key")
+    lookup = mocker.spy(client, "lookup")
+    assert client.warm_up(["ab12cde", "AB12CDE", "CD34EFG"]) == 2
+    assert session.post.call_count == 2
+    assert all(call.kwargs["priority"] == LookupPriority.BACKGROUND for call in lookup.call_args_list)
+    assert session.post.call_args.kwargs["force_refresh"] is False
+
+
+def test_warm_up_refresh_forces_api_call(mocker: MockerFixture) -> None:
+    _, session = _mock_session(mocker, 404, {"errors": []})
+    client = DVLAClient("key")
+    assert client.warm_up(["AB12CDE"], refresh=True) == 0
+    assert session.post.call_args.kwargs["force_refresh"] is True
+
+
+def test_api_client_base_warm_up_not_implemented() -> None:
+    with pytest.raises(NotImplementedError):
+        APIClient().warm_up(["AB12CDE"])
+
+
+def test_lookup_many_dedupes_and_keeps_order(mocker: MockerFixture) -> None:
+    _, session = _mock_session(mocker, 200, {"make": "ROVER"})
+    client = DVLAClient("key")
+    results = client.lookup_many(["cd34efg", "AB12CDE", "CD34EFG"])
+    assert list(results) == ["CD34EFG", "AB12CDE"]
+    assert all(result["success"] for result in results.values())
+    assert session.post.call_count == 2
+
+
+def test_lookup_many_serves_cached_before_fetching(mocker: MockerFixture) -> None:
+    _, session = _mock_session(mocker, 200, {"make": "ROVER"})
+    session.cache.contains.side_effect = lambda key: key == "GB:AB12CDE"
+    client = DVLAClient("key")
+    fetched: list[str] = []
+
+    def post(**kwargs: Any) -> MagicMock:
+        fetched.append(kwargs["json"]["registrationNumber"])
+        return _make_response(200, {"make": "ROVER"})
+
+    session.post.side_effect = post
+    client.lookup_many(["CD34EFG", "AB12CDE", "EF56GHJ"], max_workers=1)
+    assert fetched == ["AB12CDE", "CD34EFG", "EF56GHJ"]
+
+
+def test_lookup_many_negative_cached_not_fetched(mocker: MockerFixture) -> None:
+    _, session = _mock_session(mocker, 404, {"errors": []})
+    session.cache.contains.return_value = False
+    client = DVLAClient("key", negative_cache_ttl=60)
+    client.lookup("AB12CDE")
+    results = client.lookup_many(["AB12CDE"])
+    assert results["AB12CDE"]["failure_cached"] is True
+    assert session.post.call_count == 1
+
+
+def test_lookup_many_concurrency_bounded(mocker: MockerFixture) -> None:
+    _, session = _mock_session(mocker, 200, {})
+    session.cache.contains.return_value = False
+    client = DVLAClient("key", pool_size=2)
+    active: list[int] = [0]
+    peak: list[int] = [0]
+    lock = threading.Lock()
+
+    def slow_post(**_kwargs: Any) -> MagicMock:
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.02)
+        with lock:
+            active[0] -= 1
+        return _make_response(200, {})
+
+    session.post.side_effect = slow_post
+    results = client.lookup_many([f"AB{n}CDE" for n in range(10, 16)])
+    assert len(results) == 6
+    assert peak[0] == 2
+
+
+def test_api_client_base_lookup_many_uses_lookup(mocker: MockerFixture) -> None:
+    client = APIClient()
+    mocker.patch.object(client, "lookup", side_effect=lambda reg, priority: {"reg": reg, "priority": priority})
+    assert client.lookup_many(["ab1", "AB1", "CD2"]) == {
+        "AB1": {"reg": "AB1", "priority": LookupPriority.BACKGROUND},
+        "CD2": {"reg": "CD2", "priority": LookupPriority.BACKGROUND},
+    }
+
+
+def test_lookup_targets_only_lookup_enabled(tmp_path: Path) -> None:
+    watchlist = tmp_path / "watch.csv"
+    watchlist.write_text("id,lookup\nGH78JKL,true\nJK90LMN,\n")
+    targets = TargetSettings(
+        groups=[
+            TargetGroup(name="dangerous", lookup=True, members=["AB12CDE"]),  # type: ignore[list-item]
+            TargetGroup(name="known", members=["CD34EFG", {"id": "EF56GHJ", "lookup": True}]),  # type: ignore[list-item]
+            TargetGroup(name="watch", file=watchlist),
+        ]
+    )
+    assert lookup_targets(compile_targets("plate", targets).ids) == ["AB12CDE", "EF56GHJ", "GH78JKL"]
+    assert lookup_targets(None) == []
+
+
+def test_start_dvla_warm_up(mocker: MockerFixture) -> None:
+    api_client = mocker.Mock()
+    targets = compile_targets(
+        "plate",
+        TargetSettings(groups=[TargetGroup(name="dangerous", lookup=True, members=["AB12CDE"])]),  # type: ignore[list-item]
+    ).ids
+    thread = start_dvla_warm_up(api_client, DVLASettings(warm_up=True, warm_up_refresh=True), targets)
+    assert thread is not None
+    thread.join(timeout=5)
+    api_client.warm_up.assert_called_once_with(["AB12CDE"], True)
+    assert start_dvla_warm_up(api_client, DVLASettings(warm_up=False), targets) is None
+    assert start_dvla_warm_up(api_client, DVLASettings(), targets) is None
+    assert start_dvla_warm_up(None, DVLASettings(warm_up=True), targets) is None
+    assert start_dvla_warm_up(api_client, DVLASettings(warm_up=True), TargetStore()) is None
+
+
 def test_init_file_type_no_dir_warns_falls_back(mocker: MockerFixture) -> None:
     """cache_type=FILE but cache_dir=None → file block skipped, warn about non-MEMORY type (line 56)."""
     cls_mock, _ = _mock_session(mocker, 200, {})
@@ -153,6 +326,435 @@ def test_lookup_cached_response_logs_cache_hit(mocker: MockerFixture) -> None:
     assert result["cache"]["cached"] is True
 
 
+def test_lookup_reuses_session_with_timeouts(mocker: MockerFixture) -> None:
+    _, session = _mock_session(mocker, 200, {"registrationNumber": "SP13TST"})
+    client = DVLAClient("key", connect_timeout=2.0, read_timeout=7.0)
+    client.lookup("SP13TST")
+    client.lookup("SP13TST")
+    session.__exit__.assert_not_called()
+    session.close.assert_not_called()
+    assert session.post.call_count == 2
+    assert session.post.call_args.kwargs["timeout"] == (2.0, 7.0)
+
+
+def test_init_passes_pool_size(mocker: MockerFixture) -> None:
+    cls_mock, _ = _mock_session(mocker, 200, {})
+    DVLAClient("key", pool_size=8)
+    _, kwargs = cls_mock.call_args
+    assert kwargs["pool_maxsize"] == 8
+
+
+def test_lookup_stats_track_connection_reuse(mocker: MockerFixture) -> None:
+    _, session = _mock_session(mocker, 200, {"registrationNumber": "SP13TST"})
+    client = DVLAClient("key")
+    client.lookup("SP13TST")
+    client.lookup("SP13TST")
+    session.post.return_value = _make_response(200, {"registrationNumber": "SP13TST"}, from_cache=True)
+    client.lookup("SP13TST")
+    stats = client.stats.as_dict()
+    assert stats["lookups"] == 3
+    assert stats["api_calls"] == 2
+    assert stats["cache_hits"] == 1
+    assert stats["new_connections"] == 1
+    assert stats["reused_connections"] == 1
+    assert stats["mean_api_seconds"] is not None
+
+
+def test_close_closes_session_once(mocker: MockerFixture) -> None:
+    _, session = _mock_session(mocker, 200, {})
+    client = DVLAClient("key")
+    client.close()
+    client.close()
+    session.close.assert_called_once()
+    assert client.lookup("SP13TST")["lookup_fail"] == "missing cache"
+
+
+def test_api_client_base_close_is_noop() -> None:
+    APIClient().close()
+
+
+def test_concurrent_lookups_share_single_request(mocker: MockerFixture) -> None:
+    _, session = _mock_session(mocker, 200, {"registrationNumber": "SP13TST", "make": "FORD"})
+    release = threading.Event()
+    resp = session.post.return_value
+
+    def slow_post(**_kwargs: Any) -> MagicMock:
+        release.wait(5)
+        return resp
+
+    session.post.side_effect = slow_post
+    client = DVLAClient("key")
+    results: list[dict[str, Any]] = []
+    threads = [threading.Thread(target=lambda: results.append(client.lookup("SP13TST"))) for _ in range(5)]
+    for t in threads:
+        t.start()
+    while client.stats.lookups < 5:
+        threading.Event().wait(0.01)
+    threading.Event().wait(0.1)  # let all callers reach the in-flight map
+    release.set()
+    for t in threads:
+        t.join(5)
+    assert session.post.call_count == 1
+    assert len(results) == 5
+    assert all(r["success"] for r in results)
+    assert client.stats.coalesced == 4
+
+
+def test_single_flight_propagates_exception_to_waiters() -> None:
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    errors: list[Exception] = []
+
+    def failing() -> dict[str, Any]:
+        started.set()
+        release.wait(5)
+        raise RuntimeError("boom")
+
+    def call() -> None:
+        try:
+            flight.run("KEY", failing)
+        except RuntimeError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(target=call)
+    follower.start()
+    threading.Event().wait(0.05)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+    assert len(errors) == 2
+    assert len(flight) == 0
+
+
+def test_single_flight_escalates_for_more_urgent_follower() -> None:
+    escalated: list[tuple[str, int]] = []
+    flight = SingleFlight(on_escalate=lambda key, priority: escalated.append((key, priority)))
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow() -> dict[str, Any]:
+        started.set()
+        release.wait(5)
+        return {"success": True}
+
+    leader = threading.Thread(target=lambda: flight.run("KEY", slow, LookupPriority.BACKGROUND))
+    leader.start()
+    started.wait(5)
+    assert flight.priority("KEY", LookupPriority.BACKGROUND) == LookupPriority.BACKGROUND
+    follower = threading.Thread(target=lambda: flight.run("KEY", slow, LookupPriority.LIVE))
+    follower.start()
+    deadline: float = time.monotonic() + 5
+    while not escalated and time.monotonic() < deadline:
+        threading.Event().wait(0.01)
+    assert escalated == [("KEY", LookupPriority.LIVE)]
+    assert flight.priority("KEY", LookupPriority.BACKGROUND) == LookupPriority.LIVE
+    release.set()
+    leader.join(5)
+    follower.join(5)
+    assert flight.priority("KEY", LookupPriority.BACKGROUND) == LookupPriority.BACKGROUND
+
+
+def test_single_flight_sequential_calls_not_shared() -> None:
+    flight = SingleFlight()
+    assert flight.run("KEY", lambda: {"n": 1}) == ({"n": 1}, False)
+    assert flight.run("KEY", lambda: {"n": 2}) == ({"n": 2}, False)
+
+
+def test_not_found_cached_with_negative_ttl(mocker: MockerFixture) -> None:
+    _, session = _mock_session(mocker, 404, {"errors": [{"title": "Vehicle Not Found", "status": "404"}]})
+    client = DVLAClient("key", negative_cache_ttl=3600, error_cache_ttl=60)
+    first = client.lookup("SP13TST")
+    second = client.lookup("sp13tst")
+    assert session.post.call_count == 1
+    assert first["api_status"] == 404
+    assert second["api_status"] == 404
+    assert second["failure_cached"] is True
+    assert client.stats.negative_hits == 1
+
+
+def test_invalid_reg_cached_as_negative() -> None:
+    client = DVLAClient("key", negative_cache_ttl=3600)
+    client.lookup("NOTAVALID!!!REG")
+    result = client.lookup("NOTAVALID!!!REG")
+    assert result["reg_match_fail"] == "GB"
+    assert client.stats.negative_hits == 1
+
+
+def test_transient_error_cached_with_error_ttl(mocker: MockerFixture) -> None:
+    _, session = _mock_session(mocker, 500, {"errors": [{"title": "Internal Server Error"}]})
+    client = DVLAClient("key", negative_cache_ttl=3600, error_cache_ttl=60)
+    client.lookup("SP13TST")
+    client.lookup("SP13TST")
+    assert session.post.call_count == 1
+    assert client.stats.error_hits == 1
+    assert client.stats.negative_hits == 0
+
+
+def test_failures_not_cached_when_ttl_zero(mocker: MockerFixture) -> None:
+    _, session = _mock_session(mocker, 404, {"errors": [{"title": "Vehicle Not Found"}]})
+    client = DVLAClient("key")
+    client.lookup("SP13TST")
+    client.lookup("SP13TST")
+    assert session.post.call_count == 2
+
+
+def test_success_not_failure_cached(mocker: MockerFixture) -> None:
+    _, session = _mock_session(mocker, 200, {"registrationNumber": "SP13TST"})
+    client = DVLAClient("key", negative_cache_ttl=3600, error_cache_ttl=60)
+    client.lookup("SP13TST")
+    client.lookup("SP13TST")
+    assert session.post.call_count == 2
+    assert len(client._failures) == 0
+
+
+def test_failure_cache_expiry_and_bound(mocker: MockerFixture) -> None:
+    clock = mocker.patch("anpr2mqtt.api_client.time.monotonic", return_value=100.0)
+    cache = FailureCache(max_entries=2)
+    cache.put("A", {"n": 1}, ttl=10, negative=True)
+    cache.put("B", {"n": 2}, ttl=10, negative=False)
+    cache.put("C", {"n": 3}, ttl=10, negative=False)
+    assert cache.get("A") is None
+    assert cache.get("B") == ({"n": 2}, False)
+    clock.return_value = 111.0
+    assert cache.get("B") is None
+    assert len(cache) == 1
+
+
+def test_init_stale_while_revalidate(mocker: MockerFixture) -> None:
+    cls_mock, _ = _mock_session(mocker, 200, {})
+    DVLAClient("key", max_stale=3600)
+    assert cls_mock.call_args.kwargs["stale_while_revalidate"] == 3600
+    DVLAClient("key")
+    assert cls_mock.call_args.kwargs["stale_while_revalidate"] is False
+
+
+def test_lookup_stale_response_served_and_counted(mocker: MockerFixture) -> None:
+    resp = _make_response(200, {"registrationNumber": "SP13TST"}, from_cache=True)
+    resp.is_expired = True
+    _, session = _mock_session(mocker, 200, {})
+    session.post.return_value = resp
+    client = DVLAClient("key", max_stale=3600)
+    result = client.lookup("SP13TST")
+    assert result["success"]
+    assert result["cache"]["stale"] is True
+    assert client.stats.stale_hits == 1
+
+
+def test_token_bucket_burst_then_waits(mocker: MockerFixture) -> None:
+    clock = mocker.patch("anpr2mqtt.api_client.time.monotonic", return_value=0.0)
+    bucket = TokenBucket(rate=1.0, burst=2)
+    assert bucket.acquire() == 0.0
+    assert bucket.acquire() == 0.0
+    assert bucket.acquire(timeout=0.0) is None
+    clock.return_value = 1.0
+    assert bucket.acquire(timeout=0.0) == 0.0
+
+
+def test_token_bucket_drain() -> None:
+    bucket = TokenBucket(rate=0.001, burst=3)
+    bucket.drain()
+    assert bucket.acquire(timeout=0.01) is None
+
+
+def _acquire_then_record(
+    bucket: TokenBucket, order: list[str], label: str, priority: int, tag: str | None = None
+) -> threading.Thread:
+    def run() -> None:
+        bucket.acquire(priority, tag=tag)
+        order.append(label)
+
+    return threading.Thread(target=run)
+
+
+def test_token_bucket_serves_higher_priority_first() -> None:
+    bucket = TokenBucket(rate=20.0, burst=1)
+    bucket.acquire()
+    order: list[str] = []
+    background = _acquire_then_record(bucket, order, "background", LookupPriority.BACKGROUND)
+    background.start()
+    threading.Event().wait(0.01)
+    live = _acquire_then_record(bucket, order, "live", LookupPriority.LIVE)
+    live.start()
+    background.join(2)
+    live.join(2)
+    assert order == ["live", "background"]
+
+
+def test_token_bucket_escalate_moves_waiter_up() -> None:
+    bucket = TokenBucket(rate=10.0, burst=1)
+    bucket.acquire()
+    order: list[str] = []
+    first = _acquire_then_record(bucket, order, "first", LookupPriority.BACKGROUND)
+    first.start()
+    threading.Event().wait(0.01)
+    joined = _acquire_then_record(bucket, order, "joined", LookupPriority.BACKGROUND, tag="SP13TST")
+    joined.start()
+    threading.Event().wait(0.01)
+    bucket.escalate("SP13TST", LookupPriority.LIVE)
+    bucket.escalate("UNKNOWN", LookupPriority.LIVE)
+    first.join(2)
+    joined.join(2)
+    assert order == ["joined", "first"]
+
+
+def test_throttled_session_calls_hook_only_on_network_send(mocker: MockerFixture) -> None:
+    send = mocker.patch("niquests.Session.send", return_value=MagicMock(status_code=200))
+    session = _CachedSession(cache_name="test", backend="memory", allowable_methods=["GET", "POST"])
+    hook = MagicMock()
+    session.before_send = hook
+    session.post("https://example.invalid/x", json={"a": 1})
+    hook.assert_called_once()
+    send.assert_called_once()
+    session.close()
+
+
+def test_lookup_rate_limited_times_out(mocker: MockerFixture) -> None:
+    _mock_session(mocker, 200, {})
+    client = DVLAClient("key", rate_limit=0.001, rate_burst=1, max_queue_wait=0.01)
+    assert client.rate_limiter is not None
+    client._throttle()
+    with pytest.raises(RateLimitedError):
+        client._throttle()
+    assert client.stats.throttle_timeouts == 1
+
+
+def test_lookup_uses_caller_priority(mocker: MockerFixture) -> None:
+    _, session = _mock_session(mocker, 200, {"registrationNumber": "SP13TST"})
+    client = DVLAClient("key", rate_limit=10, rate_burst=5)
+    assert session.before_send == client._throttle
+    seen: list[LookupPriority] = []
+    assert client.rate_limiter is not None
+
+    def acquire(priority: LookupPriority, **_kwargs: Any) -> float:
+        seen.append(priority)
+        return 0.0
+
+    def post(**_kwargs: Any) -> MagicMock:
+        client._throttle()
+        return session.post.return_value
+
+    mocker.patch.object(client.rate_limiter, "acquire", side_effect=acquire)
+    session.post.side_effect = post
+    client.lookup("SP13TST", priority=LookupPriority.BACKGROUND)
+    client.lookup("SP13TSU")
+    client._throttle()
+    assert seen == [LookupPriority.BACKGROUND, LookupPriority.LIVE, LookupPriority.BACKGROUND]
+
+
+def test_lookup_429_counted_and_drains_bucket(mocker: MockerFixture) -> None:
+    _mock_session(mocker, 429, {"errors": [{"title": "Too Many Requests"}]})
+    client = DVLAClient("key", rate_limit=10, rate_burst=5)
+    drain = mocker.patch.object(TokenBucket, "drain")
+    result = client.lookup("SP13TST")
+    assert result["api_status"] == 429
+    assert client.stats.http_429 == 1
+    drain.assert_called_once()
+
+
+def test_circuit_breaker_opens_and_probes(mocker: MockerFixture) -> None:
+    clock = mocker.patch("anpr2mqtt.api_client.time.monotonic", return_value=0.0)
+    breaker = CircuitBreaker(threshold=2, reset_timeout=30)
+    assert breaker.allow()
+    assert not breaker.record(False)
+    assert breaker.record(False)
+    states = [breaker.state]
+    assert not breaker.allow()
+    clock.return_value = 31.0
+    assert breaker.allow()
+    states.append(breaker.state)
+    assert not breaker.allow()  # only one probe at a time
+    assert breaker.record(False)
+    states.append(breaker.state)
+    clock.return_value = 62.0
+    assert breaker.allow()
+    breaker.record(True)
+    states.append(breaker.state)
+    assert states == [CircuitState.OPEN, CircuitState.HALF_OPEN, CircuitState.OPEN, CircuitState.CLOSED]
+    assert breaker.failures == 0
+
+
+def test_circuit_breaker_inconclusive_probe_releases() -> None:
+    breaker = CircuitBreaker(threshold=1, reset_timeout=0)
+    breaker.record(False)
+    assert breaker.allow()
+    breaker.record(None)
+    assert breaker.state == CircuitState.HALF_OPEN
+    assert breaker.allow()
+
+
+def test_lookup_short_circuits_after_failures(mocker: MockerFixture) -> None:
+    _, session = _mock_session(mocker, 503, {"errors": [{"title": "Service Unavailable"}]})
+    client = DVLAClient("key", breaker_threshold=2, breaker_reset=60)
+    client.lookup("SP13TST")
+    client.lookup("SP13TSU")
+    assert client.stats.circuit_trips == 1
+    session.post.return_value = _make_response(504, {}, from_cache=True)
+    result = client.lookup("SP13TSV")
+    assert result["circuit_open"]
+    assert session.post.call_args.kwargs["only_if_cached"] is True
+    assert client.stats.short_circuited == 1
+    assert lookup_failure_reason(result) == "circuit_open"
+
+
+def test_lookup_circuit_open_still_uses_cache(mocker: MockerFixture) -> None:
+    _, session = _mock_session(mocker, 200, {"registrationNumber": "SP13TST"})
+    client = DVLAClient("key", breaker_threshold=1, breaker_reset=60)
+    assert client.breaker is not None
+    client.breaker.record(False)
+    session.post.return_value = _make_response(200, {"registrationNumber": "SP13TST"}, from_cache=True)
+    assert client.lookup("SP13TST")["success"]
+
+
+def test_cached_answers_not_recorded_by_breaker(mocker: MockerFixture) -> None:
+    failure = _make_response(503, {"errors": [{"title": "Service Unavailable"}]})
+    cached = _make_response(200, {"registrationNumber": "SP13TST"}, from_cache=True)
+    _, session = _mock_session(mocker, 503, {})
+    session.post.side_effect = [failure, cached, failure, cached]
+    client = DVLAClient("key", breaker_threshold=2, breaker_reset=0)
+    assert client.breaker is not None
+    client.lookup("SP13TSA")
+    client.lookup("SP13TSB")
+    client.lookup("SP13TSC")
+    assert client.stats.circuit_trips == 1
+
+    # half open probe answered from cache leaves the circuit half open, ready for another probe
+    client.lookup("SP13TSD")
+    assert session.post.call_args.kwargs["only_if_cached"] is False
+    assert client.breaker.state == CircuitState.HALF_OPEN
+    assert client.breaker.allow()
+
+
+def test_cached_session_no_revalidation_while_only_if_cached(mocker: MockerFixture) -> None:
+    thread_cls = mocker.patch("requests_cache.session.Thread")
+    session = _CachedSession(backend="memory")
+    session._resend_async(MagicMock(), MagicMock(_only_if_cached=True), None)
+    thread_cls.assert_not_called()
+    session._resend_async(MagicMock(), MagicMock(_only_if_cached=False), None)
+    thread_cls.assert_called_once()
+    session._resend_async(MagicMock(), MagicMock(spec=[]), None)
+    assert thread_cls.call_count == 2
+    session.close()
+
+
+def test_not_found_does_not_trip_breaker(mocker: MockerFixture) -> None:
+    _mock_session(mocker, 404, {"errors": [{"title": "Vehicle Not Found"}]})
+    client = DVLAClient("key", breaker_threshold=1)
+    client.lookup("SP13TST")
+    assert client.breaker is not None
+    assert client.breaker.state == CircuitState.CLOSED
+
+
+def test_lookup_failure_reason() -> None:
+    assert lookup_failure_reason({"success": True}) is None
+    assert lookup_failure_reason({"api_status": 404, "success": False}) == "api_status:404"
+    assert lookup_failure_reason({"api_exception": "timeout", "success": False}) == "api_exception"
+    assert lookup_failure_reason({"success": False}) == "unknown"
+
+
 @pytest.mark.skip
 def test_real_api_call() -> None:
     """Require a UAT env key; exercises the default (in-memory) cache."""
@@ -47,6 +47,7 @@ def _make_mock_settings(protocol: str = "3.11", events: list[EventSettings] | No
 
     settings = Mock()
     settings.log_level = "INFO"
+    settings.config_reload = False
     settings.targets = {}
     settings.mqtt.protocol = protocol
     settings.mqtt.host = "localhost"
@@ -54,6 +55,12 @@ def _make_mock_settings(protocol: str = "3.11", events: list[EventSettings] | No
     settings.mqtt.user = "test"
     settings.mqtt.password = "pass"  # noqa: S105
     settings.mqtt.topic_root = "anpr2mqtt"
+    settings.mqtt.spool_max_bytes = 0
+    settings.mqtt.spool_images = False
+    settings.mqtt.spool_drain_rate = 20.0
+    settings.mqtt.separate_image_client = False
+    settings.mqtt.topic_alias_maximum = 10
+    settings.mqtt.image_expiry = 0
     settings.homeassistant = HomeAssistantSettings(status_topic="homeassistant/status")
     settings.frigate = FrigateSettings()
     settings.events = events if events is not None else []
@@ -85,6 +92,44 @@ def test_main_loop_minimal() -> None:
     mock_observer.stop.assert_called_once()
 
 
+def test_main_loop_closes_shared_api_client() -> None:
+    mock_settings = _make_mock_settings()
+    mock_observer = Mock()
+    mock_observer.is_alive.return_value = False
+    api_client = Mock()
+
+    with (
+        patch("anpr2mqtt.app.Settings", return_value=mock_settings),
+        patch("anpr2mqtt.app.mqtt.Client", return_value=Mock()),
+        patch("anpr2mqtt.app.Observer", return_value=mock_observer),
+        patch("anpr2mqtt.app.build_dvla_client", return_value=api_client),
+    ):
+        main_loop()
+
+    api_client.close.assert_called_once()
+
+
+def test_main_loop_separate_image_client() -> None:
+    mock_settings = _make_mock_settings()
+    mock_settings.mqtt.separate_image_client = True
+    state_client = Mock()
+    image_client = Mock()
+    mock_observer = Mock()
+    mock_observer.is_alive.return_value = False
+
+    with (
+        patch("anpr2mqtt.app.Settings", return_value=mock_settings),
+        patch("anpr2mqtt.app.mqtt.Client", side_effect=[state_client, image_client]) as client_class,
+        patch("anpr2mqtt.app.Observer", return_value=mock_observer),
+    ):
+        main_loop()
+
+    assert [c.kwargs["client_id"] for c in client_class.call_args_list] == ["anpr2mqtt", "anpr2mqtt-images"]
+    assert image_client.on_disconnect is state_client.on_disconnect
+    image_client.connect.assert_called_once()
+    image_client.disconnect.assert_called_once()
+
+
 def test_main_loop_mqtt_protocol_31() -> None:
     mock_settings = _make_mock_settings(protocol="3.1")
     mock_client = Mock()
@@ -366,3 +411,61 @@ def test_main_loop_event_handler_setup_exception(tmp_path: Path) -> None:
         main_loop()  # should not raise; exception is caught per-event
 
     mock_observer.start.assert_called_once()
+
+
+def test_main_loop_poll_watch_mode(tmp_path: Path) -> None:
+    from anpr2mqtt.settings import DVLASettings, ImageSettings, OCRSettings, TrackerSettings, WatchMode
+
+    event_config = EventSettings(
+        camera="cam1", event="anpr", watch_path=tmp_path, watch_mode=WatchMode.POLL, poll_interval=0.01, ocr_field_ids=[]
+    )
+    mock_settings = _make_mock_settings(events=[event_config])
+    mock_settings.ocr = OCRSettings()
+    mock_settings.image = ImageSettings()
+    mock_settings.dvla = DVLASettings()
+    mock_settings.tracker = TrackerSettings(data_dir=tmp_path)
+    mock_observer = Mock()
+    mock_observer.is_alive.return_value = False
+
+    with (
+        patch("anpr2mqtt.app.Settings", return_value=mock_settings),
+        patch("anpr2mqtt.app.mqtt.Client", return_value=Mock()),
+        patch("anpr2mqtt.app.Observer", return_value=mock_observer),
+        patch("anpr2mqtt.app.ScandirPollingObserver") as polling_cls,
+    ):
+        main_loop()
+
+    mock_observer.schedule.assert_not_called()
+    polling_cls.assert_called_once_with(timeout=0.01)
+    polling_cls.return_value.schedule.assert_called_once()
+    polling_cls.return_value.start.assert_called_once()
+    polling_cls.return_value.stop.assert_called_once()
+
+
+def test_main_loop_compiles_targets_once_per_type(tmp_path: Path) -> None:
+    from anpr2mqtt.settings import DVLASettings, ImageSettings, OCRSettings, TargetSettings, TrackerSettings
+    from anpr2mqtt.tracker import compile_targets
+
+    events = [EventSettings(camera=camera, event="anpr", watch_path=tmp_path, ocr_field_ids=[]) for camera in ("gate", "drive")]
+    mock_settings = _make_mock_settings(events=events)
+    mock_settings.targets = {"plate": TargetSettings(groups=[TargetGroup(name="known", members=[Target(id="AB12CDE")])])}
+    mock_settings.ocr = OCRSettings()
+    mock_settings.image = ImageSettings()
+    mock_settings.dvla = DVLASettings()
+    mock_settings.tracker = TrackerSettings(data_dir=tmp_path)
+    mock_observer = Mock()
+    mock_observer.is_alive.return_value = False
+
+    with (
+        patch("anpr2mqtt.app.Settings", return_value=mock_settings),
+        patch("anpr2mqtt.app.mqtt.Client", return_value=Mock()),
+        patch("anpr2mqtt.app.Observer", return_value=mock_observer),
+        patch("anpr2mqtt.app.compile_targets", side_effect=compile_targets) as compile_mock,
+        patch("anpr2mqtt.app.EventHandler") as handler_cls,
+    ):
+        main_loop()
+
+    compile_mock.assert_called_once_with("plate", mock_settings.targets["plate"])
+    gate, drive = (c.kwargs["tracker"] for c in handler_cls.call_args_list)
+    assert gate is not drive
+    assert gate.ids is drive.ids
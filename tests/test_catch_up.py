@@ -0,0 +1,146 @@
+import datetime as dt
+import os
+import shutil
+import time
+from pathlib import Path
+from unittest.mock import Mock
+
+from anpr2mqtt.catch_up import BacklogScanner, HighWaterMark, scan_backlog
+from anpr2mqtt.event_handler import EventHandler
+from anpr2mqtt.settings import EventSettings
+
+PATTERN = EventSettings().image_name_re
+MARK = dt.datetime(2025, 6, 2, 10, 0, tzinfo=dt.UTC)
+
+
+def _image(directory: Path, stamp: str, target: str, content: bytes = b"jpeg") -> Path:
+    directory.mkdir(parents=True, exist_ok=True)
+    path: Path = directory / f"{stamp}_{target}_VEHICLE_DETECTION.jpg"
+    path.write_bytes(content)
+    return path
+
+
+def test_scan_backlog_oldest_first_after_mark(tmp_path: Path) -> None:
+    _image(tmp_path, "20250602103000000", "NEWER")
+    _image(tmp_path, "20250602102000000", "OLDER")
+    _image(tmp_path, "20250602090000000", "BEFOREMARK")
+    _image(tmp_path, "20250602104000000", "EMPTY", content=b"")
+    _image(tmp_path / "sub", "20250602101500000", "NESTED")
+    (tmp_path / "notes.txt").write_text("not an image")
+
+    found = scan_backlog(tmp_path, PATTERN, recursive=False, after=MARK, before=time.time() + 60)
+    assert [f.path.name.split("_")[1] for f in found] == ["OLDER", "NEWER"]
+    assert found[0].size == 4
+
+    found = scan_backlog(tmp_path, PATTERN, recursive=True, after=MARK, before=time.time() + 60)
+    assert [f.path.name.split("_")[1] for f in found] == ["NESTED", "OLDER", "NEWER"]
+
+
+def test_scan_backlog_leaves_files_after_cutoff_to_watchdog(tmp_path: Path) -> None:
+    live: Path = _image(tmp_path, "20250602103000000", "LIVE")
+    cutoff: float = time.time()
+    os.utime(live, (cutoff + 5, cutoff + 5))
+    assert scan_backlog(tmp_path, PATTERN, recursive=False, after=MARK, before=cutoff) == []
+    assert scan_backlog(tmp_path / "missing", PATTERN, recursive=False, after=MARK, before=cutoff) == []
+
+
+def test_high_water_mark_persists_and_defers_live_events(tmp_path: Path) -> None:
+    path: Path = tmp_path / "catch_up" / "anpr_driveway.json"
+    mark = HighWaterMark(path)
+    assert mark.value is None
+    mark.advance(MARK)
+    assert HighWaterMark(path).value == MARK
+
+    mark.hold()
+    mark.advance(MARK + dt.timedelta(hours=2))
+    mark.advance(MARK + dt.timedelta(hours=1), backlog=True)
+    assert HighWaterMark(path).value == MARK + dt.timedelta(hours=1)
+    mark.release()
+    assert HighWaterMark(path).value == MARK + dt.timedelta(hours=2)
+    mark.advance(MARK)
+    assert mark.value == MARK + dt.timedelta(hours=2)
+
+
+def test_scanner_first_run_only_sets_mark(tmp_path: Path) -> None:
+    _image(tmp_path, "20250602103000000", "OLD")
+    handler = Mock(event_config=EventSettings(watch_path=tmp_path))
+    mark = HighWaterMark(tmp_path / "mark.json")
+
+    BacklogScanner(handler, mark, rate=0).run()
+    handler.process_file.assert_not_called()
+    assert mark.value is not None
+
+
+def test_scanner_processes_backlog_in_order(tmp_path: Path) -> None:
+    second: Path = _image(tmp_path, "20250602103000000", "SECOND")
+    first: Path = _image(tmp_path, "20250602102000000", "FIRST")
+    handler = Mock(event_config=EventSettings(watch_path=tmp_path))
+    mark = HighWaterMark(tmp_path / "mark.json")
+    mark.advance(MARK)
+
+    scanner = BacklogScanner(handler, mark, rate=0, cutoff=time.time() + 60)
+    scanner.run()
+    assert [c.args[0] for c in handler.process_file.call_args_list] == [first, second]
+    assert all(c.kwargs["backlog"] for c in handler.process_file.call_args_list)
+    assert scanner.processed == 2
+
+
+def test_scanner_stopped_mid_backlog_keeps_mark_at_last_processed(tmp_path: Path) -> None:
+    _image(tmp_path, "20250602102000000", "FIRST")
+    _image(tmp_path, "20250602103000000", "SECOND")
+    handler = Mock(event_config=EventSettings(watch_path=tmp_path))
+    mark = HighWaterMark(tmp_path / "mark.json")
+    mark.advance(MARK)
+    scanner = BacklogScanner(handler, mark, rate=0, cutoff=time.time() + 60)
+    first = MARK + dt.timedelta(minutes=20)
+
+    def process_file(*_args: object, **_kwargs: object) -> None:
+        mark.advance(first, backlog=True)
+        # a live event arrives, then the service is stopped
+        mark.advance(MARK + dt.timedelta(hours=2))
+        scanner.stop()
+
+    handler.process_file.side_effect = process_file
+    scanner.run()
+    assert scanner.processed == 1
+    assert HighWaterMark(tmp_path / "mark.json").value == first
+    mark.advance(MARK + dt.timedelta(hours=3))
+    assert mark.value == first
+
+
+def test_scanner_takes_mark_before_live_events(tmp_path: Path) -> None:
+    missed: Path = _image(tmp_path, "20250602102000000", "MISSED")
+    handler = Mock(event_config=EventSettings(watch_path=tmp_path))
+    mark = HighWaterMark(tmp_path / "mark.json")
+    mark.advance(MARK)
+    scanner = BacklogScanner(handler, mark, rate=0, cutoff=time.time() + 60)
+    # a live event handled before the scanner thread gets going
+    mark.advance(MARK + dt.timedelta(hours=2))
+    assert mark.value == MARK
+
+    scanner.run()
+    assert [c.args[0] for c in handler.process_file.call_args_list] == [missed]
+    assert mark.value == MARK + dt.timedelta(hours=2)
+
+
+def test_scanner_stop_waits_for_thread(tmp_path: Path) -> None:
+    _image(tmp_path, "20250602102000000", "FIRST")
+    _image(tmp_path, "20250602103000000", "SECOND")
+    handler = Mock(event_config=EventSettings(watch_path=tmp_path))
+    mark = HighWaterMark(tmp_path / "mark.json")
+    mark.advance(MARK)
+    scanner = BacklogScanner(handler, mark, rate=0.1, cutoff=time.time() + 60)
+    scanner.start()
+    scanner.stop(timeout=5)
+    assert scanner._thread is not None
+    assert not scanner._thread.is_alive()
+    assert scanner.processed <= 1
+
+
+def test_process_file_advances_mark(event_handler: EventHandler, tmp_path: Path) -> None:
+    image: Path = tmp_path / "20250602103045407_B4DM3N_VEHICLE_DETECTION.jpg"
+    shutil.copy("fixtures/20250602103045407_B4DM3N_VEHICLE_DETECTION.jpg", image)
+    event_handler.high_water = HighWaterMark(tmp_path / "mark.json")
+
+    event_handler.process_file(image, size=image.stat().st_size, backlog=True)
+    assert event_handler.high_water.value == dt.datetime(2025, 6, 2, 10, 30, 45, 407, tzinfo=dt.UTC)
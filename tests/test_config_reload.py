@@ -0,0 +1,116 @@
+import os
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+from watchdog.events import FileModifiedEvent
+
+from anpr2mqtt.config_reload import ConfigReloader, ReloadScope
+from anpr2mqtt.settings import EventSettings, MQTTSettings, Settings, Target, TargetGroup, TargetSettings, TrackerSettings
+from anpr2mqtt.tracker import Tracker
+
+
+def _settings(*groups: TargetGroup) -> Settings:
+    return Settings.model_construct(
+        targets={"plate": TargetSettings(groups=list(groups))},
+        mqtt=MQTTSettings.model_validate({"user": "u", "pass": "p", "topic_root": "anpr2mqtt"}),
+    )
+
+
+def _reloader(tmp_path: Path, settings: Settings, new: Settings) -> tuple[ConfigReloader, Tracker, Mock]:
+    tracker = Tracker("plate", TrackerSettings(data_dir=tmp_path), target_config=settings.targets["plate"])
+    publisher = Mock()
+    reloader = ConfigReloader(
+        tmp_path / "anpr2mqtt.yaml",
+        settings,
+        publisher,
+        [ReloadScope(tracker, EventSettings(event="anpr", target_type="plate"))],
+        loader=lambda: new,
+        scheduler=Mock(),
+    )
+    return reloader, tracker, publisher
+
+
+def test_reload_swaps_changed_targets(tmp_path: Path) -> None:
+    old = _settings(TargetGroup(name="known", entity_id="family", members=[Target(id="AB12CDE")]))
+    new = _settings(
+        TargetGroup(name="known", entity_id="visitors", members=[Target(id="AB12CDE"), Target(id="CD34EFG")]),
+    )
+    reloader, tracker, publisher = _reloader(tmp_path, old, new)
+
+    assert reloader.reload()
+    assert tracker.find("CD34EFG").target.group == "known"
+    assert tracker.target_config is new.targets["plate"]
+    publisher.publish_target_sensors.assert_called_once()
+    assert publisher.publish_target_sensors.call_args.kwargs["state_for"] == {"visitors"}
+    publisher.remove_target_sensor_discovery.assert_called_once_with("family")
+
+
+def test_reload_skips_unchanged_targets(tmp_path: Path) -> None:
+    old = _settings(TargetGroup(name="known", members=[Target(id="AB12CDE")]))
+    new = _settings(TargetGroup(name="known", members=[Target(id="AB12CDE")]))
+    reloader, tracker, publisher = _reloader(tmp_path, old, new)
+    compiled = tracker._compiled
+
+    assert reloader.reload()
+    assert tracker._compiled is compiled
+    publisher.publish_target_sensors.assert_not_called()
+
+
+def test_reload_after_target_file_edit(tmp_path: Path) -> None:
+    watchlist: Path = tmp_path / "watch.csv"
+    watchlist.write_text("id\nAB12CDE\n")
+    old = _settings(TargetGroup(name="watch", file=watchlist))
+    reloader, tracker, _ = _reloader(tmp_path, old, old)
+    watchlist.write_text("id\nAB12CDE\nCD34EFG\n")
+    os.utime(watchlist, (1, 1))
+
+    assert reloader.reload()
+    assert "CD34EFG" in tracker.ids
+
+
+def test_invalid_config_keeps_current_targets(tmp_path: Path) -> None:
+    old = _settings(TargetGroup(name="known", members=[Target(id="AB12CDE")]))
+    reloader, tracker, _ = _reloader(tmp_path, old, old)
+    reloader.loader = Mock(side_effect=ValueError("bad yaml"))
+
+    assert not reloader.reload()
+    assert reloader.failures == 1
+    assert "AB12CDE" in tracker.ids
+
+
+def test_unreadable_target_file_keeps_current_targets(tmp_path: Path) -> None:
+    old = _settings(TargetGroup(name="known", members=[Target(id="AB12CDE")]))
+    new = _settings(
+        TargetGroup(name="known", members=[Target(id="CD34EFG")]), TargetGroup(name="watch", file=tmp_path / "missing.csv")
+    )
+    reloader, tracker, publisher = _reloader(tmp_path, old, new)
+    compiled = tracker._compiled
+
+    assert not reloader.reload()
+    assert reloader.failures == 1
+    assert tracker._compiled is compiled
+    assert reloader.settings is old
+    publisher.publish_target_sensors.assert_not_called()
+
+
+def test_restart_warning_compares_with_startup_settings(tmp_path: Path) -> None:
+    old = _settings(TargetGroup(name="known", members=[Target(id="AB12CDE")]))
+    changed = old.model_copy(update={"log_level": "DEBUG"})
+    reloader, _, _ = _reloader(tmp_path, old, changed)
+    with patch("anpr2mqtt.config_reload.log") as log:
+        assert reloader.reload()
+        # still differs from what the process started with, so still needs a restart
+        assert reloader.reload()
+    assert log.warning.call_count == 2
+
+
+def test_only_config_file_events_schedule_reload(tmp_path: Path) -> None:
+    reloader, _, _ = _reloader(tmp_path, _settings(), _settings())
+    scheduler: Mock = reloader._scheduler  # type: ignore[assignment]
+
+    reloader.on_any_event(FileModifiedEvent(str(tmp_path / "other.yaml")))
+    scheduler.call_later.assert_not_called()
+    reloader.on_any_event(FileModifiedEvent(str(tmp_path / "anpr2mqtt.yaml")))
+    scheduler.call_later.assert_called_once()
+    reloader.on_any_event(FileModifiedEvent(str(tmp_path / "anpr2mqtt.yaml")))
+    scheduler.reschedule.assert_called_once()
@@ -1,7 +1,9 @@
 import datetime as dt
 import json
 import re
+import threading
 from pathlib import Path
+from typing import cast
 from unittest.mock import ANY, Mock, patch
 
 from PIL import Image
@@ -9,6 +11,7 @@ from pytest_mock import MockerFixture
 
 from anpr2mqtt.const import ImageInfo
 from anpr2mqtt.event_handler import EventHandler, examine_file, process_image, scan_ocr_fields
+from anpr2mqtt.handler_common import AutoclearTimer, Scheduler
 from anpr2mqtt.settings import (
     AutoClearSettings,
     DimensionSettings,
@@ -68,29 +71,27 @@ def test_eventhandler_copes_with_malformed_reg_plate_event(event_handler: EventH
     event.event_type = "closed"
     event.is_directory = False
     event_handler.on_closed(event)
-    event_handler.publisher.client.publish.assert_called_once_with(  # type: ignore[attr-defined]
-        "test/topic",
-        payload=json.dumps(
-            {
-                "target": None,
-                "target_type": "plate",
-                "description": "Unknown vehicle",
-                "plate": None,
-                "event": "unit_testing",
-                "camera": "test_cam",
-                "area": None,
-                "live_url": None,
-                "reg_info": None,
-                "history": None,
-                "vehicle_direction": "Unknown",
-                "event_image_url": "http://127.0.0.1/images/2024110312013232013_P99JHG_VEHICLE_DETECTION.jpeg",
-                "file_path": "fixtures/2024110312013232013_P99JHG_VEHICLE_DETECTION.jpeg",
-                "source": "filesystem",
-            }
-        ),
-        qos=0,
-        retain=True,
-    )
+    publish = cast("Mock", event_handler.publisher.client.publish)
+    publish.assert_called_once()
+    assert publish.call_args.args == ("test/topic",)
+    assert publish.call_args.kwargs["qos"] == 0
+    assert publish.call_args.kwargs["retain"] is True
+    assert json.loads(publish.call_args.kwargs["payload"]) == {
+        "target": None,
+        "target_type": "plate",
+        "description": "Unknown vehicle",
+        "plate": None,
+        "event": "unit_testing",
+        "camera": "test_cam",
+        "area": None,
+        "live_url": None,
+        "reg_info": None,
+        "history": None,
+        "vehicle_direction": "Unknown",
+        "event_image_url": "http://127.0.0.1/images/2024110312013232013_P99JHG_VEHICLE_DETECTION.jpeg",
+        "file_path": "fixtures/2024110312013232013_P99JHG_VEHICLE_DETECTION.jpeg",
+        "source": "filesystem",
+    }
 
 
 def test_process_image(tmp_path: Path) -> None:
@@ -451,39 +452,91 @@ def test_do_autoclear_image_clears_image_topic(event_handler: EventHandler) -> N
 
 def test_schedule_autoclear_disabled_starts_no_timer(event_handler: EventHandler) -> None:
     _set_autoclear(event_handler, enabled=False)
-    with patch("anpr2mqtt.handler_common.threading.Timer") as mock_timer_cls:
-        event_handler._schedule_autoclear()
-    mock_timer_cls.assert_not_called()
+    event_handler._autoclear_timer._scheduler = Mock()
+    event_handler._schedule_autoclear()
+    event_handler._autoclear_timer._scheduler.call_later.assert_not_called()
 
 
 def test_schedule_autoclear_starts_timer_with_correct_delay(event_handler: EventHandler) -> None:
     _set_autoclear(event_handler, enabled=True, post_event=120)
-    with patch("anpr2mqtt.handler_common.threading.Timer") as mock_timer_cls:
-        mock_timer = Mock()
-        mock_timer_cls.return_value = mock_timer
-        event_handler._schedule_autoclear()
-    delay = mock_timer_cls.call_args.args[0]
+    event_handler._autoclear_timer._scheduler = Mock()
+    event_handler._schedule_autoclear()
+    delay = event_handler._autoclear_timer._scheduler.call_later.call_args.args[0]
     assert delay == 120
-    mock_timer.start.assert_called_once()
 
 
-def test_schedule_autoclear_cancels_previous_timer(event_handler: EventHandler) -> None:
+def test_schedule_autoclear_reschedules_previous_timer(event_handler: EventHandler) -> None:
     _set_autoclear(event_handler, enabled=True, post_event=60)
-    first_timer = Mock()
-    event_handler._autoclear_timer._timer = first_timer
-    with patch("anpr2mqtt.handler_common.threading.Timer") as mock_timer_cls:
-        mock_timer_cls.return_value = Mock()
-        event_handler._schedule_autoclear()
-    first_timer.cancel.assert_called_once()
+    scheduler = Scheduler()
+    event_handler._autoclear_timer._scheduler = scheduler
+    event_handler._schedule_autoclear()
+    first = event_handler._autoclear_timer._handle
+    event_handler._schedule_autoclear()
+    assert event_handler._autoclear_timer._handle is first
+    assert len(scheduler) == 1
+    scheduler.stop()
 
 
-def test_schedule_autoclear_timer_is_daemon(event_handler: EventHandler) -> None:
+def test_schedule_autoclear_shares_one_scheduler_thread(event_handler: EventHandler) -> None:
     _set_autoclear(event_handler, enabled=True, post_event=10)
-    with patch("anpr2mqtt.handler_common.threading.Timer") as mock_timer_cls:
-        mock_timer = Mock()
-        mock_timer_cls.return_value = mock_timer
-        event_handler._schedule_autoclear()
-    assert mock_timer.daemon is True
+    other = AutoclearTimer()
+    event_handler._schedule_autoclear()
+    other.schedule(event_handler.event_config, Mock(), "other")
+    assert event_handler._autoclear_timer._scheduler is other._scheduler
+    event_handler._autoclear_timer.cancel()
+    other.cancel()
+
+
+def test_scheduler_fires_in_deadline_order() -> None:
+    scheduler = Scheduler()
+    fired: list[str] = []
+    done = threading.Event()
+
+    def late() -> None:
+        fired.append("late")
+        done.set()
+
+    scheduler.call_later(0.04, late, "late")
+    scheduler.call_later(0.01, lambda: fired.append("early"), "early")
+    assert done.wait(2)
+    assert fired == ["early", "late"]
+    assert scheduler._thread is not None
+    assert scheduler._thread.daemon
+    scheduler.stop()
+    assert scheduler.fired == 2
+
+
+def test_scheduler_cancel_and_reschedule() -> None:
+    scheduler = Scheduler()
+    fired: list[str] = []
+    done = threading.Event()
+    cancelled = scheduler.call_later(0.01, lambda: fired.append("cancelled"))
+    cancelled.cancel()
+    later = scheduler.call_later(0.01, lambda: fired.append("pushed back"))
+    scheduler.reschedule(later, 0.05)
+
+    def brought_forward() -> None:
+        fired.append("brought forward")
+        done.set()
+
+    sooner = scheduler.call_later(1, brought_forward)
+    scheduler.reschedule(sooner, 0.1)
+    assert done.wait(2)
+    assert fired == ["pushed back", "brought forward"]
+    assert len(scheduler) == 0
+    # fired handles are scheduled afresh
+    assert scheduler.reschedule(sooner, 10) is not sooner
+    scheduler.stop()
+
+
+def test_scheduler_survives_callback_error() -> None:
+    scheduler = Scheduler()
+    done = threading.Event()
+    scheduler.call_later(0, Mock(side_effect=RuntimeError("boom")))
+    scheduler.call_later(0.01, done.set)
+    assert done.wait(2)
+    scheduler.stop()
+    assert scheduler.errors == 1
 
 
 def test_on_closed_schedules_autoclear(event_handler: EventHandler) -> None:
@@ -1,23 +1,23 @@
 import json
 from io import BytesIO
 from typing import Any
-from unittest.mock import Mock, patch
+from unittest.mock import ANY, Mock, patch
 
 import pytest
 from PIL import Image
 
-from anpr2mqtt.frigate_handler import FrigateHandler
+from anpr2mqtt.frigate_handler import FrigateHandler, SnapshotCache, crop_to_box, select_crop_box
 from anpr2mqtt.settings import (
     TARGET_TYPE_PLATE,
     AutoClearSettings,
     CameraSettings,
+    CropMode,
     DVLASettings,
     EventSettings,
     FrigateSettings,
     ImageSettings,
-    Target,
 )
-from anpr2mqtt.tracker import Sighting, Tracker
+from anpr2mqtt.tracker import Sighting, TargetRecord, Tracker
 
 
 def _make_jpeg_bytes() -> bytes:
@@ -67,7 +67,7 @@ def mock_publisher() -> Mock:
 def mock_tracker() -> Mock:
     tracker = Mock(spec=Tracker)
     tracker.find.return_value = Sighting(
-        target=Target(id="AB12CDE", target_type=TARGET_TYPE_PLATE),
+        target=TargetRecord(id="AB12CDE", target_type=TARGET_TYPE_PLATE),
     )
     tracker.record.return_value = {"previous_sightings": 0}
     tracker.tracker_config = Mock()
@@ -122,7 +122,7 @@ def test_on_snapshot_message_caches_bytes(handler: FrigateHandler) -> None:
     msg.topic = "frigate/driveway/snapshot"
     msg.payload = b"\xff\xd8\xff"
     handler._on_snapshot_message(Mock(), None, msg)
-    assert handler._snapshot_cache["driveway"] == b"\xff\xd8\xff"
+    assert handler._snapshot_cache._entries["driveway"][0] == b"\xff\xd8\xff"
 
 
 def test_on_snapshot_message_ignores_empty_payload(handler: FrigateHandler) -> None:
@@ -138,16 +138,16 @@ def test_on_snapshot_message_short_topic_ignored(handler: FrigateHandler) -> Non
     msg.topic = "frigate/snapshot"
     msg.payload = b"data"
     handler._on_snapshot_message(Mock(), None, msg)
-    assert handler._snapshot_cache == {}
+    assert len(handler._snapshot_cache) == 0
 
 
 def test_on_snapshot_message_overwrites_stale_cache(handler: FrigateHandler) -> None:
-    handler._snapshot_cache["driveway"] = b"old"
+    handler._snapshot_cache.put("driveway", b"old")
     msg = Mock()
     msg.topic = "frigate/driveway/snapshot"
     msg.payload = b"new"
     handler._on_snapshot_message(Mock(), None, msg)
-    assert handler._snapshot_cache["driveway"] == b"new"
+    assert handler._snapshot_cache._entries["driveway"][0] == b"new"
 
 
 # --- _on_event_message ---
@@ -252,6 +252,23 @@ def test_process_event_publishes_image_when_available(handler: FrigateHandler, m
     assert args[0] == "anpr2mqtt/anpr/driveway/image"
 
 
+def test_process_event_crops_image_to_plate_box(handler: FrigateHandler, mock_publisher: Mock) -> None:
+    handler.frigate_settings = FrigateSettings(crop=CropMode.PLATE, crop_margin=0.0, min_score=0.70)
+    img = Image.new("RGB", (100, 100))
+    after = {"box": [10, 10, 90, 90], "current_attributes": [{"label": "license_plate", "box": [40, 60, 60, 70]}]}
+    with patch.object(handler, "_get_event_image", return_value=img), patch.object(handler, "_schedule_autoclear"):
+        handler._process_event("frigate/events", _make_payload(after=after))
+    published = mock_publisher.post_image_message.call_args[0][1]
+    assert published.size == (20, 10)
+
+
+def test_process_event_crop_none_publishes_full_image(handler: FrigateHandler, mock_publisher: Mock) -> None:
+    img = Image.new("RGB", (100, 100))
+    with patch.object(handler, "_get_event_image", return_value=img), patch.object(handler, "_schedule_autoclear"):
+        handler._process_event("frigate/events", _make_payload(after={"box": [10, 10, 90, 90]}))
+    assert mock_publisher.post_image_message.call_args[0][1] is img
+
+
 def test_process_event_no_image_skips_image_publish(handler: FrigateHandler, mock_publisher: Mock) -> None:
     with patch.object(handler, "_get_event_image", return_value=None), patch.object(handler, "_schedule_autoclear"):
         handler._process_event("frigate/events", _make_payload())
@@ -278,7 +295,7 @@ def test_process_event_ignored_plate_skips_state_publish(
     handler: FrigateHandler, mock_publisher: Mock, mock_tracker: Mock
 ) -> None:
     mock_tracker.find.return_value = Sighting(
-        target=Target(id="AB12CDE", target_type=TARGET_TYPE_PLATE),
+        target=TargetRecord(id="AB12CDE", target_type=TARGET_TYPE_PLATE),
         ignore=True,
     )
     with patch.object(handler, "_get_event_image", return_value=None), patch.object(handler, "_schedule_autoclear"):
@@ -290,7 +307,7 @@ def test_process_event_target_with_entity_id_publishes_target_state(
     handler: FrigateHandler, mock_publisher: Mock, mock_tracker: Mock
 ) -> None:
     mock_tracker.find.return_value = Sighting(
-        target=Target(id="AB12CDE", target_type=TARGET_TYPE_PLATE, entity_id="my_car"),
+        target=TargetRecord(id="AB12CDE", target_type=TARGET_TYPE_PLATE, entity_id="my_car"),
     )
     with patch.object(handler, "_get_event_image", return_value=None), patch.object(handler, "_schedule_autoclear"):
         handler._process_event("frigate/events", _make_payload())
@@ -303,7 +320,7 @@ def test_process_event_no_entity_id_skips_target_state(
     handler: FrigateHandler, mock_publisher: Mock, mock_tracker: Mock
 ) -> None:
     mock_tracker.find.return_value = Sighting(
-        target=Target(id="AB12CDE", target_type=TARGET_TYPE_PLATE, entity_id=None),
+        target=TargetRecord(id="AB12CDE", target_type=TARGET_TYPE_PLATE, entity_id=None),
     )
     with patch.object(handler, "_get_event_image", return_value=None), patch.object(handler, "_schedule_autoclear"):
         handler._process_event("frigate/events", _make_payload())
@@ -364,14 +381,14 @@ def test_process_event_id_set_pruned_when_oversized(mock_tracker: Mock) -> None:
 
 
 def test_get_event_image_uses_cached_mqtt_snapshot(handler: FrigateHandler) -> None:
-    handler._snapshot_cache["driveway"] = _make_jpeg_bytes()
+    handler._snapshot_cache.put("driveway", _make_jpeg_bytes())
     img = handler._get_event_image("evt-123", "driveway")
     assert img is not None
 
 
 def test_get_event_image_uses_api_snapshot_first(handler: FrigateHandler) -> None:
     handler.frigate_settings = FrigateSettings(url="http://frigate:5000", min_score=0.70)
-    handler._snapshot_cache["driveway"] = _make_jpeg_bytes()  # also have stale MQTT cache
+    handler._snapshot_cache.put("driveway", _make_jpeg_bytes())  # also have stale MQTT cache
     expected = Image.new("RGB", (10, 10))
     with patch.object(handler, "_fetch_api_snapshot", return_value=expected) as mock_fetch:
         img = handler._get_event_image("evt-123", "driveway")
@@ -387,12 +404,121 @@ def test_get_event_image_returns_none_when_no_snapshot_no_url(handler: FrigateHa
 
 def test_get_event_image_falls_back_to_mqtt_when_api_fails(handler: FrigateHandler) -> None:
     handler.frigate_settings = FrigateSettings(url="http://frigate:5000", min_score=0.70)
-    handler._snapshot_cache["driveway"] = _make_jpeg_bytes()
+    handler._snapshot_cache.put("driveway", _make_jpeg_bytes())
     with patch.object(handler, "_fetch_api_snapshot", return_value=None):
         img = handler._get_event_image("evt-123", "driveway")
     assert img is not None  # MQTT cache used as fallback
 
 
+def test_get_event_image_reuses_decoded_snapshot(handler: FrigateHandler) -> None:
+    handler._snapshot_cache.put("driveway", _make_jpeg_bytes())
+    first = handler._get_event_image("evt-1", "driveway")
+    second = handler._get_event_image("evt-2", "driveway")
+    assert first is second
+    assert handler._snapshot_cache.stats()["hits"] == 1
+
+
+def test_get_event_image_undecodable_snapshot_returns_none(handler: FrigateHandler) -> None:
+    handler._snapshot_cache.put("driveway", b"not a jpeg")
+    assert handler._get_event_image("evt-123", "driveway") is None
+
+
+# --- SnapshotCache ---
+
+
+def test_snapshot_cache_decodes_again_after_new_bytes() -> None:
+    cache = SnapshotCache(max_bytes=1024 * 1024)
+    cache.put("driveway", _make_jpeg_bytes())
+    first = cache.image("driveway")
+    buf = BytesIO()
+    Image.new("RGB", (10, 10), color="blue").save(buf, "JPEG")
+    cache.put("driveway", buf.getvalue())
+    assert cache.image("driveway") is not first
+    assert cache.stats()["misses"] == 2
+
+
+def test_snapshot_cache_same_bytes_keeps_decoded_image() -> None:
+    cache = SnapshotCache(max_bytes=1024 * 1024)
+    jpeg = _make_jpeg_bytes()
+    cache.put("driveway", jpeg)
+    first = cache.image("driveway")
+    cache.put("driveway", jpeg)
+    assert cache.image("driveway") is first
+
+
+def test_snapshot_cache_evicts_least_recently_used() -> None:
+    cache = SnapshotCache(max_bytes=25)
+    cache.put("a", b"x" * 10)
+    cache.put("b", b"x" * 10)
+    cache.put("a", b"x" * 10)  # same snapshot again, now most recently used
+    cache.put("c", b"x" * 10)
+    assert "a" in cache
+    assert "b" not in cache
+    assert "c" in cache
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["bytes"] == 20
+
+
+def test_snapshot_cache_counts_decoded_size() -> None:
+    cache = SnapshotCache(max_bytes=1024 * 1024)
+    jpeg = _make_jpeg_bytes()
+    cache.put("driveway", jpeg)
+    cache.image("driveway")
+    assert cache.stats()["bytes"] == len(jpeg) + 10 * 10 * 3
+
+
+def test_snapshot_cache_oversized_entry_evicts_others_but_is_kept() -> None:
+    cache = SnapshotCache(max_bytes=len(_make_jpeg_bytes()) + 50)
+    cache.put("garage", b"x" * 10)
+    cache.put("driveway", _make_jpeg_bytes())
+    assert cache.image("driveway") is not None
+    assert "garage" not in cache
+    assert "driveway" in cache
+
+
+def test_close_logs_snapshot_cache_stats(handler: FrigateHandler) -> None:
+    handler._snapshot_cache.image("driveway")
+    with patch("anpr2mqtt.frigate_handler.log") as log:
+        handler.close()
+    assert log.info.call_args.args[1]["misses"] == 1
+
+
+def test_snapshot_cache_miss() -> None:
+    cache = SnapshotCache(max_bytes=100)
+    assert cache.image("driveway") is None
+    assert cache.stats()["misses"] == 1
+
+
+# --- crop ---
+
+
+def test_select_crop_box_plate_falls_back_to_vehicle() -> None:
+    assert select_crop_box({"box": [1, 2, 3, 4]}, CropMode.PLATE) == [1.0, 2.0, 3.0, 4.0]
+
+
+def test_select_crop_box_vehicle_ignores_plate() -> None:
+    after = {"box": [1, 2, 3, 4], "current_attributes": [{"label": "license_plate", "box": [5, 6, 7, 8]}]}
+    assert select_crop_box(after, CropMode.VEHICLE) == [1.0, 2.0, 3.0, 4.0]
+
+
+def test_select_crop_box_none_mode_or_missing_box() -> None:
+    assert select_crop_box({"box": [1, 2, 3, 4]}, CropMode.NONE) is None
+    assert select_crop_box({}, CropMode.VEHICLE) is None
+    assert select_crop_box({"box": ["a", 2, 3, 4]}, CropMode.VEHICLE) is None
+
+
+def test_crop_to_box_adds_margin_clipped_to_image() -> None:
+    img = Image.new("RGB", (100, 100))
+    assert crop_to_box(img, [40, 40, 60, 60], 0.5).size == (40, 40)
+    assert crop_to_box(img, [0, 0, 100, 100], 0.5).size == (100, 100)
+
+
+def test_crop_to_box_outside_image_returns_original() -> None:
+    img = Image.new("RGB", (100, 100))
+    assert crop_to_box(img, [200, 200, 300, 300], 0.1) is img
+    assert crop_to_box(img, [60, 60, 40, 40], 0.1) is img
+
+
 # --- _fetch_api_snapshot ---
 
 
@@ -478,23 +604,24 @@ def test_schedule_autoclear_creates_timer(handler: FrigateHandler) -> None:
     event_cfg = EventSettings(camera="driveway", event="anpr", autoclear=AutoClearSettings(enabled=True, post_event=60))
     handler._schedule_autoclear("driveway", event_cfg, "s", "i")
     assert "driveway" in handler._autoclear_timers
-    timer = handler._autoclear_timers["driveway"]._timer
+    timer = handler._autoclear_timers["driveway"]._handle
     assert timer is not None
+    assert timer.active
     timer.cancel()
 
 
-def test_schedule_autoclear_cancels_existing_timer(handler: FrigateHandler) -> None:
+def test_schedule_autoclear_reschedules_existing_timer(handler: FrigateHandler) -> None:
     from anpr2mqtt.handler_common import AutoclearTimer
 
-    old_inner = Mock()
-    existing = AutoclearTimer()
-    existing._timer = old_inner
+    scheduler = Mock()
+    existing = AutoclearTimer(scheduler)
+    old_inner = Mock(active=True)
+    existing._handle = old_inner
     handler._autoclear_timers["driveway"] = existing
     event_cfg = EventSettings(camera="driveway", event="anpr", autoclear=AutoClearSettings(enabled=True, post_event=60))
-    with patch("anpr2mqtt.handler_common.threading.Timer") as mock_timer_cls:
-        mock_timer_cls.return_value = Mock()
-        handler._schedule_autoclear("driveway", event_cfg, "s", "i")
-    old_inner.cancel.assert_called_once()
+    handler._schedule_autoclear("driveway", event_cfg, "s", "i")
+    scheduler.reschedule.assert_called_once_with(old_inner, 60, ANY)
+    scheduler.call_later.assert_not_called()
 
 
 # --- _do_autoclear ---
@@ -614,7 +741,7 @@ def test_process_event_updates_good_plate_cache_on_dvla_success(handler: Frigate
     mock_api.lookup.return_value = {"success": True, "plate": {"make": "Ford"}, "description": "Ford Focus"}
     handler.api_client = mock_api
     mock_tracker.find.return_value = Sighting(
-        target=Target(id="AB12CDE", target_type="plate", lookup=True),
+        target=TargetRecord(id="AB12CDE", target_type="plate", lookup=True),
     )
     with patch.object(handler, "_get_event_image", return_value=None), patch.object(handler, "_schedule_autoclear"):
         handler._process_event("frigate/events", _make_payload())
@@ -624,6 +751,20 @@ def test_process_event_updates_good_plate_cache_on_dvla_success(handler: Frigate
     assert (dt.datetime.now(dt.UTC) - ts).total_seconds() < 5
 
 
+def test_process_event_publishes_lookup_failure_reason(
+    handler: FrigateHandler, mock_tracker: Mock, mock_publisher: Mock
+) -> None:
+    mock_api = Mock()
+    mock_api.lookup.return_value = {"circuit_open": "API unavailable", "plate": {}, "success": False}
+    handler.api_client = mock_api
+    mock_tracker.find.return_value = Sighting(target=TargetRecord(id="AB12CDE", target_type="plate", lookup=True))
+    with patch.object(handler, "_get_event_image", return_value=None), patch.object(handler, "_schedule_autoclear"):
+        handler._process_event("frigate/events", _make_payload())
+    kwargs = mock_publisher.post_state_message.call_args.kwargs
+    assert kwargs["reg_info"] is None
+    assert kwargs["reg_info_error"] == "circuit_open"
+
+
 # --- duplicate visit suppression ---
 
 
@@ -639,3 +780,17 @@ def test_process_event_new_visit_publishes(handler: FrigateHandler, mock_publish
     with patch.object(handler, "_get_event_image", return_value=None), patch.object(handler, "_schedule_autoclear"):
         handler._process_event("frigate/events", _make_payload(event_id="new-visit-test"))
     mock_publisher.post_state_message.assert_called_once()
+
+
+def test_shared_api_client_used(mock_mqtt: Mock, mock_publisher: Mock, camera_config: dict[str, Any]) -> None:
+    api_client = Mock()
+    h = FrigateHandler(
+        mqtt_client=mock_mqtt,
+        frigate_settings=FrigateSettings(enabled=True),
+        publisher=mock_publisher,
+        image_settings=ImageSettings(),
+        dvla_settings=DVLASettings(api_key="key"),
+        camera_configs=camera_config,
+        api_client=api_client,
+    )
+    assert h.api_client is api_client
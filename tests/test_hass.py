@@ -1,27 +1,47 @@
 import datetime as dt
 import json
+from io import BytesIO
 from pathlib import Path
 from typing import Any
 from unittest.mock import Mock, patch
 
 import pytest
+from paho.mqtt.enums import MQTTErrorCode
 from PIL import Image
 
 from anpr2mqtt.const import ImageInfo
-from anpr2mqtt.hass import HomeAssistantPublisher
-from anpr2mqtt.settings import CameraSettings, EventSettings, HomeAssistantSettings, Target
-from anpr2mqtt.tracker import Sighting
+from anpr2mqtt.hass import HomeAssistantPublisher, with_trigger
+from anpr2mqtt.outbound import OutboundQueue, TopicClass
+from anpr2mqtt.settings import (
+    CameraSettings,
+    EventSettings,
+    HomeAssistantSettings,
+    ImageBackpressure,
+    TargetGroup,
+    TargetSettings,
+    TrackerSettings,
+)
+from anpr2mqtt.tracker import Sighting, TargetRecord, Tracker
 
 
 @pytest.fixture
 def mock_client() -> Mock:
-    return Mock()
+    client = Mock()
+    client.publish.return_value = Mock(rc=MQTTErrorCode.MQTT_ERR_SUCCESS, mid=None)
+    return client
+
+
+def _immediate_scheduler() -> Mock:
+    """Scheduler running callbacks straight away, recording requested delays"""
+    scheduler = Mock()
+    scheduler.call_later.side_effect = lambda _delay, callback, _label="": callback() or Mock()
+    return scheduler
 
 
 @pytest.fixture
 def publisher(mock_client: Mock) -> HomeAssistantPublisher:
     cfg = HomeAssistantSettings(status_topic="homeassistant/status")
-    return HomeAssistantPublisher(mock_client, cfg)
+    return HomeAssistantPublisher(mock_client, cfg, scheduler=_immediate_scheduler())
 
 
 @pytest.fixture
@@ -79,15 +99,16 @@ def test_on_message_offline(publisher: HomeAssistantPublisher, mock_client: Mock
 
 
 def test_on_message_online_after_offline(publisher: HomeAssistantPublisher, mock_client: Mock) -> None:
-    publisher.republish["test/topic"] = {"payload": "123"}
+    publisher.republish["test/topic"] = b'{"payload":"123"}'
     publisher.hass_online = False
     msg = Mock()
     msg.topic = "homeassistant/status"
     msg.payload = b"online"
-    with patch("time.sleep"), patch("random.randint", return_value=1):
-        publisher.on_message(mock_client, None, msg)
+    publisher.on_message(mock_client, None, msg)
     assert publisher.hass_online is True
-    mock_client.publish.assert_called_once_with("test/topic", '{"payload": "123", "trigger": "homeassistant/status_online"}')
+    mock_client.publish.assert_called_once_with(
+        "test/topic", payload=b'{"payload":"123","trigger":"homeassistant/status_online"}', qos=0, retain=False
+    )
 
 
 def test_on_message_online_first_time(publisher: HomeAssistantPublisher, mock_client: Mock) -> None:
@@ -129,13 +150,69 @@ def test_republish_discovery_empty(publisher: HomeAssistantPublisher, mock_clien
 
 
 def test_republish_discovery_with_entries(publisher: HomeAssistantPublisher, mock_client: Mock) -> None:
-    publisher.republish["topic/a"] = {"payload": "A"}
-    publisher.republish["topic/b"] = {"payload": "B"}
-    with patch("time.sleep"), patch("random.randint", return_value=1):
-        publisher.republish_discovery("entries")
+    publisher.republish["topic/a"] = b'{"payload":"A"}'
+    publisher.republish["topic/b"] = b'{"payload":"B"}'
+    run = publisher.republish_discovery("entries")
     assert mock_client.publish.call_count == 2
-    mock_client.publish.assert_any_call("topic/a", '{"payload": "A", "trigger": "entries"}')
-    mock_client.publish.assert_any_call("topic/b", '{"payload": "B", "trigger": "entries"}')
+    mock_client.publish.assert_any_call("topic/a", payload=b'{"payload":"A","trigger":"entries"}', qos=0, retain=False)
+    mock_client.publish.assert_any_call("topic/b", payload=b'{"payload":"B","trigger":"entries"}', qos=0, retain=False)
+    assert run.progress()["sent"] == 2
+    assert run.progress()["total"] == 2
+    assert not run.active
+
+
+def test_republish_discovery_does_not_block(mock_client: Mock) -> None:
+    scheduler = Mock()
+    publisher = HomeAssistantPublisher(
+        mock_client, HomeAssistantSettings(republish_jitter=5, republish_rate=4), scheduler=scheduler
+    )
+    publisher.republish["topic/a"] = b'{"payload":"A"}'
+    publisher.republish["topic/b"] = b'{"payload":"B"}'
+    with patch("time.sleep") as mock_sleep:
+        run = publisher.republish_discovery("paced")
+    mock_sleep.assert_not_called()
+    mock_client.publish.assert_not_called()
+    assert 0 <= scheduler.call_later.call_args.args[0] <= 5
+    # each send schedules the next, paced by the rate limit with jitter
+    scheduler.call_later.call_args.args[1]()
+    assert mock_client.publish.call_count == 1
+    assert 0.125 <= scheduler.call_later.call_args.args[0] <= 0.375
+    assert run.active
+    assert run.progress()["sent"] == 1
+
+
+def test_republish_continues_after_publish_failure(publisher: HomeAssistantPublisher, mock_client: Mock) -> None:
+    publisher.republish["topic/a"] = b'{"payload":"A"}'
+    publisher.republish["topic/b"] = b'{"payload":"B"}'
+    mock_client.publish.side_effect = [Exception("socket closed"), Mock(rc=MQTTErrorCode.MQTT_ERR_SUCCESS, mid=1)]
+    run = publisher.republish_discovery("failure")
+    assert mock_client.publish.call_count == 2
+    assert run.progress()["sent"] == 2
+    assert run.finished is not None
+
+
+def test_republish_cancelled_when_hass_offline(mock_client: Mock) -> None:
+    scheduler = Mock()
+    publisher = HomeAssistantPublisher(mock_client, HomeAssistantSettings(), scheduler=scheduler)
+    publisher.republish["topic/a"] = b'{"payload":"A"}'
+    run = publisher.republish_discovery("online")
+    msg = Mock(topic="homeassistant/status", payload=b"offline")
+    publisher.on_message(mock_client, None, msg)
+    assert run.cancelled
+    assert run.handle is not None
+    run.handle.cancel.assert_called_once()  # type: ignore[attr-defined]
+    scheduler.call_later.call_args.args[1]()
+    mock_client.publish.assert_not_called()
+
+
+def test_republish_restart_replaces_run_in_progress(mock_client: Mock) -> None:
+    publisher = HomeAssistantPublisher(mock_client, HomeAssistantSettings(), scheduler=Mock())
+    publisher.republish["topic/a"] = b'{"payload":"A"}'
+    first = publisher.republish_discovery("first")
+    second = publisher.republish_discovery("second")
+    assert first.cancelled
+    assert publisher.republish_run is second
+    assert second.active
 
 
 # --- publish_sensor_discovery ---
@@ -182,6 +259,49 @@ def test_publish_sensor_discovery_stored_for_republish(
     assert "homeassistant/sensor/cam1/anpr/config" in publisher.republish
 
 
+def test_publish_discovery_skips_unchanged_content(
+    publisher: HomeAssistantPublisher, mock_client: Mock, event_config: EventSettings, camera: CameraSettings
+) -> None:
+    publisher.publish_sensor_discovery("anpr2mqtt/anpr/cam1/state", event_config, camera)
+    publisher.publish_sensor_discovery("anpr2mqtt/anpr/cam1/state", event_config, camera)
+    assert mock_client.publish.call_count == 1
+    assert publisher.discovery_skipped == 1
+    publisher.publish_sensor_discovery("anpr2mqtt/anpr/cam1/other", event_config, camera)
+    assert mock_client.publish.call_count == 2
+    assert (
+        json.loads(publisher.republish["homeassistant/sensor/cam1/anpr/config"])["state_topic"] == "anpr2mqtt/anpr/cam1/other"
+    )
+
+
+def test_publish_discovery_retried_after_failure(
+    publisher: HomeAssistantPublisher, mock_client: Mock, event_config: EventSettings, camera: CameraSettings
+) -> None:
+    mock_client.publish.return_value = Mock(rc=MQTTErrorCode.MQTT_ERR_NO_CONN, mid=None)
+    publisher.publish_sensor_discovery("anpr2mqtt/anpr/cam1/state", event_config, camera)
+    mock_client.publish.return_value = Mock(rc=MQTTErrorCode.MQTT_ERR_SUCCESS, mid=None)
+    publisher.publish_sensor_discovery("anpr2mqtt/anpr/cam1/state", event_config, camera)
+    assert mock_client.publish.call_count == 2
+    assert publisher.discovery_skipped == 0
+    publisher.publish_sensor_discovery("anpr2mqtt/anpr/cam1/state", event_config, camera)
+    assert publisher.discovery_skipped == 1
+
+
+def test_republish_does_not_alter_stored_payload(
+    publisher: HomeAssistantPublisher, mock_client: Mock, event_config: EventSettings, camera: CameraSettings
+) -> None:
+    publisher.publish_sensor_discovery("anpr2mqtt/anpr/cam1/state", event_config, camera)
+    stored = publisher.republish["homeassistant/sensor/cam1/anpr/config"]
+    publisher.republish_discovery("restart")
+    republished = json.loads(mock_client.publish.call_args.kwargs["payload"])
+    assert republished == {**json.loads(stored), "trigger": "restart"}
+    assert publisher.republish["homeassistant/sensor/cam1/anpr/config"] is stored
+
+
+def test_with_trigger() -> None:
+    assert json.loads(with_trigger(b'{"a": {"b": 1}}', 'x"y')) == {"a": {"b": 1}, "trigger": 'x"y'}
+    assert with_trigger(b"{}", "t") == b'{"trigger":"t"}'
+
+
 # --- publish_image_discovery ---
 
 
@@ -276,7 +396,7 @@ def test_post_state_message_with_all_fields(
     )
     publisher.post_state_message(
         "anpr2mqtt/anpr/cam1/state",
-        sighting=Sighting(target=Target(id="AB12CDE", target_type="plate", group="known")),
+        sighting=Sighting(target=TargetRecord(id="AB12CDE", target_type="plate", group="known")),
         event_config=event_config,
         camera=camera_with_area,
         extra_info={"vehicle_direction": "Forward"},
@@ -319,6 +439,17 @@ def test_post_state_message_with_error(
     assert payload["error"] == "Something broke"
 
 
+def test_post_state_message_with_reg_info_error(
+    publisher: HomeAssistantPublisher, mock_client: Mock, event_config: EventSettings, camera: CameraSettings
+) -> None:
+    publisher.post_state_message(
+        "topic", sighting=None, event_config=event_config, camera=camera, reg_info_error="circuit_open"
+    )
+    payload = json.loads(mock_client.publish.call_args.kwargs["payload"])
+    assert payload["reg_info"] is None
+    assert payload["reg_info_error"] == "circuit_open"
+
+
 def test_post_state_message_publish_exception(
     publisher: HomeAssistantPublisher, mock_client: Mock, event_config: EventSettings, camera: CameraSettings
 ) -> None:
@@ -327,6 +458,90 @@ def test_post_state_message_publish_exception(
     publisher.post_state_message("topic", sighting=None, event_config=event_config, camera=camera)
 
 
+# --- state coalescing ---
+
+
+def _coalescing_publisher(mock_client: Mock, window: float = 0.5) -> tuple[HomeAssistantPublisher, Mock]:
+    scheduler = Mock()
+    cfg = HomeAssistantSettings(state_coalesce_window=window)
+    return HomeAssistantPublisher(mock_client, cfg, scheduler=scheduler), scheduler
+
+
+def test_state_published_immediately_when_coalescing_disabled(publisher: HomeAssistantPublisher, mock_client: Mock) -> None:
+    publisher.publish_target_state("targets/a", {"last_seen": "1"})
+    mock_client.publish.assert_called_once_with("targets/a", payload=b'{"last_seen":"1"}', qos=0, retain=True)
+
+
+def test_state_coalesced_last_value_wins(mock_client: Mock) -> None:
+    publisher, scheduler = _coalescing_publisher(mock_client)
+    publisher.publish_target_state("targets/a", {"last_seen": "1"})
+    publisher.publish_target_state("targets/a", {"last_seen": "2"})
+    publisher.publish_target_state("targets/a", {"last_seen": "3"})
+    mock_client.publish.assert_not_called()
+    scheduler.call_later.assert_called_once()
+    assert scheduler.call_later.call_args.args[0] == 0.5
+    scheduler.call_later.call_args.args[1]()
+    mock_client.publish.assert_called_once_with("targets/a", payload=b'{"last_seen":"3"}', qos=0, retain=True)
+    assert publisher.state_coalescer.dropped == 2
+
+
+def test_state_coalesced_per_topic(mock_client: Mock) -> None:
+    publisher, scheduler = _coalescing_publisher(mock_client)
+    publisher.publish_target_state("targets/a", {"last_seen": "1"})
+    publisher.publish_target_state("targets/b", {"last_seen": "2"})
+    assert scheduler.call_later.call_count == 2
+    publisher.state_coalescer.flush_all()
+    assert mock_client.publish.call_count == 2
+    assert publisher.state_coalescer.dropped == 0
+
+
+def test_state_for_dangerous_target_published_immediately(mock_client: Mock) -> None:
+    publisher, scheduler = _coalescing_publisher(mock_client)
+    publisher.publish_target_state("targets/a", {"last_seen": "1"})
+    pending_handle = scheduler.call_later.return_value
+    publisher.publish_target_state("targets/a", {"last_seen": "2"}, target=TargetRecord(id="X1", group="dangerous"))
+    mock_client.publish.assert_called_once_with("targets/a", payload=b'{"last_seen":"2"}', qos=0, retain=True)
+    pending_handle.cancel.assert_called_once()
+    assert publisher.state_coalescer.dropped == 1
+
+
+def test_state_flush_publishes_before_newer_immediate_state(mock_client: Mock) -> None:
+    publisher, scheduler = _coalescing_publisher(mock_client)
+    coalescer = publisher.state_coalescer
+    publisher.publish_target_state("targets/a", {"last_seen": "1"})
+    flush = scheduler.call_later.call_args.args[1]
+    sent: list[bytes] = []
+
+    def publish(_topic: str, payload: bytes, **_kwargs: Any) -> Mock:
+        # a newer immediate state arriving mid flush waits for the lock, so is published last
+        assert coalescer._lock.locked()
+        sent.append(payload)
+        return Mock(rc=MQTTErrorCode.MQTT_ERR_SUCCESS, mid=None)
+
+    mock_client.publish.side_effect = publish
+    flush()
+    coalescer.publish("targets/a", b'{"last_seen":"2"}', immediate=True)
+    assert sent == [b'{"last_seen":"1"}', b'{"last_seen":"2"}']
+
+
+def test_state_immediate_by_priority(mock_client: Mock) -> None:
+    publisher, _ = _coalescing_publisher(mock_client)
+    assert publisher.is_immediate(TargetRecord(id="X1", priority="critical"))
+    assert not publisher.is_immediate(TargetRecord(id="X1", priority="medium"))
+    assert not publisher.is_immediate(None)
+
+
+def test_post_state_message_coalesced(mock_client: Mock, event_config: EventSettings, camera: CameraSettings) -> None:
+    publisher, scheduler = _coalescing_publisher(mock_client)
+    publisher.post_state_message(
+        "state", sighting=Sighting(TargetRecord(id="AB12CDE")), event_config=event_config, camera=camera
+    )
+    publisher.post_state_message("state", sighting=None, event_config=event_config, camera=camera)
+    mock_client.publish.assert_not_called()
+    scheduler.call_later.call_args.args[1]()
+    assert json.loads(mock_client.publish.call_args.kwargs["payload"])["target"] is None
+
+
 # --- post_image_message ---
 
 
@@ -340,6 +555,34 @@ def test_post_image_message(publisher: HomeAssistantPublisher, mock_client: Mock
     assert len(kwargs["payload"]) > 0
 
 
+def _backlogged_publisher(mock_client: Mock, backpressure: ImageBackpressure, high_water: int) -> HomeAssistantPublisher:
+    outbound = OutboundQueue(mock_client, high_water_bytes=high_water, image_backpressure=backpressure)
+    mock_client.publish.return_value = Mock(rc=MQTTErrorCode.MQTT_ERR_SUCCESS, mid=1)
+    outbound.publish("earlier", b"x" * 1000, TopicClass.IMAGE)
+    mock_client.publish.reset_mock()
+    return HomeAssistantPublisher(mock_client, HomeAssistantSettings(), outbound=outbound)
+
+
+def test_post_image_message_downscaled_over_high_water(mock_client: Mock) -> None:
+    img = Image.effect_noise((200, 200), 100).convert("RGB")
+    full_size = len(HomeAssistantPublisher._encode_image(img, "JPEG"))
+    publisher = _backlogged_publisher(mock_client, ImageBackpressure.DOWNSCALE, 1000 + full_size - 1)
+    publisher.post_image_message("image", img, "JPEG")
+    sent = mock_client.publish.call_args.kwargs["payload"]
+    assert Image.open(BytesIO(sent)).size == (100, 100)
+    assert publisher.outbound.stats.images_downscaled == 1
+
+
+def test_post_image_message_shed_over_high_water(mock_client: Mock) -> None:
+    publisher = _backlogged_publisher(mock_client, ImageBackpressure.SHED, 1000)
+    publisher.post_image_message("image", Image.new("RGB", (10, 10)), "JPEG")
+    mock_client.publish.assert_not_called()
+    assert publisher.outbound.stats.images_shed == 1
+    # clearing the image is never shed
+    publisher.post_image_message("image", None)
+    mock_client.publish.assert_called_once()
+
+
 def test_post_image_message_exception(publisher: HomeAssistantPublisher, mock_client: Mock) -> None:
     mock_client.publish.side_effect = RuntimeError("mqtt down")
     img = Image.new("RGB", (10, 10))
@@ -360,3 +603,23 @@ def test_post_state_message_with_camera_publish_exception(publisher: HomeAssista
     camera = CameraSettings(name="cam")
     # Should not raise
     publisher.post_state_message("test/topic", sighting=None, event_config=event_config, camera=camera)
+
+
+def test_target_sensors_republished_only_when_changed(
+    publisher: HomeAssistantPublisher, mock_client: Mock, event_config: EventSettings, tmp_path: Path
+) -> None:
+    tracker = Tracker(
+        "plate",
+        TrackerSettings(data_dir=tmp_path),
+        target_config=TargetSettings(groups=[TargetGroup(name="known", entity_id="family", members=["AB12CDE"])]),  # type: ignore[list-item]
+    )
+    publisher.publish_target_sensors("anpr2mqtt", event_config, tracker)
+    assert mock_client.publish.call_count == 2  # discovery and state
+    mock_client.publish.reset_mock()
+
+    publisher.publish_target_sensors("anpr2mqtt", event_config, tracker, state_for=set())
+    mock_client.publish.assert_not_called()
+
+    publisher.remove_target_sensor_discovery("family")
+    mock_client.publish.assert_called_once_with("homeassistant/sensor/family/config", payload=b"", qos=0, retain=True)
+    assert "homeassistant/sensor/family/config" not in publisher.republish
@@ -0,0 +1,114 @@
+import json
+from pathlib import Path
+
+from anpr2mqtt.history_import import ImportCheckpoint, ImportJob, import_history, iter_batches, write_histories
+from anpr2mqtt.settings import EventSettings, Target, TargetGroup, TargetSettings, TrackerSettings
+
+PATTERN = EventSettings().image_name_re
+
+
+def _archive(root: Path) -> None:
+    for directory, names in {
+        "2024/01": ["20240101080000000_AB12CDE_VEHICLE_DETECTION.jpg", "20240101090000000_A812CDE_VEHICLE_DETECTION.jpg"],
+        "2024/02": ["20240201080000000_XY99ZZZ_VEHICLE_DETECTION.jpg", "20241399080000000_BAD_VEHICLE_DETECTION.jpg"],
+        "": ["notes.txt", "20231231235959000_AB12CDE_VEHICLE_DETECTION.jpg"],
+    }.items():
+        (root / directory).mkdir(parents=True, exist_ok=True)
+        for name in names:
+            (root / directory / name).touch()
+
+
+def _job(data_dir: Path) -> ImportJob:
+    return ImportJob(
+        target_type="plate",
+        image_name_re=PATTERN,
+        tracker_config=TrackerSettings(data_dir=data_dir),
+        target_config=TargetSettings(
+            groups=[TargetGroup(name="known", members=[Target(id="AB12CDE", correction=["A812CDE"])])]
+        ),
+        region="UK",
+    )
+
+
+def test_import_corrects_and_sorts_sightings(tmp_path: Path) -> None:
+    archive: Path = tmp_path / "ftp"
+    _archive(archive)
+    data_dir: Path = tmp_path / "data"
+
+    stats = import_history(_job(data_dir), archive, batch_size=1)
+    assert stats.files == 6
+    assert stats.images == 4
+    assert stats.skipped == 1
+    assert stats.sightings == 4
+    assert stats.targets == 2
+    assert stats.lookup == {"XY99ZZZ"}
+    assert json.loads((data_dir / "plate" / "AB12CDE.json").read_text()) == [
+        "2023-12-31T23:59:59+00:00",
+        "2024-01-01T08:00:00+00:00",
+        "2024-01-01T09:00:00+00:00",
+    ]
+
+
+def test_import_merges_with_existing_history(tmp_path: Path) -> None:
+    history_dir: Path = tmp_path / "plate"
+    history_dir.mkdir()
+    (history_dir / "AB12CDE.json").write_text(json.dumps(["2024-01-01T08:00:00+00:00", "2024-03-01T08:00:00+00:00"]))
+    added: int = write_histories(history_dir, [("AB12CDE", [1704096000000000, 1704099600000000])], min_gap_seconds=0)
+    assert added == 1
+    assert json.loads((history_dir / "AB12CDE.json").read_text()) == [
+        "2024-01-01T08:00:00+00:00",
+        "2024-01-01T09:00:00+00:00",
+        "2024-03-01T08:00:00+00:00",
+    ]
+    assert write_histories(history_dir, [("AB12CDE", [1704096000000000 + 60_000_000])], min_gap_seconds=300) == 0
+
+
+def test_import_never_drops_existing_sightings(tmp_path: Path) -> None:
+    existing: list[str] = ["2024-01-01T08:00:00+00:00", "2024-01-01T08:01:00+00:00"]
+    (tmp_path / "AB12CDE.json").write_text(json.dumps(existing))
+    before_existing: int = 1704096000000000 - 60_000_000
+    well_after: int = 1704096000000000 + 3600_000_000
+    added: int = write_histories(tmp_path, [("AB12CDE", [before_existing, well_after])], min_gap_seconds=300)
+    # too close to the next existing sighting is skipped, existing sightings closer than the gap are kept
+    assert added == 1
+    assert json.loads((tmp_path / "AB12CDE.json").read_text()) == [*existing, "2024-01-01T09:00:00+00:00"]
+
+
+def test_import_skips_unreadable_history(tmp_path: Path) -> None:
+    (tmp_path / "AB12CDE.json").write_text("not json")
+    added: int = write_histories(tmp_path, [("AB12CDE", [1704096000000000]), ("XY99ZZZ", [1704096000000000])])
+    assert added == 1
+    assert (tmp_path / "AB12CDE.json").read_text() == "not json"
+    assert json.loads((tmp_path / "XY99ZZZ.json").read_text()) == ["2024-01-01T08:00:00+00:00"]
+
+
+def test_checkpoint_resumes_after_last_batch(tmp_path: Path) -> None:
+    archive: Path = tmp_path / "ftp"
+    _archive(archive)
+    checkpoint = ImportCheckpoint(tmp_path / "checkpoint.json", archive)
+    checkpoint.save(("2024", "01"), "20240101080000000_AB12CDE_VEHICLE_DETECTION.jpg")
+
+    resumed = ImportCheckpoint(tmp_path / "checkpoint.json", archive)
+    assert resumed.load()
+    remaining: list[str] = [name for _, batch in iter_batches(archive, True, 10, resumed) for name in batch.names]
+    assert remaining == [
+        "20240101090000000_A812CDE_VEHICLE_DETECTION.jpg",
+        "20240201080000000_XY99ZZZ_VEHICLE_DETECTION.jpg",
+        "20241399080000000_BAD_VEHICLE_DETECTION.jpg",
+    ]
+    assert not ImportCheckpoint(tmp_path / "checkpoint.json", tmp_path).load()
+
+
+def test_import_with_worker_processes(tmp_path: Path) -> None:
+    archive: Path = tmp_path / "ftp"
+    _archive(archive)
+    data_dir: Path = tmp_path / "data"
+    checkpoint = ImportCheckpoint(data_dir / "checkpoint.json", archive)
+
+    stats = import_history(_job(data_dir), archive, workers=2, batch_size=1, checkpoint_every=1, checkpoint=checkpoint)
+    assert stats.sightings == 4
+    assert json.loads((data_dir / "plate" / "XY99ZZZ.json").read_text()) == ["2024-02-01T08:00:00+00:00"]
+    assert checkpoint.parts == ("2024", "02")
+
+    again = import_history(_job(data_dir), archive, checkpoint=checkpoint)
+    assert again.images == 0
@@ -0,0 +1,339 @@
+from pathlib import Path
+from typing import TYPE_CHECKING, cast
+from unittest.mock import Mock
+
+import paho.mqtt.client as mqtt
+from paho.mqtt.enums import CallbackAPIVersion, MQTTErrorCode, MQTTProtocolVersion
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
+
+from anpr2mqtt.outbound import OutboundQueue, Spool, TopicClass, image_content_type
+from anpr2mqtt.settings import MQTTSettings
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+
+def _client() -> Mock:
+    client = Mock()
+    mids = iter(range(1, 1000))
+    client.publish.side_effect = lambda *_args, **_kwargs: Mock(rc=MQTTErrorCode.MQTT_ERR_SUCCESS, mid=next(mids))
+    return client
+
+
+def test_publish_uses_qos_for_topic_class() -> None:
+    client = _client()
+    queue = OutboundQueue(client, qos={TopicClass.STATE: 1, TopicClass.IMAGE: 0, TopicClass.DISCOVERY: 2})
+    queue.publish("state", "{}", TopicClass.STATE)
+    assert client.publish.call_args.kwargs["qos"] == 1
+    queue.publish("config", "{}", TopicClass.DISCOVERY, retain=False)
+    assert client.publish.call_args.kwargs == {"payload": "{}", "qos": 2, "retain": False}
+
+
+def test_inflight_tracked_until_published() -> None:
+    client = _client()
+    queue = OutboundQueue(client)
+    queue.publish("image", b"x" * 100, TopicClass.IMAGE)
+    queue.publish("state", b"y" * 10, TopicClass.STATE)
+    assert queue.inflight == 2
+    assert queue.inflight_bytes == 110
+    queue.on_publish(client, None, 1, None, None)
+    assert queue.inflight_bytes == 10
+    assert queue.stats.completed == 1
+    assert queue.stats.peak_inflight_bytes == 110
+    assert queue.stats.as_dict()["mean_latency_seconds"] is not None
+
+
+def test_completion_before_publish_returns() -> None:
+    client = _client()
+    queue = OutboundQueue(client)
+    queue.on_publish(client, None, 1, None, None)
+    queue.publish("state", b"{}", TopicClass.STATE)
+    assert queue.inflight == 0
+    assert queue.stats.completed == 1
+
+
+def test_images_use_separate_client() -> None:
+    client = _client()
+    image_client = _client()
+    queue = OutboundQueue(client, image_client=image_client)
+    queue.start()
+    queue.publish("image", b"x" * 100, TopicClass.IMAGE)
+    queue.publish("state", b"y" * 10, TopicClass.STATE)
+    image_client.publish.assert_called_once()
+    client.publish.assert_called_once()
+    assert image_client.on_publish == client.on_publish
+    # both clients hand out mid 1, completions must not be confused
+    queue.on_publish(client, None, 1, None, None)
+    assert queue.inflight_bytes == 100
+    queue.on_publish(image_client, None, 1, None, None)
+    assert queue.inflight == 0
+
+
+def _connack(topic_alias_maximum: int) -> Properties:
+    properties = Properties(PacketTypes.CONNACK)
+    properties.TopicAliasMaximum = topic_alias_maximum
+    return properties
+
+
+def test_v3_publish_has_no_properties() -> None:
+    client = _client()
+    OutboundQueue(client).publish("state", b"{}", TopicClass.STATE)
+    assert "properties" not in client.publish.call_args.kwargs
+
+
+def test_v5_topic_aliases() -> None:
+    client = _client()
+    queue = OutboundQueue(client, protocol_v5=True, topic_alias_maximum=10)
+    queue.start()
+    client.on_connect(client, None, None, 0, _connack(1))
+
+    queue.publish("anpr2mqtt/driveway/state", b"{}", TopicClass.STATE)
+    assert client.publish.call_args.args[0] == "anpr2mqtt/driveway/state"
+    assert client.publish.call_args.kwargs["properties"].TopicAlias == 1
+    assert client.publish.call_args.kwargs["properties"].ContentType == "application/json"
+    queue.publish("anpr2mqtt/driveway/state", b"{}", TopicClass.STATE)
+    assert client.publish.call_args.args[0] == ""
+    assert client.publish.call_args.kwargs["properties"].TopicAlias == 1
+    # broker allows only one alias
+    queue.publish("anpr2mqtt/gate/state", b"{}", TopicClass.STATE)
+    assert client.publish.call_args.args[0] == "anpr2mqtt/gate/state"
+    assert not hasattr(client.publish.call_args.kwargs["properties"], "TopicAlias")
+
+    # aliases are forgotten by the broker on reconnect
+    client.on_connect(client, None, None, 0, _connack(1))
+    queue.publish("anpr2mqtt/driveway/state", b"{}", TopicClass.STATE)
+    assert client.publish.call_args.args[0] == "anpr2mqtt/driveway/state"
+
+
+def test_v5_alias_used_alone_only_after_first_publish() -> None:
+    client = _client()
+    queue = OutboundQueue(client, protocol_v5=True, topic_alias_maximum=10)
+    queue.start()
+    client.on_connect(client, None, None, 0, _connack(10))
+    client.publish.side_effect = lambda *_args, **_kwargs: Mock(rc=MQTTErrorCode.MQTT_ERR_NO_CONN, mid=None)
+    queue.publish("state", b"{}", TopicClass.STATE)
+    # first publish with the alias never queued, so the broker doesn't know it yet
+    queue.publish("state", b"{}", TopicClass.STATE)
+    assert client.publish.call_args.args[0] == "state"
+    assert client.publish.call_args.kwargs["properties"].TopicAlias == 1
+    client.publish.side_effect = lambda *_args, **_kwargs: Mock(rc=MQTTErrorCode.MQTT_ERR_SUCCESS, mid=None)
+    queue.publish("state", b"{}", TopicClass.STATE)
+    queue.publish("state", b"{}", TopicClass.STATE)
+    assert client.publish.call_args.args[0] == ""
+
+
+def test_v5_no_aliases_for_qos1_or_discovery() -> None:
+    client = _client()
+    queue = OutboundQueue(client, qos={TopicClass.STATE: 1}, protocol_v5=True, topic_alias_maximum=10)
+    queue.start()
+    client.on_connect(client, None, None, 0, _connack(10))
+    for _ in range(2):
+        queue.publish("state", b"{}", TopicClass.STATE)
+        assert client.publish.call_args.args[0] == "state"
+        queue.publish("config", b"{}", TopicClass.DISCOVERY)
+        assert client.publish.call_args.args[0] == "config"
+        assert not hasattr(client.publish.call_args.kwargs["properties"], "TopicAlias")
+
+
+def test_v5_image_properties() -> None:
+    client = _client()
+    queue = OutboundQueue(client, protocol_v5=True, image_expiry=600)
+    queue.publish("image", b"\xff\xd8\xff\xe0rest", TopicClass.IMAGE)
+    properties: Properties = client.publish.call_args.kwargs["properties"]
+    # set dynamically by paho, so not known to type checkers
+    assert getattr(properties, "ContentType") == "image/jpeg"  # noqa: B009
+    assert getattr(properties, "MessageExpiryInterval") == 600  # noqa: B009
+    assert image_content_type(b"\x89PNG\r\n") == "image/png"
+    assert image_content_type(b"RIFF\x00\x00\x00\x00WEBPVP8") == "image/webp"
+    assert image_content_type(b"????") is None
+
+
+def test_v5_alias_publish_accepted_by_paho() -> None:
+    client = mqtt.Client(callback_api_version=CallbackAPIVersion.VERSION2, protocol=MQTTProtocolVersion.MQTTv5)
+    queue = OutboundQueue(client, protocol_v5=True, topic_alias_maximum=10)
+    queue.start()
+    # the wrapper installed by start(), typed by paho as the optional v2 callback
+    on_connect = cast("Callable[..., None]", client.on_connect)
+    on_connect(client, None, None, 0, _connack(10))
+    queue.publish("state", b"{}", TopicClass.STATE)
+    # not connected, but topic validation has already passed
+    info = queue.publish("state", b"{}", TopicClass.STATE)
+    assert info is not None
+    assert info.rc == MQTTErrorCode.MQTT_ERR_NO_CONN
+
+
+def test_failed_qos0_publish_not_tracked() -> None:
+    client = Mock()
+    client.publish.return_value = Mock(rc=MQTTErrorCode.MQTT_ERR_NO_CONN, mid=1)
+    queue = OutboundQueue(client)
+    queue.publish("state", b"{}", TopicClass.STATE)
+    assert queue.inflight == 0
+    assert queue.stats.failed == 1
+    failed = Mock(rc=MQTTErrorCode.MQTT_ERR_NO_CONN, mid=1)
+    assert not queue.accepted(failed, TopicClass.STATE)
+    assert OutboundQueue(client, qos={TopicClass.STATE: 1}).accepted(failed, TopicClass.STATE)
+    assert queue.accepted(None, TopicClass.STATE)
+
+
+def test_high_water_mark() -> None:
+    client = _client()
+    queue = OutboundQueue(client, high_water_bytes=150)
+    assert queue.has_room(150)
+    queue.publish("image", b"x" * 100, TopicClass.IMAGE)
+    assert queue.has_room(50)
+    assert not queue.has_room(51)
+    assert OutboundQueue(client).has_room(10**9)
+
+
+def test_unacknowledged_messages_expire() -> None:
+    client = _client()
+    queue = OutboundQueue(client, inflight_timeout=0)
+    queue.publish("image", b"x" * 100, TopicClass.IMAGE)
+    assert queue.inflight_bytes == 0
+    assert queue.stats.lost == 1
+
+
+def test_from_settings() -> None:
+    client = Mock()
+    cfg = MQTTSettings.model_validate({"user": "u", "pass": "p", "image_qos": 1, "high_water_bytes": 1024})
+    queue = OutboundQueue.from_settings(client, cfg)
+    assert queue.qos[TopicClass.IMAGE] == 1
+    assert queue.qos[TopicClass.STATE] == 0
+    assert queue.high_water_bytes == 1024
+    queue.start()
+    assert client.on_publish == queue.on_publish
+
+
+def test_spool_round_trip(tmp_path: Path) -> None:
+    spool = Spool(tmp_path, max_bytes=1024 * 1024)
+    spool.append("state/a", '{"target": "AB12CDE"}', TopicClass.STATE, retain=True)
+    spool.append("image/a", None, TopicClass.IMAGE, retain=False)
+    assert len(spool) == 2
+    first, second = spool.peek(10)
+    assert (first.topic, first.payload, first.topic_class, first.retain) == (
+        "state/a",
+        b'{"target": "AB12CDE"}',
+        TopicClass.STATE,
+        True,
+    )
+    assert (second.topic, second.payload, second.retain) == ("image/a", None, False)
+    spool.advance(first)
+    assert [m.topic for m in spool.peek(10)] == ["image/a"]
+    spool.advance(second)
+    assert len(spool) == 0
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_spool_survives_restart(tmp_path: Path) -> None:
+    spool = Spool(tmp_path, max_bytes=1024 * 1024)
+    for n in range(3):
+        spool.append(f"state/{n}", "{}", TopicClass.STATE, retain=True)
+    reopened = Spool(tmp_path, max_bytes=1024 * 1024)
+    assert len(reopened) == 3
+    assert [m.topic for m in reopened.peek(10)] == ["state/0", "state/1", "state/2"]
+
+
+def test_spool_restart_resumes_after_sent_messages(tmp_path: Path) -> None:
+    spool = Spool(tmp_path, max_bytes=1024 * 1024)
+    for n in range(3):
+        spool.append(f"state/{n}", "{}", TopicClass.STATE, retain=True)
+    spool.advance(spool.peek(1)[0])
+    reopened = Spool(tmp_path, max_bytes=1024 * 1024)
+    assert len(reopened) == 2
+    assert [m.topic for m in reopened.peek(10)] == ["state/1", "state/2"]
+
+
+def test_spool_advance_ignores_message_from_evicted_segment(tmp_path: Path) -> None:
+    spool = Spool(tmp_path, max_bytes=400, segment_bytes=100)
+    spool.append("state/00", "x" * 40, TopicClass.STATE, retain=True)
+    sending = spool.peek(1)[0]
+    # oldest segment evicted by appends while the peeked message is being published
+    for n in range(1, 20):
+        spool.append(f"state/{n:02d}", "x" * 40, TopicClass.STATE, retain=True)
+    waiting: int = len(spool)
+    next_topic: str = spool.peek(1)[0].topic
+    spool.advance(sending)
+    assert len(spool) == waiting
+    assert spool.peek(1)[0].topic == next_topic
+
+
+def test_spool_evicts_oldest_segment(tmp_path: Path) -> None:
+    spool = Spool(tmp_path, max_bytes=400, segment_bytes=100)
+    for n in range(20):
+        spool.append(f"state/{n:02d}", "x" * 40, TopicClass.STATE, retain=True)
+    assert spool.size_bytes <= 400
+    assert spool.evicted > 0
+    assert len(spool) == 20 - spool.evicted
+    assert spool.peek(1)[0].topic == f"state/{spool.evicted:02d}"
+
+
+def test_publish_spooled_while_disconnected_then_drained(tmp_path: Path) -> None:
+    client = _client()
+    client.is_connected.return_value = False
+    scheduler = Mock()
+    queue = OutboundQueue(client, spool=Spool(tmp_path, 1024 * 1024), drain_rate=2, scheduler=scheduler)
+    assert queue.publish("state/a", "1", TopicClass.STATE) is None
+    queue.publish("state/a", "2", TopicClass.STATE)
+    queue.publish("state/b", "3", TopicClass.STATE)
+    queue.publish("config", "{}", TopicClass.DISCOVERY)
+    assert client.publish.call_count == 1  # discovery not spooled
+    assert queue.stats.spooled == 3
+    drain = scheduler.call_later.call_args.args[1]
+    drain()
+    assert client.publish.call_count == 1
+    client.is_connected.return_value = True
+    # messages published after reconnect queue behind the spool, preserving order
+    queue.publish("state/a", "4", TopicClass.STATE)
+    drain()
+    drain()
+    topics = [(c.args[0], c.kwargs["payload"]) for c in client.publish.call_args_list[1:]]
+    assert topics == [("state/a", b"1"), ("state/a", b"2"), ("state/b", b"3"), ("state/a", b"4")]
+    assert queue.stats.unspooled == 4
+    assert queue.spool is not None
+    assert len(queue.spool) == 0
+
+
+def test_rejected_drain_publish_left_in_spool(tmp_path: Path) -> None:
+    client = _client()
+    client.is_connected.return_value = False
+    scheduler = Mock()
+    spool = Spool(tmp_path, 1024 * 1024)
+    queue = OutboundQueue(client, spool=spool, scheduler=scheduler)
+    queue.publish("state/a", "1", TopicClass.STATE)
+    queue.publish("state/b", "2", TopicClass.STATE)
+    client.is_connected.return_value = True
+    client.publish.side_effect = lambda *_args, **_kwargs: Mock(rc=MQTTErrorCode.MQTT_ERR_NO_CONN, mid=None)
+    drain = scheduler.call_later.call_args.args[1]
+    drain()
+    assert client.publish.call_count == 1  # batch stopped at the rejected message
+    assert len(spool) == 2
+    assert spool.peek(1)[0].topic == "state/a"
+    assert queue.stats.unspooled == 0
+    assert scheduler.call_later.call_args.args[1] == drain
+
+
+def test_spool_size_tracked_without_stat(tmp_path: Path) -> None:
+    spool = Spool(tmp_path, max_bytes=1024 * 1024, segment_bytes=100)
+    for n in range(5):
+        spool.append(f"state/{n}", "x" * 40, TopicClass.STATE, retain=True)
+    assert spool.size_bytes == sum(segment.stat().st_size for segment in tmp_path.glob("spool-*.bin"))
+    for message in spool.peek(10):
+        spool.advance(message)
+    assert spool.size_bytes == sum(segment.stat().st_size for segment in tmp_path.glob("spool-*.bin"))
+    assert Spool(tmp_path, max_bytes=1024 * 1024).size_bytes == spool.size_bytes
+
+
+def test_images_spooled_only_when_enabled(tmp_path: Path) -> None:
+    client = _client()
+    client.is_connected.return_value = False
+    cfg = MQTTSettings.model_validate({"user": "u", "pass": "p"})
+    assert OutboundQueue.from_settings(client, cfg, tmp_path).spool is None
+    cfg = MQTTSettings.model_validate({"user": "u", "pass": "p", "spool_max_bytes": 1024 * 1024})
+    queue = OutboundQueue.from_settings(client, cfg, tmp_path)
+    queue.publish("image", b"jpeg", TopicClass.IMAGE)
+    assert queue.stats.spooled == 0
+    cfg = MQTTSettings.model_validate({"user": "u", "pass": "p", "spool_max_bytes": 1024 * 1024, "spool_images": True})
+    queue = OutboundQueue.from_settings(client, cfg, tmp_path / "other")
+    queue.publish("image", b"jpeg", TopicClass.IMAGE)
+    assert queue.stats.spooled == 1
@@ -0,0 +1,150 @@
+import os
+import time
+from pathlib import Path
+from unittest.mock import Mock
+
+from watchdog.events import FileClosedEvent, FileCreatedEvent, FileSystemEvent
+from watchdog.observers.api import EventQueue, ObservedWatch
+
+from anpr2mqtt.polling import ScandirPollingEmitter, ScandirPollingObserver
+
+
+def _emitter(path: Path, recursive: bool = False) -> tuple[ScandirPollingEmitter, EventQueue, Mock]:
+    queue = EventQueue()
+    stat = Mock(side_effect=os.stat)
+    emitter = ScandirPollingEmitter(queue, ObservedWatch(str(path), recursive=recursive), timeout=0.01, stat=stat)
+    return emitter, queue, stat
+
+
+def _events(queue: EventQueue) -> list[FileSystemEvent]:
+    events: list[FileSystemEvent] = []
+    while not queue.empty():
+        events.append(queue.get()[0])
+    return events
+
+
+def _touch_dir(path: Path) -> None:
+    # directory mtime granularity can be coarse, so make sure a change is visible
+    stamp: float = path.stat().st_mtime + 1
+    os.utime(path, (stamp, stamp))
+
+
+def test_existing_files_are_not_reported(tmp_path: Path) -> None:
+    old: Path = tmp_path / "old.jpg"
+    old.write_bytes(b"jpeg")
+    # written well before the cutoff, so left to the catch-up scan
+    os.utime(old, (time.time() - 60, time.time() - 60))
+    emitter, queue, _ = _emitter(tmp_path)
+    emitter.poll()
+    assert _events(queue) == []
+
+
+def test_files_written_since_cutoff_are_reported(tmp_path: Path) -> None:
+    old: Path = tmp_path / "old.jpg"
+    old.write_bytes(b"jpeg")
+    os.utime(old, (time.time() - 60, time.time() - 60))
+    image: Path = tmp_path / "new.jpg"
+    image.write_bytes(b"jpeg")
+    observer = ScandirPollingObserver(timeout=0.01)
+    observer.schedule(Mock(), str(tmp_path))
+    (emitter,) = observer.emitters
+    assert isinstance(emitter, ScandirPollingEmitter)
+    assert observer.cutoff is not None
+    # the catch-up scan stops at the cutoff, so anything modified since is reported by polling
+    assert old.stat().st_mtime < observer.cutoff <= image.stat().st_mtime
+    assert _events(observer.event_queue) == [FileCreatedEvent(str(image))]
+    emitter.poll()
+    assert _events(observer.event_queue) == [FileClosedEvent(str(image))]
+
+
+def test_file_reported_closed_once_size_stable(tmp_path: Path) -> None:
+    emitter, queue, _ = _emitter(tmp_path)
+    image: Path = tmp_path / "new.jpg"
+    image.write_bytes(b"jp")
+    _touch_dir(tmp_path)
+
+    emitter.poll()
+    assert _events(queue) == [FileCreatedEvent(str(image))]
+    with image.open("ab") as f:
+        f.write(b"eg")
+    os.utime(image, (1, 1))
+    emitter.poll()
+    assert _events(queue) == []
+    emitter.poll()
+    assert _events(queue) == [FileClosedEvent(str(image))]
+    emitter.poll()
+    assert _events(queue) == []
+
+
+def test_unchanged_directory_is_not_listed_or_stated_per_file(tmp_path: Path) -> None:
+    for i in range(50):
+        (tmp_path / f"{i}.jpg").write_bytes(b"jpeg")
+    # last changed well before the listing, outside the mtime granularity window
+    os.utime(tmp_path, (time.time() - 60, time.time() - 60))
+    emitter, _, stat = _emitter(tmp_path)
+    stat.reset_mock()
+
+    for _ in range(3):
+        emitter.poll()
+    assert emitter.scans == 0
+    assert stat.call_count == 3
+
+
+def test_recent_directory_mtime_not_trusted_until_window_passes(tmp_path: Path) -> None:
+    clock = Mock(return_value=time.time_ns())
+    queue = EventQueue()
+    emitter = ScandirPollingEmitter(queue, ObservedWatch(str(tmp_path), recursive=False), timeout=0.01, clock=clock)
+    mtime_ns: int = tmp_path.stat().st_mtime_ns
+    image: Path = tmp_path / "same_tick.jpg"
+    image.write_bytes(b"jpeg")
+    # coarse timestamps on the mount, so adding the file left the directory mtime unchanged
+    os.utime(tmp_path, ns=(mtime_ns, mtime_ns))
+
+    emitter.poll()
+    assert _events(queue) == [FileCreatedEvent(str(image))]
+    clock.return_value += 5_000_000_000
+    emitter.poll()
+    scans: int = emitter.scans
+    emitter.poll()
+    assert emitter.scans == scans
+    assert _events(queue) == [FileClosedEvent(str(image))]
+
+
+def test_new_subdirectory_files_are_reported(tmp_path: Path) -> None:
+    emitter, queue, _ = _emitter(tmp_path, recursive=True)
+    day: Path = tmp_path / "20250602"
+    day.mkdir()
+    _touch_dir(tmp_path)
+    emitter.poll()
+    (day / "new.jpg").write_bytes(b"jpeg")
+    emitter.poll()
+    emitter.poll()
+    assert [type(e) for e in _events(queue)] == [FileCreatedEvent, FileClosedEvent]
+
+
+def test_deleted_files_are_forgotten(tmp_path: Path) -> None:
+    (tmp_path / "old.jpg").write_bytes(b"jpeg")
+    emitter, _, _ = _emitter(tmp_path)
+    (tmp_path / "old.jpg").unlink()
+    _touch_dir(tmp_path)
+    emitter.poll()
+    assert emitter.directories[str(tmp_path)].settled == set()
+
+
+def test_observer_dispatches_to_handler(tmp_path: Path) -> None:
+    handler = Mock()
+    observer = ScandirPollingObserver(timeout=0.01)
+    observer.schedule(handler, str(tmp_path))
+    observer.start()
+    try:
+        (tmp_path / "new.jpg").write_bytes(b"jpeg")
+        _touch_dir(tmp_path)
+        deadline: float = time.monotonic() + 5
+        while time.monotonic() < deadline and not any(
+            isinstance(c.args[0], FileClosedEvent) for c in handler.dispatch.call_args_list
+        ):
+            time.sleep(0.01)
+    finally:
+        observer.stop()
+        observer.join()
+    assert any(c.args[0] == FileClosedEvent(str(tmp_path / "new.jpg")) for c in handler.dispatch.call_args_list)
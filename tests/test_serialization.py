@@ -0,0 +1,48 @@
+import json
+
+import pytest
+
+from anpr2mqtt import serialization
+from anpr2mqtt.serialization import StaticFields, dumps, loads, stdlib_dumps
+
+
+def test_backends_produce_same_payload() -> None:
+    payload = {
+        "target": "AB12CDE",
+        "description": "Blue Ford",
+        "history": {"previous_sightings": 3, "hourly_counts": {7: 2, 18: 1}, "within_time_range": True},
+        "reg_info": None,
+        "café": 1.5,
+    }
+    assert loads(dumps(payload)) == json.loads(stdlib_dumps(payload))
+    assert loads(dumps(payload))["history"]["hourly_counts"] == {"7": 2, "18": 1}
+    assert dumps({"a": 1}) == stdlib_dumps({"a": 1}) == b'{"a":1}'
+
+
+def test_backends_encode_non_ascii_as_utf8() -> None:
+    payload = {"description": "Citroën Ë-C4", "camera": "Straße ✓"}
+    expected: bytes = '{"description":"Citroën Ë-C4","camera":"Straße ✓"}'.encode()
+    assert stdlib_dumps(payload) == expected
+    if serialization.BACKEND == "orjson":
+        assert dumps(payload) == expected
+    assert loads(expected) == payload
+
+
+def test_loads_rejects_bad_json() -> None:
+    with pytest.raises(serialization.JSONDecodeError):
+        loads(b"{not json")
+
+
+def test_static_fields_spliced_after_dynamic() -> None:
+    static = StaticFields({"event": "anpr", "camera": "driveway", "area": None})
+    encoded = static.dumps({"target": "AB12CDE"})
+    assert json.loads(encoded) == {"target": "AB12CDE", "event": "anpr", "camera": "driveway", "area": None}
+    assert json.loads(static.dumps({})) == {"event": "anpr", "camera": "driveway", "area": None}
+    assert StaticFields({}).dumps({"a": 1}) == b'{"a":1}'
+
+
+def test_static_fields_overridden_by_dynamic() -> None:
+    static = StaticFields({"event": "anpr", "camera": "driveway"})
+    encoded = static.dumps({"camera": "gate"})
+    assert encoded.count(b'"camera"') == 1
+    assert json.loads(encoded) == {"event": "anpr", "camera": "gate"}
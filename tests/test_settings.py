@@ -1,6 +1,9 @@
+from pathlib import Path
 from typing import Any
 
-from anpr2mqtt.settings import Target, TargetGroup, TargetSettings
+from pydantic_settings import BaseSettings, PydanticBaseSettingsSource, SettingsConfigDict, YamlConfigSettingsSource
+
+from anpr2mqtt.settings import Settings, Target, TargetGroup, TargetSettings
 
 
 def _group(**kwargs: Any) -> TargetGroup:
@@ -59,3 +62,31 @@ def test_does_not_override_entity_id() -> None:
 def test_does_not_override_description() -> None:
     g = TargetGroup(name="known", members=[Target(id="ABC123", description="My car")])
     assert g.members[0].description == "My car"
+
+
+# ── target files ─────────────────────────────────────────────────────────────
+
+
+def test_relative_target_file_resolved_against_config_dir(tmp_path: Path) -> None:
+    config_path = tmp_path / "anpr2mqtt.yaml"
+    config_path.write_text(
+        "mqtt:\n  user: u\n  pass: p\n"
+        "targets:\n  plate:\n    groups:\n"
+        "      - name: watch\n        file: lists/watch.csv\n"
+        "      - name: stolen\n        file: /data/stolen.db\n"
+    )
+
+    class ConfigDirSettings(Settings):
+        model_config = SettingsConfigDict(yaml_file=str(config_path))
+
+        @classmethod
+        def settings_customise_sources(  # type: ignore[override]
+            cls,
+            settings_cls: type[BaseSettings],
+            **_kwargs: PydanticBaseSettingsSource,
+        ) -> tuple[PydanticBaseSettingsSource, ...]:
+            return (YamlConfigSettingsSource(settings_cls),)
+
+    watch, stolen = ConfigDirSettings().targets["plate"].groups  # type: ignore[call-arg]
+    assert watch.file == tmp_path / "lists" / "watch.csv"
+    assert stolen.file == Path("/data/stolen.db")
@@ -0,0 +1,82 @@
+import sqlite3
+from pathlib import Path
+
+from anpr2mqtt.settings import Target, TargetGroup, TargetSettings, TrackerSettings
+from anpr2mqtt.target_store import TargetRecord, TargetStore
+from anpr2mqtt.tracker import Tracker
+
+
+def _write_csv(path: Path, rows: int) -> Path:
+    lines: list[str] = ["id,description,icon,lookup"]
+    lines.extend(f"WL{i:05d},,," for i in range(rows))
+    lines.append("ZZ99ZZZ,Stolen van,mdi:van-utility,true")
+    path.write_text("\n".join(lines) + "\n")
+    return path
+
+
+def test_csv_group_members_take_group_defaults(tmp_path: Path) -> None:
+    store = TargetStore()
+    group = TargetGroup(name="watch", priority="critical", icon="mdi:police-badge", file=_write_csv(tmp_path / "w.csv", 3))
+    assert store.load_group(group, "plate") == 4
+    assert len(store) == 4
+    assert "WL00001" in store
+    assert store["WL00001"] == TargetRecord(
+        id="WL00001",
+        target_type="plate",
+        group="watch",
+        lookup=False,
+        description="watch",
+        icon="mdi:police-badge",
+        priority="critical",
+    )
+    van: TargetRecord = store["ZZ99ZZZ"]
+    assert van.description == "Stolen van"
+    assert van.icon == "mdi:van-utility"
+    assert van.lookup is True
+
+
+def test_sqlite_group(tmp_path: Path) -> None:
+    db: Path = tmp_path / "watch.sqlite"
+    with sqlite3.connect(db) as conn:
+        conn.execute("CREATE TABLE targets (id TEXT, description TEXT, entity_id TEXT)")
+        conn.executemany(
+            "INSERT INTO targets VALUES (?, ?, ?)",
+            [("AB12CDE", "Alice", "alice_car"), ("CD34EFG", None, None), ("", "x", None)],
+        )
+    conn.close()
+    store = TargetStore()
+    assert store.load_group(TargetGroup(name="known", file=db), "plate") == 2
+    assert store["AB12CDE"].entity_id == "alice_car"
+    assert store["CD34EFG"].description == "known"
+    assert list(store.entities()) == ["alice_car"]
+
+
+def test_strings_interned_and_later_entries_replace(tmp_path: Path) -> None:
+    store = TargetStore()
+    store.load_group(TargetGroup(name="watch", file=_write_csv(tmp_path / "w.csv", 1000)), "plate")
+    # None, target type, group name and priority, then the van's own description and icon
+    assert len(store._strings) == 6
+    store.add_target(Target(id="WL00001", description="Override", group="known"))
+    assert len(store) == 1001
+    assert store["WL00001"].description == "Override"
+    assert store.memory_bytes() > 0
+
+
+def test_tracker_matches_file_targets(tmp_path: Path) -> None:
+    tracker = Tracker(
+        target_type="plate",
+        tracker_config=TrackerSettings(data_dir=tmp_path),
+        target_config=TargetSettings(
+            groups=[
+                TargetGroup(name="known", members=[Target(id="AB12CDE", correction=["A812CDE"])]),
+                TargetGroup(name="watch", priority="critical", file=_write_csv(tmp_path / "w.csv", 50)),
+                TargetGroup(name="missing", file=tmp_path / "missing.csv"),
+            ]
+        ),
+        auto_match_tolerance=1,
+    )
+    assert len(tracker.ids) == 52
+    assert tracker.find("WL00042").target.priority == "critical"
+    assert tracker.find("ZZ99ZZY").target.id == "ZZ99ZZZ"
+    assert tracker.find("A812CDE").target.group == "known"
+    assert tracker.find("QQ11QQQ").target.group is None
@@ -5,8 +5,11 @@ import re
 from pathlib import Path
 from unittest.mock import patch
 
-from anpr2mqtt.settings import DimensionSettings, EventSettings, OCRFieldSettings
-from anpr2mqtt.tools import ListTool, OCRTool
+import pytest
+
+from anpr2mqtt.api_client import LookupPriority
+from anpr2mqtt.settings import DimensionSettings, DVLASettings, EventSettings, OCRFieldSettings, TrackerSettings
+from anpr2mqtt.tools import DVLATool, ImportHistoryTool, ListTool, OCRTool, PayloadBenchmarkTool
 
 FIXTURE_IMAGE = "fixtures/20250602103045407_B4DM3N_VEHICLE_DETECTION.jpg"
 
@@ -75,3 +78,43 @@ def test_list_tool_cli_cmd_empty_dir(tmp_path: Path) -> None:
         tool.cli_cmd()
     # structlog uses print internally; no image targets should be printed
     assert not any("timestamp=" in t for t in printed_targets)
+
+
+def test_dvla_tool_single_registration_uses_lookup() -> None:
+    with patch("anpr2mqtt.tools.DVLAClient") as client_cls:
+        client_cls.return_value.lookup.return_value = {"success": True}
+        DVLATool(dvla=DVLASettings(api_key="key"), registration=["ab12cde"]).cli_cmd()
+    client_cls.return_value.lookup.assert_called_once_with("AB12CDE")
+    client_cls.return_value.close.assert_called_once()
+
+
+def test_dvla_tool_several_registrations_use_lookup_many() -> None:
+    with patch("anpr2mqtt.tools.DVLAClient") as client_cls:
+        client_cls.return_value.lookup_many.return_value = {"AB12CDE": {}, "CD34EFG": {}}
+        DVLATool(dvla=DVLASettings(api_key="key"), registration=["AB12CDE", "CD34EFG"]).cli_cmd()
+    client_cls.return_value.lookup_many.assert_called_once_with(["AB12CDE", "CD34EFG"], priority=LookupPriority.LIVE)
+
+
+def test_payload_benchmark_tool(capsys: pytest.CaptureFixture[str]) -> None:
+    PayloadBenchmarkTool(events=10, history=20).cli_cmd()
+    out: str = capsys.readouterr().out
+    assert "stdlib json:" in out
+    assert "anpr2mqtt:" in out
+
+
+def test_import_history_tool(tmp_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+    archive: Path = tmp_path / "ftp"
+    archive.mkdir()
+    (archive / "20250602103045407_B4DM3N_VEHICLE_DETECTION.jpg").touch()
+    tool = ImportHistoryTool(
+        event=EventSettings(watch_path=archive),
+        tracker=TrackerSettings(data_dir=tmp_path / "data"),
+        workers=1,
+        log_level="INFO",
+    )
+    tool.cli_cmd()
+    assert "Imported 1 images from 1 files" in capsys.readouterr().out
+    assert (tmp_path / "data" / "plate" / "B4DM3N.json").exists()
+    assert (tmp_path / "data" / "import_history" / "plate.json").exists()
+    tool.cli_cmd()
+    assert "Resuming import" in capsys.readouterr().out
@@ -1,8 +1,11 @@
+import dataclasses
 import datetime as dt
 from pathlib import Path
 
+import pytest
+
 from anpr2mqtt.settings import Target, TargetGroup, TargetSettings, TrackerSettings
-from anpr2mqtt.tracker import Sighting, Tracker, compute_time_analysis
+from anpr2mqtt.tracker import Sighting, TargetRecord, Tracker, compute_time_analysis
 
 
 def test_time_analysis_no_history() -> None:
@@ -419,3 +422,23 @@ def test_record_visit_gap_first_sighting_always_new(tmp_path: Path) -> None:
     tracker = Tracker("plate", TrackerSettings(data_dir=tmp_path, min_visit_gap_seconds=300), target_config=TargetSettings())
     result = tracker.record("NEWPLATE", "plate", dt.datetime(2025, 1, 1, tzinfo=dt.UTC))
     assert result.get("is_new_visit", True) is True
+
+
+def test_registered_target_record_immutable(tracker: Tracker) -> None:
+    tracker.target_config = TargetSettings(
+        groups=[TargetGroup(name="known", members=[Target(id="AB12CDE", icon="mdi:car", entity_id="my_car")])]
+    )
+    first: Sighting = tracker.find("AB12CDE")
+    assert first.target == tracker.find("AB12CDE").target
+    assert tracker.entities["my_car"] == [first.target]
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        first.target.description = "Changed"  # type: ignore[misc]
+    described: Sighting = first.with_description("Blue Ford")
+    assert described.target.description == "Blue Ford"
+    assert tracker.ids["AB12CDE"].description == "known"
+
+
+def test_target_record_payload_matches_config() -> None:
+    target = Target(id="AB12CDE", target_type="plate", group="dangerous", icon="mdi:alert", priority="critical")
+    assert TargetRecord.from_target(target).as_dict() == target.as_dict()
+    assert TargetRecord.from_target(Target(id="X")).as_dict() == Target(id="X").as_dict()